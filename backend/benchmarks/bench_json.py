@@ -0,0 +1,77 @@
+"""
+Microbenchmark: JSON serialization of a realistic /api/items page (25 items)
+
+Compares the old json.dumps(data, default=str).encode() path with the
+stdlib encoder and orjson paths from json_serializer.
+
+    python benchmarks/bench_json.py
+"""
+import os
+import sys
+import json
+import uuid
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json_serializer
+
+
+def build_page(count=25):
+    """Build a page shaped like handle_get_items output (items.* + user columns)"""
+    now = datetime.now()
+    items = []
+    for i in range(count):
+        created = now - timedelta(hours=i * 7)
+        item_id = uuid.uuid4()
+        items.append({
+            'id': item_id,
+            'title': f'Black backpack with laptop sleeve #{i}',
+            'description': 'Found near the library entrance on the second floor. '
+                           'Has a keychain with a small bear and a water bottle in the side pocket. ' * 2,
+            'category_id': None,
+            'category': ['electronics', 'books', 'accessories', 'clothing', 'other'][i % 5],
+            'status': 'found' if i % 3 else 'lost',
+            'location_found': 'Main Library, Level 2',
+            'location': None,
+            'date_found': created.date(),
+            'image_url': f'https://lost-found-campus-photos.s3.ap-southeast-1.amazonaws.com/items/{uuid.uuid4()}.jpg',
+            'user_id': uuid.uuid4(),
+            'contact_info': None,
+            'custody_status': 'handed_to_one_stop',
+            'created_at': created,
+            'updated_at': created,
+            'user_name': 'Student Name',
+            'user_email': f'student{i}@example.edu',
+        })
+    return {'items': items, 'total': 240, 'page': 1, 'per_page': count, 'pages': 10}
+
+
+def legacy_dumps(data):
+    return json.dumps(data, default=str).encode()
+
+
+def main():
+    page = build_page()
+    number = 2000
+
+    candidates = [('legacy json.dumps(default=str)', legacy_dumps),
+                  ('stdlib typed encoder', json_serializer.stdlib_dumps)]
+    if json_serializer.ORJSON_AVAILABLE:
+        candidates.append(('orjson', json_serializer.orjson_dumps))
+    else:
+        print("WARNING - orjson not installed, skipping")
+
+    print(f"BENCH - 25-item page, {number} iterations each")
+    baseline = None
+    for name, func in candidates:
+        size = len(func(page))
+        seconds = min(timeit.repeat(lambda: func(page), number=number, repeat=5))
+        per_call_us = seconds / number * 1e6
+        baseline = baseline or per_call_us
+        print(f"  {name:<32} {per_call_us:8.1f} us/page  {size:6d} bytes  {baseline / per_call_us:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Microbenchmark: request dispatch cost
+
+Compares the route table (segment trie in router.py, as built by
+postgresql_server) with the if/elif startswith ladder do_GET used before,
+for a mix of request paths. Only the lookup is timed, not the handlers.
+
+    python benchmarks/bench_router.py
+"""
+import os
+import sys
+import timeit
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from postgresql_server import ROUTER
+from router import Router
+
+ITEM_ID = '7f14bfc2-d4fc-458e-a1bf-1fcfaa0405df'
+
+REQUESTS = [
+    ('GET', '/api/items?page=2&per_page=12'),
+    ('GET', '/api/items?search=wallet&status=lost'),
+    ('GET', f'/api/items/{ITEM_ID}'),
+    ('GET', f'/api/items/{ITEM_ID}/matches?limit=5'),
+    ('GET', '/api/suggest?field=title&prefix=bla'),
+    ('GET', '/api/notifications'),
+    ('GET', '/api/admin/metrics'),
+    ('GET', '/static/js/main.1754553014.js'),
+    ('GET', '/uploads/ab/cd/abcd0123.jpg'),
+    ('GET', '/admin/items'),
+]
+
+
+def legacy_dispatch(method, raw_path):
+    """The old do_GET: parse the URL, then test each route in order"""
+    parsed_path = urllib.parse.urlparse(raw_path)
+    path = parsed_path.path
+    query_params = urllib.parse.parse_qs(parsed_path.query)
+    if path in ['/api/admin/statistics', '/api/admin/stats', '/api/statistics', '/api/stats']:
+        return 'disabled', query_params
+    if path == '/api/items':
+        return 'items', query_params
+    elif path == '/api/items/facets':
+        return 'facets', query_params
+    elif path.startswith('/api/items/') and path.endswith('/matches'):
+        return 'matches', path.split('/')[-2]
+    elif path.startswith('/api/items/') and path.endswith('/similar-images'):
+        return 'similar', path.split('/')[-2]
+    elif path.startswith('/api/items/'):
+        return 'item', path.split('/')[-1]
+    elif path == '/api/users/me':
+        return 'me', None
+    elif path == '/api/categories':
+        return 'categories', None
+    elif path == '/api/suggest':
+        return 'suggest', query_params
+    elif path == '/api/saved-searches':
+        return 'saved', None
+    elif path == '/api/notifications':
+        return 'notifications', None
+    elif path == '/api/health':
+        return 'health', None
+    elif path == '/admin/login':
+        return 'admin login', None
+    elif path == '/admin' or path.startswith('/admin/'):
+        return 'admin', None
+    elif path.startswith('/static/'):
+        return 'static', path
+    elif path == '/api/admin/items':
+        return 'admin items', query_params
+    elif path == '/api/admin/users':
+        return 'admin users', query_params
+    elif path == '/api/admin/metrics':
+        return 'metrics', None
+    elif path.startswith('/uploads/'):
+        return 'uploads', path
+    return None, None
+
+
+def table_dispatch(router, method, raw_path):
+    """What PostgreSQLRequestHandler.route_request does before calling the route"""
+    url = urllib.parse.urlsplit(raw_path)
+    match = router.match(method, url.path)
+    return match, urllib.parse.parse_qs(url.query)
+
+
+def padded_router(extra_routes):
+    """The server's routes plus unrelated ones, to show lookups do not slow down as routes are added"""
+    router = Router()
+    for route in ROUTER.routes:
+        router.add(route.method, route.pattern, route.handler)
+    for index in range(extra_routes):
+        router.add('GET', f'/api/extra{index}/{{thing_id}}/detail', lambda handler, thing_id: None)
+    return router
+
+
+def main():
+    number = 20000
+    candidates = [
+        ('legacy if/elif ladder', lambda: [legacy_dispatch(method, path) for method, path in REQUESTS]),
+        (f'route table ({len(ROUTER.routes)} routes)',
+         lambda: [table_dispatch(ROUTER, method, path) for method, path in REQUESTS]),
+    ]
+    padded = padded_router(500)
+    candidates.append((f'route table ({len(padded.routes)} routes)',
+                       lambda: [table_dispatch(padded, method, path) for method, path in REQUESTS]))
+    lookup_only = [(method, urllib.parse.urlsplit(path).path) for method, path in REQUESTS]
+    candidates.append(('trie lookup only', lambda: [ROUTER.match(method, path) for method, path in lookup_only]))
+
+    print(f"BENCH - {len(REQUESTS)} request paths, {number} iterations each")
+    baseline = None
+    for name, func in candidates:
+        seconds = min(timeit.repeat(func, number=number, repeat=5))
+        per_request_us = seconds / number / len(REQUESTS) * 1e6
+        baseline = baseline or per_request_us
+        print(f"  {name:<32} {per_request_us:6.2f} us/request  {baseline / per_request_us:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark: upload throughput and latency of the storage backends
+
+Stores --count files of --size bytes through upload_worker.store_upload with
+--workers concurrent threads (like the upload worker pool) and reports MB/s and
+per-file latency percentiles. The memory and local backends need no AWS
+credentials; add "s3" to --backends to measure the configured bucket.
+
+    python benchmarks/bench_storage.py --count 200 --size 2097152 --workers 4
+"""
+import os
+import sys
+import time
+import tempfile
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage
+from upload_worker import store_upload
+
+
+def build_backend(name, tmp_dir):
+    if name == 'memory':
+        return storage.MemoryStorage()
+    if name == 'local':
+        return storage.LocalStorage(root=tmp_dir)
+    if name == 's3':
+        if not storage.s3_configured():
+            print("WARNING - S3 is not configured, skipping")
+            return None
+        return storage.s3_storage
+    raise ValueError(f"Unknown backend: {name}")
+
+
+def run(backend, payload, count, workers):
+    """Store count copies of payload; returns (elapsed seconds, sorted latencies, names)"""
+    def upload(index):
+        started = time.perf_counter()
+        with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as file_obj:
+            file_obj.write(payload)
+            url, _ = store_upload(file_obj, 'bench.jpg', f"bench-{index:06d}", storage=backend, max_retries=1)
+        return time.perf_counter() - started, backend.name_from_url(url)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(upload, range(count)))
+    elapsed = time.perf_counter() - started
+    return elapsed, sorted(latency for latency, _ in results), [name for _, name in results]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark storage backends")
+    parser.add_argument('--backends', default='memory,local', help='comma separated: memory,local,s3')
+    parser.add_argument('--count', type=int, default=200)
+    parser.add_argument('--size', type=int, default=1024 * 1024, help='bytes per file')
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    payload = os.urandom(args.size)
+    total_mb = args.count * args.size / (1024 * 1024)
+    print(f"BENCH - {args.count} files x {args.size} bytes, {args.workers} workers")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in args.backends.split(','):
+            backend = build_backend(name.strip(), tmp_dir)
+            if backend is None:
+                continue
+            elapsed, latencies, names = run(backend, payload, args.count, args.workers)
+            for stored_name in names:
+                backend.delete(stored_name)
+
+            p50 = latencies[len(latencies) // 2] * 1000
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000
+            print(f"  {backend.name:<8} {total_mb / elapsed:8.1f} MB/s  {args.count / elapsed:8.1f} files/s  "
+                  f"p50 {p50:7.2f} ms  p95 {p95:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
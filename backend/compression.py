@@ -0,0 +1,179 @@
+"""
+HTTP response compression - Accept-Encoding negotiation, gzip/brotli encoding
+of API responses and lookup of precompressed static assets
+"""
+import os
+import sys
+import gzip
+import zlib
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Brotli is optional - gzip is always available
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    brotli = None
+    BROTLI_AVAILABLE = False
+
+# ======= COMPRESSION CONFIGURATION FROM ENVIRONMENT =======
+COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true'
+# Responses smaller than this are sent as-is (headers would eat the savings)
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+# gzip level 1-9; 6 is the usual speed/ratio balance
+COMPRESSION_LEVEL = int(os.getenv('COMPRESSION_LEVEL', 6))
+# brotli quality 0-11; 4-5 is fast enough for dynamic responses
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', 4))
+
+# File suffix used for precompressed static assets, in order of preference
+PRECOMPRESSED_SUFFIXES = [('br', '.br'), ('gzip', '.gz')]
+
+# Types worth compressing; images and archives are already compressed
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/', 'application/javascript')
+
+
+def parse_accept_encoding(accept_encoding):
+    """Return {coding: q} for every coding the header lists, refusals (q=0) included"""
+    qualities = {}
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding] = quality
+    return qualities
+
+
+def accepts(qualities, coding):
+    """
+    Whether the client accepts coding. A wildcard only stands for codings it
+    did not list, so 'gzip;q=0, *' still refuses gzip (RFC 9110 12.5.3).
+    """
+    quality = qualities.get(coding)
+    if quality is None:
+        quality = qualities.get('*', 0.0)
+    return quality > 0
+
+
+def choose_encoding(accept_encoding):
+    """Pick the best supported coding for a dynamic response, or None for identity"""
+    qualities = parse_accept_encoding(accept_encoding)
+    if BROTLI_AVAILABLE and accepts(qualities, 'br'):
+        return 'br'
+    if accepts(qualities, 'gzip'):
+        return 'gzip'
+    return None
+
+
+def is_compressible(content_type):
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def compress_body(body, encoding):
+    """Compress body bytes with the given coding"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=COMPRESSION_LEVEL, mtime=0)
+    return body
+
+
+def maybe_compress(body, content_type, accept_encoding):
+    """
+    Compress a response body if it is worth it.
+    Returns (body, encoding) where encoding is None when the body was left as-is.
+    """
+    if not COMPRESSION_ENABLED or len(body) < COMPRESSION_MIN_SIZE or not is_compressible(content_type):
+        return body, None
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return body, None
+    return compress_body(body, encoding), encoding
+
+
+class _BrotliStream:
+    """Adapter giving brotli.Compressor the compress()/flush() interface of zlib objects"""
+
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+def stream_compressor(content_type, accept_encoding):
+    """
+    Return (compressor, encoding) for an incrementally written response,
+    or (None, None) when it should be sent uncompressed.
+    """
+    if not COMPRESSION_ENABLED or not is_compressible(content_type):
+        return None, None
+    encoding = choose_encoding(accept_encoding)
+    if encoding == 'br':
+        return _BrotliStream(), encoding
+    if encoding == 'gzip':
+        # wbits=31 selects the gzip container
+        return zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 31), encoding
+    return None, None
+
+
+def precompressed_candidates(accept_encoding):
+    """Yield (encoding, suffix) pairs of precompressed variants the client accepts"""
+    qualities = parse_accept_encoding(accept_encoding)
+    for encoding, suffix in PRECOMPRESSED_SUFFIXES:
+        if accepts(qualities, encoding):
+            yield encoding, suffix
+
+
+def precompress_directory(directory, min_size=COMPRESSION_MIN_SIZE):
+    """Write .gz (and .br if available) next to every compressible file in directory"""
+    import mimetypes
+
+    written = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            # Skip existing variants and source maps (only fetched by devtools)
+            if name.endswith(('.gz', '.br', '.map')):
+                continue
+            path = os.path.join(root, name)
+            content_type, _ = mimetypes.guess_type(path)
+            if not content_type or not is_compressible(content_type):
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            if len(data) < min_size:
+                continue
+
+            variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+            if BROTLI_AVAILABLE:
+                variants.append(('.br', brotli.compress(data, quality=11)))
+
+            for suffix, compressed in variants:
+                # Only keep variants that are actually smaller
+                if len(compressed) < len(data):
+                    with open(path + suffix, 'wb') as f:
+                        f.write(compressed)
+                    written += 1
+                    print(f"SUCCESS - {path}{suffix} ({len(data)} -> {len(compressed)} bytes)")
+    return written
+
+
+if __name__ == "__main__":
+    # Precompress the React admin build so static assets can be served without runtime compression
+    target = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'admin_build', 'static')
+    print(f"CONFIG - Precompressing assets in {target} (brotli {'enabled' if BROTLI_AVAILABLE else 'not installed'})")
+    count = precompress_directory(target)
+    print(f"SUCCESS - Wrote {count} precompressed files")
@@ -3,8 +3,10 @@ PostgreSQL Database Configuration and Connection Management
 """
 import os
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 import json
+import uuid
+from contextlib import contextmanager
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -18,9 +20,57 @@ DB_CONFIG = {
     'user': os.getenv('DB_USER', 'postgres'),
     'password': os.getenv('DB_PASSWORD', 'password'),
     'port': os.getenv('DB_PORT', '5432'),
-    'sslmode': os.getenv('DB_SSL_MODE', 'prefer')
+    'sslmode': os.getenv('DB_SSL_MODE', 'prefer'),
+    # Fail fast instead of hanging a request thread when the database is unreachable
+    'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5))
 }
 
+# User columns joined onto item rows, with defaults applied in SQL when the user is missing (null join)
+ITEM_USER_COLUMNS = """COALESCE(NULLIF(u.name, ''), 'Unknown') as user_name,
+                       COALESCE(NULLIF(u.email, ''), 'team@example.com') as user_email"""
+
+class RowStream:
+    """Iterator over the rows of a server-side cursor; close() releases the cursor"""
+    
+    def __init__(self, connection, cursor, first_batch, batch_size):
+        self.connection = connection
+        self.cursor = cursor
+        self.batch = first_batch
+        self.batch_size = batch_size
+        self.position = 0
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        if self.position == len(self.batch):
+            if self.cursor is None or not self.batch:
+                raise StopIteration
+            self.batch = self.cursor.fetchmany(self.batch_size)
+            self.position = 0
+            if not self.batch:
+                raise StopIteration
+        row = self.batch[self.position]
+        self.position += 1
+        return row
+    
+    def close(self):
+        """Close the cursor and end its transaction; safe to call more than once"""
+        if self.cursor is None:
+            return
+        cursor, self.cursor = self.cursor, None
+        self.batch = []
+        self.position = 0
+        try:
+            cursor.close()
+            self.connection.commit()
+        except psycopg2.Error as e:
+            print(f"WARNING - Could not close streaming cursor: {e}")
+            try:
+                self.connection.rollback()
+            except psycopg2.Error:
+                pass
+
 class DatabaseManager:
     def __init__(self):
         self.connection = None
@@ -60,6 +110,59 @@ class DatabaseManager:
             print(f"ERROR - Query error: {e}")
             raise e
     
+    @contextmanager
+    def transaction(self):
+        """
+        Run several statements as one transaction: yields the cursor, commits
+        when the block finishes and rolls back if it raises. Row locks taken
+        with SELECT ... FOR UPDATE are held until then.
+        """
+        try:
+            yield self.cursor
+            self.connection.commit()
+        except Exception as e:
+            self.connection.rollback()
+            print(f"ERROR - Transaction rolled back: {e}")
+            raise
+    
+    def execute_query_rows(self, query, params=None):
+        """
+        Execute a query with a plain tuple cursor and return (columns, rows).
+        Avoids building a RealDictRow per row for large listings.
+        """
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.execute(query, params)
+                self.connection.commit()
+                if cursor.description is None:
+                    return [], []
+                columns = [column.name for column in cursor.description]
+                return columns, cursor.fetchall()
+        except psycopg2.Error as e:
+            self.connection.rollback()
+            print(f"ERROR - Query error: {e}")
+            raise e
+    
+    def stream_query_rows(self, query, params=None, batch_size=500):
+        """
+        Execute a query on a server-side cursor and return (columns, RowStream).
+        Rows are fetched batch_size at a time, so large result sets are never fully
+        held in memory. The stream must be closed (contextlib.closing) before the
+        connection is reused, whether or not it was consumed.
+        """
+        cursor = self.connection.cursor(name=f"stream_{uuid.uuid4().hex}")
+        try:
+            cursor.execute(query, params)
+            first_batch = cursor.fetchmany(batch_size)
+            columns = [column.name for column in cursor.description]
+        except psycopg2.Error as e:
+            cursor.close()
+            self.connection.rollback()
+            print(f"ERROR - Query error: {e}")
+            raise e
+        
+        return columns, RowStream(self.connection, cursor, first_batch, batch_size)
+    
     def execute_insert(self, query, params=None):
         """Execute insert and return the inserted record"""
         try:
@@ -70,6 +173,20 @@ class DatabaseManager:
             self.connection.rollback()
             print(f"ERROR - Insert error: {e}")
             raise e
+    
+    def execute_batch_insert(self, query, rows, template=None):
+        """
+        Insert many rows with one statement; query holds a single VALUES %s
+        placeholder that is expanded to all rows. Returns the number of rows inserted.
+        """
+        try:
+            execute_values(self.cursor, query, rows, template=template, page_size=max(len(rows), 1))
+            self.connection.commit()
+            return self.cursor.rowcount
+        except psycopg2.Error as e:
+            self.connection.rollback()
+            print(f"ERROR - Batch insert error: {e}")
+            raise e
 
 def create_database_tables():
     """Create all database tables"""
@@ -114,9 +231,14 @@ def create_database_tables():
             location VARCHAR(500), -- Alternative location field
             date_found DATE,
             image_url TEXT,
+            image_status VARCHAR(20) DEFAULT 'ready' CHECK (image_status IN ('pending', 'ready', 'failed')),
+            image_variants JSONB, -- {"small": url, "medium": url, "large": url}
+            image_hash CHAR(64), -- sha256 of the original, key into image_blobs
+            image_phash BIGINT, -- 64-bit perceptual hash (dHash) for finding similar photos
             user_id UUID REFERENCES users(id),
             contact_info TEXT,
             custody_status VARCHAR(50) CHECK (custody_status IN ('kept_by_finder', 'handed_to_one_stop', 'left_where_found')),
+            admin_notes TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         );
@@ -134,6 +256,19 @@ def create_database_tables():
         );
         """
         
+        # Create image_blobs table - content-addressed index of stored originals
+        create_image_blobs_table = """
+        CREATE TABLE IF NOT EXISTS image_blobs (
+            content_hash CHAR(64) PRIMARY KEY, -- sha256 hex digest of the original
+            image_url TEXT NOT NULL,
+            image_variants JSONB,
+            size_bytes BIGINT,
+            perceptual_hash BIGINT, -- dHash of the stored original
+            ref_count INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """
+        
         # Create claims table for tracking item claims
         create_claims_table = """
         CREATE TABLE IF NOT EXISTS claims (
@@ -166,6 +301,19 @@ def create_database_tables():
         );
         """
         
+        # Create saved_searches table - users are notified when a new item matches one
+        create_saved_searches_table = """
+        CREATE TABLE IF NOT EXISTS saved_searches (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+            query VARCHAR(200), -- same matching as the /api/items search parameter
+            category VARCHAR(50),
+            status VARCHAR(20) CHECK (status IN ('lost', 'found')),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS idx_saved_searches_user_id ON saved_searches(user_id);
+        """
+        
         # Create audit_logs table for tracking changes
         create_audit_table = """
         CREATE TABLE IF NOT EXISTS audit_logs (
@@ -186,8 +334,10 @@ def create_database_tables():
             ("categories", create_categories_table),
             ("items", create_items_table),
             ("item_images", create_images_table),
+            ("image_blobs", create_image_blobs_table),
             ("claims", create_claims_table),
             ("notifications", create_notifications_table),
+            ("saved_searches", create_saved_searches_table),
             ("audit_logs", create_audit_table)
         ]
         
@@ -195,6 +345,33 @@ def create_database_tables():
             print(f"📝 Creating {table_name} table...")
             db.execute_query(query)
         
+        # Bring existing databases up to date with columns added after their tables were created
+        migrations = [
+            ("items.image_status", """
+            ALTER TABLE items ADD COLUMN IF NOT EXISTS image_status VARCHAR(20) DEFAULT 'ready'
+                CHECK (image_status IN ('pending', 'ready', 'failed'));
+            """),
+            ("items.image_variants", """
+            ALTER TABLE items ADD COLUMN IF NOT EXISTS image_variants JSONB;
+            """),
+            ("items.image_hash", """
+            ALTER TABLE items ADD COLUMN IF NOT EXISTS image_hash CHAR(64);
+            """),
+            ("items.admin_notes", """
+            ALTER TABLE items ADD COLUMN IF NOT EXISTS admin_notes TEXT;
+            """),
+            ("items.image_phash", """
+            ALTER TABLE items ADD COLUMN IF NOT EXISTS image_phash BIGINT;
+            """),
+            ("image_blobs.perceptual_hash", """
+            ALTER TABLE image_blobs ADD COLUMN IF NOT EXISTS perceptual_hash BIGINT;
+            """),
+        ]
+        
+        for column_name, query in migrations:
+            print(f"📝 Ensuring column {column_name}...")
+            db.execute_query(query)
+        
         # Insert default categories
         default_categories = [
             ('electronics', 'Electronic devices like phones, laptops, tablets'),
@@ -0,0 +1,117 @@
+"""
+Faceted counts for the item filters
+
+One GROUPING SETS query counts the items matching the current search/filter
+per category, per status and per location, plus the total, so a filter
+sidebar costs a single request. Serialized results are cached per filter key
+for FACET_CACHE_TTL seconds and dropped whenever an item changes.
+"""
+import os
+import time
+import threading
+import item_events
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# ======= FACET CONFIGURATION =======
+FACET_CACHE_TTL = float(os.getenv('FACET_CACHE_TTL', 30))
+FACET_CACHE_SIZE = int(os.getenv('FACET_CACHE_SIZE', 256))
+# Locations are free text; only the most common ones are returned
+LOCATION_FACET_LIMIT = int(os.getenv('LOCATION_FACET_LIMIT', 10))
+
+# GROUPING(category, status, location) is a bitmask of the columns a row is NOT grouped by
+FACET_GROUPINGS = {
+    0b011: 'category',
+    0b101: 'status',
+    0b110: 'location',
+}
+TOTAL_GROUPING = 0b111
+
+
+def facet_query(where_clause):
+    """Counts per facet value for the items selected by where_clause"""
+    return f"""
+        SELECT category, status, location, COUNT(*) AS count,
+               GROUPING(category, status, location) AS grouping
+        FROM (
+            SELECT category, status, COALESCE(NULLIF(location_found, ''), location) AS location
+            FROM items {where_clause}
+        ) filtered
+        GROUP BY GROUPING SETS ((category), (status), (location), ())
+    """
+
+
+def rows_to_facets(rows):
+    """{'total', 'facets': {facet: [{'value', 'count'}]}} from facet_query rows, largest counts first"""
+    total = 0
+    facets = {facet: [] for facet in FACET_GROUPINGS.values()}
+    for row in rows:
+        if row['grouping'] == TOTAL_GROUPING:
+            total = row['count']
+            continue
+        facet = FACET_GROUPINGS.get(row['grouping'])
+        value = row[facet] if facet else None
+        if value is None or value == '':
+            continue
+        facets[facet].append({'value': value, 'count': row['count']})
+    for values in facets.values():
+        values.sort(key=lambda entry: (-entry['count'], entry['value']))
+    facets['location'] = facets['location'][:LOCATION_FACET_LIMIT]
+    return {'total': total, 'facets': facets}
+
+
+class FacetCache:
+    """Short-lived cache of serialized facet responses; thread-safe"""
+
+    def __init__(self, ttl=FACET_CACHE_TTL, max_entries=FACET_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        # Bumped on every item change so results computed before it are not stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key, body, generation):
+        """Store body unless an item changed since generation was read"""
+        with self._lock:
+            if generation != self.generation:
+                return
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                # Drop the oldest entry (dicts keep insertion order)
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (time.monotonic(), body)
+
+    def invalidate(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def on_item_event(self, event_type, item_id, item):
+        self.invalidate()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'ttl_seconds': self.ttl,
+            }
+
+
+facet_cache = FacetCache()
+item_events.subscribe(facet_cache.on_item_event)
@@ -0,0 +1,141 @@
+"""
+Startup health checks and readiness
+
+The database and S3 probes run concurrently on a background thread, each
+bounded by HEALTH_CHECK_TIMEOUT, so the server binds its port immediately.
+The server is ready once the database is reachable and its tables exist; S3 is
+optional (uploads fall back to local storage) and only reported.
+GET /api/health returns the current state and re-runs the checks while the
+server is not ready.
+"""
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import psycopg2
+from database_config import DatabaseManager
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Import S3 upload functionality (optional - local storage is used without it)
+try:
+    import s3_upload
+    S3_AVAILABLE = True
+except ImportError:
+    s3_upload = None
+    S3_AVAILABLE = False
+
+# ======= HEALTH CHECK CONFIGURATION =======
+HEALTH_CHECK_TIMEOUT = float(os.getenv('HEALTH_CHECK_TIMEOUT', 5))
+# Minimum seconds between re-checks triggered by /api/health while not ready
+HEALTH_RECHECK_INTERVAL = float(os.getenv('HEALTH_RECHECK_INTERVAL', 10))
+
+
+def check_database():
+    """Returns (status, detail)"""
+    db = DatabaseManager()
+    if not db.connect():
+        return 'error', 'connection failed'
+    try:
+        db.execute_query("SELECT COUNT(*) FROM users")
+        return 'ok', None
+    except psycopg2.Error:
+        return 'error', "tables not found - run 'python database_config.py'"
+    finally:
+        db.disconnect()
+
+
+def check_s3():
+    """Returns (status, detail)"""
+    if not S3_AVAILABLE:
+        return 'disabled', 'S3 module not available - using local storage'
+    if not s3_upload.S3_CONFIGURED:
+        return 'disabled', 'AWS credentials not configured - using local storage'
+    if s3_upload.test_s3_connection():
+        return 'ok', None
+    return 'error', 'bucket not accessible - using local storage as fallback'
+
+
+CHECKS = {
+    'database': check_database,
+    's3': check_s3,
+}
+
+
+class HealthState:
+    """Readiness flag plus the latest result of each check"""
+
+    def __init__(self, timeout=HEALTH_CHECK_TIMEOUT):
+        self.timeout = timeout
+        self.ready = False
+        self.checks = {}
+        self.started_at = time.time()
+        self.checked_at = None
+        self._lock = threading.Lock()
+        self._running = False
+
+    def start(self):
+        """Run the checks on a background thread (no-op while a run is in progress)"""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        threading.Thread(target=self._run, name='health-check', daemon=True).start()
+
+    def _run(self):
+        try:
+            self.run_checks()
+        finally:
+            with self._lock:
+                self._running = False
+
+    def run_checks(self):
+        """Run every check concurrently, each bounded by the timeout"""
+        executor = ThreadPoolExecutor(max_workers=len(CHECKS), thread_name_prefix='health')
+        started = time.monotonic()
+        futures = {name: executor.submit(check) for name, check in CHECKS.items()}
+        results = {}
+        for name, future in futures.items():
+            remaining = max(0.0, self.timeout - (time.monotonic() - started))
+            try:
+                status, detail = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                status, detail = 'timeout', f'no answer within {self.timeout:g}s'
+            except Exception as e:
+                status, detail = 'error', str(e)
+            results[name] = {'status': status}
+            if detail:
+                results[name]['detail'] = detail
+        # Checks that timed out keep running; their threads exit on their own
+        executor.shutdown(wait=False)
+
+        with self._lock:
+            self.checks = results
+            self.checked_at = time.time()
+            self.ready = results['database']['status'] == 'ok'
+
+        for name, result in results.items():
+            label = 'SUCCESS' if result['status'] == 'ok' else 'INFO' if result['status'] == 'disabled' else 'WARNING'
+            print(f"{label} - Health check {name}: {result['status']}"
+                  + (f" ({result['detail']})" if 'detail' in result else ''))
+        return self.ready
+
+    def snapshot(self):
+        """Current state for /api/health; re-checks in the background while not ready"""
+        with self._lock:
+            stale = (not self.ready and self.checked_at is not None
+                     and time.time() - self.checked_at > HEALTH_RECHECK_INTERVAL)
+            state = {
+                'status': 'ready' if self.ready else 'starting' if self.checked_at is None else 'unavailable',
+                'ready': self.ready,
+                'uptime_seconds': round(time.time() - self.started_at, 1),
+                'checks': dict(self.checks),
+            }
+        if stale:
+            self.start()
+        return state
+
+
+health = HealthState()
@@ -0,0 +1,100 @@
+"""
+Content-addressed image storage
+
+Originals are stored under the sha256 digest of their content and indexed in
+the image_blobs table (hash -> URL, variants, reference count). Uploading an
+image that is already stored takes a reference to the existing blob instead of
+uploading it again; deleting the last item that references a blob deletes the
+stored original and its variants.
+"""
+from psycopg2.extras import Json
+from storage import storage_for_url
+
+
+def acquire_blob(db, content_hash):
+    """
+    Take a reference to an already stored blob.
+    Returns {'image_url', 'image_variants', 'perceptual_hash'} or None when the content is new.
+    The UPDATE waits for a release_blob holding the row lock, and finds no row
+    if that release deleted the blob.
+    """
+    rows = db.execute_query(
+        """
+        UPDATE image_blobs SET ref_count = ref_count + 1
+        WHERE content_hash = %s
+        RETURNING image_url, image_variants, perceptual_hash
+        """,
+        (content_hash,)
+    )
+    return dict(rows[0]) if rows else None
+
+
+def register_blob(db, content_hash, image_url, image_variants, size_bytes, perceptual_hash=None):
+    """
+    Record a newly stored blob holding one reference. If a concurrent upload of
+    the same content registered first, a reference to that blob is taken instead
+    and its URLs are returned (our copy is deleted if it landed elsewhere).
+    """
+    rows = db.execute_query(
+        """
+        INSERT INTO image_blobs (content_hash, image_url, image_variants, size_bytes, perceptual_hash, ref_count)
+        VALUES (%s, %s, %s, %s, %s, 1)
+        ON CONFLICT (content_hash) DO UPDATE SET
+            ref_count = image_blobs.ref_count + 1,
+            perceptual_hash = COALESCE(image_blobs.perceptual_hash, EXCLUDED.perceptual_hash)
+        RETURNING image_url, image_variants, perceptual_hash
+        """,
+        (content_hash, image_url, Json(image_variants) if image_variants else None, size_bytes, perceptual_hash)
+    )
+    blob = dict(rows[0])
+    if blob['image_url'] != image_url:
+        print(f"INFO - Blob {content_hash[:12]} was stored concurrently, discarding duplicate copy")
+        delete_stored_files(image_url, image_variants)
+    return blob
+
+
+def release_blob(db, content_hash):
+    """
+    Drop one reference to a blob; when none are left, delete the index row and
+    the stored files. Returns True if the blob was deleted.
+
+    Runs as one transaction holding the row lock (acquire_blob's UPDATE and
+    register_blob's INSERT on the same content wait for it). The files are
+    deleted before the lock is released, so a concurrent acquire_blob either
+    takes a reference while the blob still exists or finds none once its files
+    are gone (and the upload stores a fresh copy).
+    """
+    with db.transaction() as cursor:
+        cursor.execute(
+            "SELECT ref_count, image_url, image_variants FROM image_blobs WHERE content_hash = %s FOR UPDATE",
+            (content_hash,)
+        )
+        blob = cursor.fetchone()
+        if blob is None:
+            return False
+        if blob['ref_count'] > 1:
+            cursor.execute(
+                "UPDATE image_blobs SET ref_count = ref_count - 1 WHERE content_hash = %s",
+                (content_hash,)
+            )
+            return False
+
+        cursor.execute("DELETE FROM image_blobs WHERE content_hash = %s", (content_hash,))
+        delete_stored_files(blob['image_url'], blob['image_variants'])
+
+    print(f"DELETE - Removed unreferenced image blob {content_hash[:12]}")
+    return True
+
+
+def delete_stored_files(image_url, image_variants=None):
+    """Delete an original and its variants from their storage backend (errors are logged, not raised)"""
+    urls = {image_url}
+    urls.update((image_variants or {}).values())
+
+    for url in urls:
+        try:
+            storage, name = storage_for_url(url)
+            if storage is not None:
+                storage.delete(name)
+        except Exception as e:
+            print(f"WARNING - Could not delete stored file {url}: {e}")
@@ -0,0 +1,120 @@
+"""
+Ingest-time image normalization
+
+Before an uploaded original is stored it is decoded, rotated according to its
+EXIF orientation, downscaled so the longest edge is at most INGEST_MAX_EDGE,
+and re-encoded (JPEG at INGEST_JPEG_QUALITY, or PNG when it has transparency)
+without EXIF/XMP metadata such as camera details and GPS position. The CPU
+work runs in a process pool so upload worker threads - and the GIL shared
+with request threads - are not held up by image decoding.
+"""
+import io
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image, ImageOps
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# ======= INGEST CONFIGURATION =======
+INGEST_ENABLED = os.getenv('INGEST_ENABLED', 'true').lower() == 'true'
+INGEST_MAX_EDGE = int(os.getenv('INGEST_MAX_EDGE', 2048))
+INGEST_JPEG_QUALITY = int(os.getenv('INGEST_JPEG_QUALITY', 85))
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', max(1, min(4, (os.cpu_count() or 2) - 1))))
+# Seconds to wait for one image before the original is stored unchanged
+INGEST_TIMEOUT = float(os.getenv('INGEST_TIMEOUT', 30))
+
+
+def normalize_image(data, max_edge=INGEST_MAX_EDGE, quality=INGEST_JPEG_QUALITY):
+    """
+    Runs in a worker process. Returns (normalized bytes, extension, content type),
+    or None for images that are stored unchanged (animations).
+    Raises if data is not a decodable image.
+    """
+    with Image.open(io.BytesIO(data)) as original:
+        if getattr(original, 'is_animated', False):
+            return None
+        if original.format == 'JPEG':
+            # Let the JPEG decoder downscale by a power of two while decoding
+            original.draft('RGB', (max_edge, max_edge))
+        icc_profile = original.info.get('icc_profile')
+
+        image = ImageOps.exif_transpose(original)
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+        buffer = io.BytesIO()
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+        if has_alpha:
+            image.save(buffer, 'PNG', optimize=True, icc_profile=icc_profile)
+            return buffer.getvalue(), 'png', 'image/png'
+
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True, icc_profile=icc_profile)
+        return buffer.getvalue(), 'jpg', 'image/jpeg'
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    """Process pool shared by all upload workers, created on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that runs request threads can copy held locks
+            _pool = ProcessPoolExecutor(max_workers=INGEST_WORKERS,
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def normalize_upload(upload, timeout=INGEST_TIMEOUT):
+    """
+    Normalize an UploadedFile in place. Returns (bytes_before, bytes_after), or
+    None when the original is kept (disabled, animated, undecodable or timed out).
+    """
+    if not INGEST_ENABLED:
+        return None
+
+    upload.file.seek(0)
+    data = upload.file.read()
+    upload.file.seek(0)
+
+    try:
+        result = _get_pool().submit(normalize_image, data).result(timeout=timeout)
+    except BrokenProcessPool as e:
+        print(f"ERROR - Image ingest process pool failed, restarting it: {e}")
+        _reset_pool()
+        return None
+    except Exception as e:
+        print(f"WARNING - Could not normalize {upload.filename}, storing it unchanged: {e}")
+        return None
+
+    if result is None:
+        return None
+
+    normalized, extension, content_type = result
+    stem = os.path.splitext(upload.filename)[0] or 'image'
+    upload.replace_content(normalized, f"{stem}.{extension}", content_type)
+    return len(data), len(normalized)
+
+
+def shutdown(wait=True):
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=wait)
+        _pool = None
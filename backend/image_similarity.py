@@ -0,0 +1,300 @@
+"""
+Perceptual image hashes and a similar-photo index
+
+Every stored original gets a 64-bit difference hash (dHash): the image is
+shrunk to 9x8 grayscale pixels and each bit records whether a pixel is darker
+than its right-hand neighbour. Photos of the same object - recompressed,
+resized or slightly recropped - end up a few bits apart, so similarity is the
+Hamming distance between two hashes.
+
+The hashes of listed items are held in a NumPy uint64 array; a lookup XORs the
+query hash against all of them and counts bits in one vectorized pass, which
+takes well under a millisecond for tens of thousands of images. The index is
+loaded once from the database and kept current from item_events.
+
+Hashes are stored as signed BIGINT; to_db/from_db convert.
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+from database_config import DatabaseManager
+from storage import storage_for_url
+import item_events
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Pillow is optional - without it uploads are stored without a perceptual hash
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    Image = ImageOps = None
+    PIL_AVAILABLE = False
+
+# NumPy is optional - without it /api/items/{id}/similar-images is unavailable
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+# ======= SIMILARITY CONFIGURATION =======
+# Largest Hamming distance (of 64 bits) still reported as similar
+SIMILAR_IMAGE_MAX_DISTANCE = int(os.getenv('SIMILAR_IMAGE_MAX_DISTANCE', 10))
+SIMILAR_IMAGE_LIMIT = int(os.getenv('SIMILAR_IMAGE_LIMIT', 10))
+
+HASH_SIZE = 8
+HASH_BITS = HASH_SIZE * HASH_SIZE
+HIDDEN_STATUS = 'returned'
+INITIAL_CAPACITY = 1024
+
+
+def dhash(file_obj):
+    """64-bit difference hash of an image file object (unsigned int); the file position is restored"""
+    position = file_obj.tell()
+    file_obj.seek(0)
+    try:
+        with Image.open(file_obj) as image:
+            # Let the JPEG decoder downscale while decoding - only 9x8 pixels are needed
+            image.draft('L', (HASH_SIZE * 4, HASH_SIZE * 4))
+            image = ImageOps.exif_transpose(image)
+            pixels = image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS).tobytes()
+    finally:
+        file_obj.seek(position)
+
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for column in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + column] < pixels[offset + column + 1])
+    return value
+
+
+def compute_hash(file_obj):
+    """dHash as stored in the database (signed), or None when the image cannot be hashed"""
+    if not PIL_AVAILABLE:
+        return None
+    try:
+        return to_db(dhash(file_obj))
+    except Exception as e:
+        print(f"WARNING - Could not compute perceptual hash: {e}")
+        return None
+
+
+def to_db(value):
+    """Unsigned 64-bit hash -> signed BIGINT"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def from_db(value):
+    """Signed BIGINT -> unsigned 64-bit hash"""
+    return value & 0xFFFFFFFFFFFFFFFF
+
+
+def _popcount(values):
+    """Set bits per uint64 element"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    # NumPy < 2.0: count per byte through a lookup table
+    return _BYTE_POPCOUNT[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+_BYTE_POPCOUNT = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8) if NUMPY_AVAILABLE else None
+
+
+class SimilarityIndex:
+    """Perceptual hashes of listed items in a contiguous uint64 array; thread-safe"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self.loaded = False
+        self.load_seconds = None
+        self.lookups = 0
+
+    def _reset(self):
+        self._hashes = np.zeros(INITIAL_CAPACITY, dtype=np.uint64) if NUMPY_AVAILABLE else None
+        # position -> item id, and back
+        self._ids = []
+        self._positions = {}
+
+    # ----- index maintenance -----
+
+    def add(self, item_id, perceptual_hash):
+        """Index an item's hash (the signed database value)"""
+        item_id = str(item_id)
+        value = np.uint64(from_db(perceptual_hash))
+        with self._lock:
+            position = self._positions.get(item_id)
+            if position is None:
+                position = len(self._ids)
+                if position == len(self._hashes):
+                    self._hashes = np.concatenate([self._hashes, np.zeros(len(self._hashes), dtype=np.uint64)])
+                self._ids.append(item_id)
+                self._positions[item_id] = position
+            self._hashes[position] = value
+
+    def remove(self, item_id):
+        with self._lock:
+            self._remove(str(item_id))
+
+    def _remove(self, item_id):
+        position = self._positions.pop(item_id, None)
+        if position is None:
+            return
+        # Move the last entry into the hole so the array stays contiguous
+        last = len(self._ids) - 1
+        if position != last:
+            moved_id = self._ids[last]
+            self._ids[position] = moved_id
+            self._hashes[position] = self._hashes[last]
+            self._positions[moved_id] = position
+        self._ids.pop()
+
+    def on_item_event(self, event_type, item_id, item):
+        with self._lock:
+            if not self.loaded:
+                # The initial load reads the committed row from the database
+                return
+            if (event_type == item_events.ITEM_DELETED or item is None
+                    or item.get('status') == HIDDEN_STATUS or item.get('image_phash') is None):
+                self._remove(item_id)
+            else:
+                self.add(item_id, item['image_phash'])
+
+    def load(self, db=None):
+        """(Re)build the index from the database; holds the lock so events wait for it"""
+        if not NUMPY_AVAILABLE:
+            return False
+        own_connection = db is None
+        if own_connection:
+            db = DatabaseManager()
+            if not db.connect():
+                return False
+        try:
+            with self._lock:
+                started = time.perf_counter()
+                _, rows = db.execute_query_rows(
+                    "SELECT id, image_phash FROM items WHERE image_phash IS NOT NULL AND status != %s",
+                    (HIDDEN_STATUS,)
+                )
+                self._reset()
+                for item_id, perceptual_hash in rows:
+                    self.add(item_id, perceptual_hash)
+                self.loaded = True
+                self.load_seconds = time.perf_counter() - started
+            print(f"SUCCESS - Image similarity index loaded: {len(self._ids)} images "
+                  f"in {self.load_seconds * 1000:.1f} ms")
+            return True
+        except Exception as e:
+            print(f"ERROR - Could not load image similarity index: {e}")
+            return False
+        finally:
+            if own_connection:
+                db.disconnect()
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            with self._lock:
+                # Another thread may have finished loading while this one waited
+                if not self.loaded:
+                    self.load()
+        return self.loaded
+
+    def start_loading(self):
+        """Load the index on a background thread"""
+        if NUMPY_AVAILABLE:
+            threading.Thread(target=self.ensure_loaded, name='similarity-load', daemon=True).start()
+
+    # ----- lookups -----
+
+    def nearest(self, perceptual_hash, limit=SIMILAR_IMAGE_LIMIT, max_distance=SIMILAR_IMAGE_MAX_DISTANCE,
+                exclude_id=None):
+        """[(item_id, distance)] of the closest indexed images, nearest first"""
+        query = np.uint64(from_db(perceptual_hash))
+        with self._lock:
+            self.lookups += 1
+            count = len(self._ids)
+            if not count:
+                return []
+            distances = _popcount(self._hashes[:count] ^ query)
+            if exclude_id is not None:
+                position = self._positions.get(str(exclude_id))
+                if position is not None:
+                    distances[position] = HASH_BITS + 1
+            close = np.flatnonzero(distances <= max_distance)
+            close = close[np.argsort(distances[close], kind='stable')[:limit]]
+            return [(self._ids[position], int(distances[position])) for position in close]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'available': NUMPY_AVAILABLE,
+                'loaded': self.loaded,
+                'images': len(self._ids),
+                'lookups': self.lookups,
+                'load_ms': round(self.load_seconds * 1000, 1) if self.load_seconds is not None else None,
+            }
+
+
+similarity_index = SimilarityIndex()
+item_events.subscribe(similarity_index.on_item_event)
+
+
+def backfill_hashes(limit=None):
+    """Compute perceptual hashes for existing items that have an image but no hash"""
+    db = DatabaseManager()
+    if not db.connect():
+        return False
+
+    try:
+        query = """
+            SELECT id, image_url, image_hash FROM items
+            WHERE image_url IS NOT NULL AND image_phash IS NULL
+            ORDER BY created_at DESC
+        """
+        params = None
+        if limit:
+            query += " LIMIT %s"
+            params = (limit,)
+        items = db.execute_query(query, params)
+        print(f"INFO - {len(items)} items need a perceptual hash")
+
+        done = 0
+        for item in items:
+            try:
+                storage, name = storage_for_url(item['image_url'])
+                if storage is None:
+                    raise ValueError(f"Unsupported image location: {item['image_url']}")
+                with storage.open(name) as original:
+                    perceptual_hash = to_db(dhash(original))
+                db.execute_query("UPDATE items SET image_phash = %s WHERE id = %s", (perceptual_hash, item['id']))
+                if item['image_hash']:
+                    db.execute_query(
+                        "UPDATE image_blobs SET perceptual_hash = %s WHERE content_hash = %s AND perceptual_hash IS NULL",
+                        (perceptual_hash, item['image_hash'])
+                    )
+                done += 1
+            except Exception as e:
+                print(f"ERROR - Could not hash the image of item {item['id']}: {e}")
+
+        print(f"SUCCESS - Backfilled perceptual hashes for {done}/{len(items)} items")
+        return True
+    finally:
+        db.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Perceptual hashes for finding similar item photos")
+    parser.add_argument('--backfill', action='store_true', help='hash the images of existing items')
+    parser.add_argument('--limit', type=int, help='maximum number of items to process')
+    args = parser.parse_args()
+
+    if args.backfill:
+        sys.exit(0 if backfill_hashes(args.limit) else 1)
+    parser.print_help()
@@ -0,0 +1,162 @@
+"""
+Responsive image variants - small/medium/large renditions of item images
+generated with Pillow and stored next to the original (in the same storage backend)
+
+Run as a script to backfill variants for items uploaded before this existed:
+    python image_variants.py --backfill [--limit N]
+"""
+import io
+import os
+import sys
+import argparse
+from PIL import Image, ImageOps
+from psycopg2.extras import Json
+from database_config import DatabaseManager
+from storage import storage_for_url
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# ======= VARIANT CONFIGURATION =======
+IMAGE_VARIANT_FORMAT = os.getenv('IMAGE_VARIANT_FORMAT', 'webp').lower()
+IMAGE_VARIANT_QUALITY = int(os.getenv('IMAGE_VARIANT_QUALITY', 80))
+
+# Longest edge in pixels of each variant
+VARIANT_SIZES = {
+    'small': 320,    # list rows and thumbnails
+    'medium': 800,   # grid cards
+    'large': 1600,   # item detail page
+}
+
+# Pillow format, file extension and content type per output format
+VARIANT_FORMATS = {
+    'webp': ('WEBP', 'webp', 'image/webp'),
+    'jpeg': ('JPEG', 'jpg', 'image/jpeg'),
+}
+
+
+def generate_variants(file_obj):
+    """
+    Render the variants of an image.
+    Returns (renditions, aliases, extension, content_type) where renditions maps
+    variant name -> encoded bytes and aliases maps names that would be identical
+    to a smaller rendition (because the original is small) to that rendition's name.
+    """
+    pil_format, extension, content_type = VARIANT_FORMATS[IMAGE_VARIANT_FORMAT]
+
+    file_obj.seek(0)
+    with Image.open(file_obj) as original:
+        image = ImageOps.exif_transpose(original)
+        if pil_format == 'JPEG' and image.mode != 'RGB':
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if image.mode in ('LA', 'PA', 'P') else 'RGB')
+
+        longest_edge = max(image.size)
+
+        # Variants never upscale, so several names may collapse to the original size
+        targets = []
+        aliases = {}
+        for name, edge in sorted(VARIANT_SIZES.items(), key=lambda entry: entry[1]):
+            edge = min(edge, longest_edge)
+            if targets and targets[-1][1] == edge:
+                aliases[name] = targets[-1][0]
+            else:
+                targets.append((name, edge))
+
+        # Render largest first and derive each smaller variant from the previous one
+        renditions = {}
+        source = image
+        for name, edge in reversed(targets):
+            rendition = source.copy()
+            rendition.thumbnail((edge, edge), Image.LANCZOS)
+            buffer = io.BytesIO()
+            rendition.save(buffer, pil_format, quality=IMAGE_VARIANT_QUALITY)
+            renditions[name] = buffer.getvalue()
+            source = rendition
+
+    return renditions, aliases, extension, content_type
+
+
+def _store_variant(image_url, name, data, extension, content_type):
+    """Store one rendition in the same backend as the original image and return its URL"""
+    storage, original_name = storage_for_url(image_url)
+    if storage is None:
+        raise ValueError(f"Unsupported image location: {image_url}")
+    stem = os.path.splitext(original_name)[0]
+    return storage.put(f"{stem}_{name}.{extension}", data, content_type)
+
+
+def create_image_variants(file_obj, image_url):
+    """Generate and store all variants for an uploaded image; returns {name: url}"""
+    renditions, aliases, extension, content_type = generate_variants(file_obj)
+
+    variant_urls = {}
+    for name, data in renditions.items():
+        variant_urls[name] = _store_variant(image_url, name, data, extension, content_type)
+    for name, target in aliases.items():
+        variant_urls[name] = variant_urls[target]
+
+    original_size = file_obj.seek(0, os.SEEK_END)
+    print(f"SUCCESS - Created image variants for {image_url}: " +
+          ", ".join(f"{name}={len(data)}B" for name, data in renditions.items()) +
+          f" (original {original_size}B)")
+    return variant_urls
+
+
+def _open_original(image_url):
+    """Fetch an original image from whichever storage backend holds it as a file object"""
+    storage, name = storage_for_url(image_url)
+    if storage is None:
+        raise ValueError(f"Unsupported image location: {image_url}")
+    return storage.open(name)
+
+
+def backfill_variants(limit=None):
+    """Generate variants for existing items that have an image but no variants"""
+    db = DatabaseManager()
+    if not db.connect():
+        return False
+
+    try:
+        query = """
+            SELECT id, image_url FROM items
+            WHERE image_url IS NOT NULL AND image_variants IS NULL
+            ORDER BY created_at DESC
+        """
+        params = None
+        if limit:
+            query += " LIMIT %s"
+            params = (limit,)
+        items = db.execute_query(query, params)
+        print(f"INFO - {len(items)} items need image variants")
+
+        done = 0
+        for item in items:
+            try:
+                with _open_original(item['image_url']) as original:
+                    variant_urls = create_image_variants(original, item['image_url'])
+                db.execute_query(
+                    "UPDATE items SET image_variants = %s WHERE id = %s",
+                    (Json(variant_urls), item['id'])
+                )
+                done += 1
+            except Exception as e:
+                print(f"ERROR - Could not create variants for item {item['id']}: {e}")
+
+        print(f"SUCCESS - Backfilled image variants for {done}/{len(items)} items")
+        return True
+    finally:
+        db.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate responsive image variants")
+    parser.add_argument('--backfill', action='store_true', help='create variants for existing items')
+    parser.add_argument('--limit', type=int, help='maximum number of items to process')
+    args = parser.parse_args()
+
+    if args.backfill:
+        sys.exit(0 if backfill_variants(args.limit) else 1)
+    parser.print_help()
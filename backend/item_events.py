@@ -0,0 +1,43 @@
+"""
+In-process item change events
+
+Write handlers publish an event after an item row is created, updated or
+deleted; in-memory structures (matching engine, search index, caches)
+subscribe to stay current without polling the database. Subscribers run
+synchronously on the publishing thread, so they must be fast and must not
+touch the database (hand such work to a background thread); a failing
+subscriber is logged and does not affect the request or other subscribers.
+"""
+import threading
+
+ITEM_CREATED = 'created'
+ITEM_UPDATED = 'updated'
+ITEM_DELETED = 'deleted'
+
+_subscribers = []
+_lock = threading.Lock()
+
+
+def subscribe(callback):
+    """Register callback(event_type, item_id, item) - item is the row dict, or None for deletes"""
+    with _lock:
+        _subscribers.append(callback)
+    return callback
+
+
+def unsubscribe(callback):
+    with _lock:
+        if callback in _subscribers:
+            _subscribers.remove(callback)
+
+
+def publish(event_type, item_id, item=None):
+    """Notify every subscriber of a committed change to an item"""
+    with _lock:
+        subscribers = list(_subscribers)
+    item_id = str(item_id)
+    for callback in subscribers:
+        try:
+            callback(event_type, item_id, item)
+        except Exception as e:
+            print(f"ERROR - Item event subscriber {getattr(callback, '__qualname__', callback)} failed: {e}")
@@ -0,0 +1,122 @@
+"""
+JSON serialization for API responses - orjson when installed, otherwise the
+stdlib encoder with type-specific handlers for database values
+"""
+import os
+import json
+import uuid
+from datetime import datetime, date, time
+from decimal import Decimal
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# orjson is optional - it encodes datetime/date/UUID natively and returns bytes
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+# 'auto' uses orjson when it is installed; 'stdlib' forces the json module
+JSON_SERIALIZER = os.getenv('JSON_SERIALIZER', 'auto').lower()
+
+
+# Handlers keyed by exact type so the lookup is a single dict hit per value
+_TYPE_HANDLERS = {
+    datetime: datetime.isoformat,
+    date: date.isoformat,
+    time: time.isoformat,
+    uuid.UUID: str,
+    Decimal: str,
+    memoryview: lambda value: value.tobytes().decode('utf-8', 'replace'),
+    bytes: lambda value: value.decode('utf-8', 'replace'),
+    set: list,
+    frozenset: list,
+}
+
+
+def _default(obj):
+    """Encode values the json module does not understand (row timestamps, UUIDs, ...)"""
+    handler = _TYPE_HANDLERS.get(type(obj))
+    if handler is not None:
+        return handler(obj)
+    # Same last resort as the old json.dumps(..., default=str)
+    return str(obj)
+
+
+_stdlib_encoder = json.JSONEncoder(default=_default, ensure_ascii=False, separators=(',', ':'))
+
+
+def stdlib_dumps(data):
+    """Serialize with the stdlib encoder and return UTF-8 bytes"""
+    return _stdlib_encoder.encode(data).encode('utf-8')
+
+
+def orjson_dumps(data):
+    """Serialize with orjson (datetime, date and UUID are handled natively)"""
+    return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+if JSON_SERIALIZER == 'stdlib' or not ORJSON_AVAILABLE:
+    dumps = stdlib_dumps
+    SERIALIZER_NAME = 'stdlib'
+else:
+    dumps = orjson_dumps
+    SERIALIZER_NAME = 'orjson'
+
+
+# ----- tuple rows -----
+# Listing rows come from the database as tuples. They are encoded column by
+# column into "key":value pairs without building a dict per row first.
+
+_encode_string = json.encoder.encode_basestring
+
+
+def _encode_other(value):
+    return _stdlib_encoder.encode(value)
+
+
+def _encode_isoformat(value):
+    return '"' + value.isoformat() + '"'
+
+
+def _encode_str(value):
+    return '"' + str(value) + '"'
+
+
+# Exact type -> function returning the JSON text of a value; anything else goes through the encoder
+_VALUE_ENCODERS = {
+    str: _encode_string,
+    int: int.__repr__,
+    bool: lambda value: 'true' if value else 'false',
+    type(None): lambda value: 'null',
+    datetime: _encode_isoformat,
+    date: _encode_isoformat,
+    time: _encode_isoformat,
+    uuid.UUID: _encode_str,
+}
+
+
+def row_encoder(columns):
+    """Return a function encoding one tuple row as a JSON object (str) with the given column names"""
+    prefixes = [_encode_string(column) + ':' for column in columns]
+    prefixes[1:] = [',' + prefix for prefix in prefixes[1:]]
+    encoders = _VALUE_ENCODERS
+
+    def encode(row):
+        parts = ['{']
+        for prefix, value in zip(prefixes, row):
+            parts.append(prefix)
+            parts.append(encoders.get(type(value), _encode_other)(value))
+        parts.append('}')
+        return ''.join(parts)
+    return encode
+
+
+def dumps_rows(columns, rows):
+    """Serialize tuple rows as a JSON array of objects keyed by column name (UTF-8 bytes)"""
+    encode = row_encoder(columns)
+    return ('[' + ','.join(map(encode, rows)) + ']').encode('utf-8')
@@ -0,0 +1,116 @@
+"""
+HTTP/1.1 persistent connection support
+
+With keep-alive, the request body has to be consumed exactly before the next
+request line is read from the same socket. RequestBody wraps the socket file
+for one request and never reads past Content-Length; afterwards whatever the
+handler left unread is drained (up to KEEPALIVE_DRAIN_LIMIT bytes) or the
+connection is closed.
+
+Idle connections are closed after KEEPALIVE_TIMEOUT seconds and each
+connection serves at most KEEPALIVE_MAX_REQUESTS requests, so one client
+cannot hold a server thread indefinitely.
+"""
+import os
+import threading
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# ======= KEEP-ALIVE CONFIGURATION =======
+# Seconds a connection may sit idle (or a client may stall mid-request)
+KEEPALIVE_TIMEOUT = float(os.getenv('KEEPALIVE_TIMEOUT', 15))
+KEEPALIVE_MAX_REQUESTS = int(os.getenv('KEEPALIVE_MAX_REQUESTS', 100))
+# Unread request body bytes read and discarded to keep a connection; larger remainders close it
+KEEPALIVE_DRAIN_LIMIT = int(os.getenv('KEEPALIVE_DRAIN_LIMIT', 65536))
+
+DRAIN_CHUNK_SIZE = 16384
+
+
+class RequestBody:
+    """File-like view of one request body: at most Content-Length bytes of the connection"""
+
+    def __init__(self, raw, content_length):
+        self.raw = raw
+        self.remaining = content_length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        if size <= 0:
+            return b''
+        data = self.raw.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def readline(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        if size <= 0:
+            return b''
+        line = self.raw.readline(size)
+        self.remaining -= len(line)
+        return line
+
+    def drain(self, limit=KEEPALIVE_DRAIN_LIMIT):
+        """Discard the unread rest of the body; False when the connection cannot be reused"""
+        if self.remaining > limit:
+            return False
+        try:
+            while self.remaining > 0:
+                if not self.read(min(DRAIN_CHUNK_SIZE, self.remaining)):
+                    return False
+        except OSError:
+            return False
+        return True
+
+
+class ConnectionStats:
+    """Counters for tuning the keep-alive settings; thread-safe"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.reused = 0
+        self.closed_at_limit = 0
+        self.drained_bytes = 0
+        self.closed_unread_body = 0
+
+    def connection_opened(self):
+        with self._lock:
+            self.connections += 1
+
+    def request(self, number):
+        """number: position of the request on its connection (1 = first)"""
+        with self._lock:
+            self.requests += 1
+            if number > 1:
+                self.reused += 1
+            if number == KEEPALIVE_MAX_REQUESTS:
+                self.closed_at_limit += 1
+
+    def body_finished(self, drained, kept):
+        with self._lock:
+            if kept:
+                self.drained_bytes += drained
+            else:
+                self.closed_unread_body += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'connections': self.connections,
+                'requests': self.requests,
+                'reused_requests': self.reused,
+                'requests_per_connection': round(self.requests / self.connections, 2) if self.connections else None,
+                'closed_at_request_limit': self.closed_at_limit,
+                'closed_unread_body': self.closed_unread_body,
+                'drained_bytes': self.drained_bytes,
+                'idle_timeout_seconds': KEEPALIVE_TIMEOUT,
+                'max_requests': KEEPALIVE_MAX_REQUESTS,
+            }
+
+
+connection_stats = ConnectionStats()
@@ -0,0 +1,305 @@
+"""
+Lost-to-found matching engine
+
+Keeps an inverted index (token -> item ids, one per status) over the title,
+description, category and location of active items - those whose status is
+still 'lost' or 'found' - and scores a report against the items of the
+opposite status:
+
+    score = sum over shared tokens of idf * field weight
+            + category bonus, scaled by how close the two dates are
+
+Only items sharing at least one token are scored, so a lookup touches a few
+posting lists instead of the whole table. The index is loaded once from the
+database and kept current from item_events.
+"""
+import os
+import re
+import math
+import time
+import threading
+from datetime import date, datetime
+from database_config import DatabaseManager
+import item_events
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# ======= MATCHING CONFIGURATION =======
+MATCH_DATE_WINDOW_DAYS = int(os.getenv('MATCH_DATE_WINDOW_DAYS', 14))
+MATCH_LIMIT = int(os.getenv('MATCH_LIMIT', 20))
+MATCH_MIN_SCORE = float(os.getenv('MATCH_MIN_SCORE', 1.0))
+# Items scored per lookup; bounds the work for reports made of common words
+MATCH_MAX_CANDIDATES = int(os.getenv('MATCH_MAX_CANDIDATES', 200))
+
+ACTIVE_STATUSES = ('lost', 'found')
+OPPOSITE_STATUS = {'lost': 'found', 'found': 'lost'}
+
+# Weight of a token by the field it appears in (the highest one wins)
+FIELD_WEIGHTS = {
+    'title': 3.0,
+    'location': 2.0,
+    'description': 1.0,
+}
+CATEGORY_BONUS = 1.5
+# Tokens on more than this share of the opposite side's items are ignored
+# (once there are enough items for the ratio to be meaningful)
+MAX_DOCUMENT_FREQUENCY = 0.2
+MIN_ITEMS_FOR_DF_CUTOFF = 50
+
+STOPWORDS = frozenset("""
+    a an and are as at be by for from has have i in is it its my near of on or
+    the this that to was were with lost found item left someone please
+""".split())
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    """Lower-cased word tokens without stopwords, with a naive plural strip"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall((text or '').lower()):
+        if len(token) < 2 or token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def _item_date(item):
+    """date_found, falling back to the creation date"""
+    value = item.get('date_found') or item.get('created_at')
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str) and len(value) >= 10:
+        try:
+            return date.fromisoformat(value[:10])
+        except ValueError:
+            return None
+    return None
+
+
+class MatchRecord:
+    """Compact per-item data the scorer needs"""
+    __slots__ = ('id', 'status', 'tokens', 'category', 'date')
+
+    def __init__(self, item):
+        self.id = str(item['id'])
+        self.status = item.get('status')
+        self.category = (item.get('category') or '').lower()
+        self.date = _item_date(item)
+
+        tokens = {}
+        fields = (
+            ('title', item.get('title')),
+            ('description', item.get('description')),
+            ('location', ' '.join(filter(None, (item.get('location_found'), item.get('location'))))),
+        )
+        for field, text in fields:
+            weight = FIELD_WEIGHTS[field]
+            for token in tokenize(text):
+                if tokens.get(token, 0) < weight:
+                    tokens[token] = weight
+        self.tokens = tokens
+
+
+def _date_factor(lost_date, found_date):
+    """1.0 for same-day reports down to 0.5 at the window edge; 0.25 outside it or if found before lost"""
+    if lost_date is None or found_date is None:
+        return 1.0
+    gap = (found_date - lost_date).days
+    if gap < -1 or abs(gap) > MATCH_DATE_WINDOW_DAYS:
+        return 0.25
+    return 1.0 - 0.5 * abs(gap) / MATCH_DATE_WINDOW_DAYS
+
+
+class MatchingEngine:
+    """Incremental inverted index over active items; thread-safe"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._records = {}
+        # status -> token -> set of item ids
+        self._postings = {status: {} for status in ACTIVE_STATUSES}
+        self._counts = {status: 0 for status in ACTIVE_STATUSES}
+        self.loaded = False
+        self.load_seconds = None
+
+    # ----- index maintenance -----
+
+    def add(self, item):
+        """Index (or re-index) an item row; inactive items are removed"""
+        record = MatchRecord(item)
+        with self._lock:
+            self._remove(record.id)
+            if record.status not in ACTIVE_STATUSES:
+                return
+            postings = self._postings[record.status]
+            for token in record.tokens:
+                postings.setdefault(token, set()).add(record.id)
+            self._records[record.id] = record
+            self._counts[record.status] += 1
+
+    def remove(self, item_id):
+        with self._lock:
+            self._remove(str(item_id))
+
+    def _remove(self, item_id):
+        record = self._records.pop(item_id, None)
+        if record is None:
+            return
+        postings = self._postings[record.status]
+        for token in record.tokens:
+            ids = postings.get(token)
+            if ids is not None:
+                ids.discard(item_id)
+                if not ids:
+                    del postings[token]
+        self._counts[record.status] -= 1
+
+    def on_item_event(self, event_type, item_id, item):
+        with self._lock:
+            if not self.loaded:
+                # The initial load reads the committed row from the database
+                return
+            if event_type == item_events.ITEM_DELETED or item is None:
+                self._remove(item_id)
+            else:
+                self.add(item)
+
+    def load(self, db=None):
+        """(Re)build the index from the database; holds the lock so events wait for it"""
+        own_connection = db is None
+        if own_connection:
+            db = DatabaseManager()
+            if not db.connect():
+                return False
+        try:
+            with self._lock:
+                started = time.perf_counter()
+                rows = db.execute_query(
+                    """
+                    SELECT id, title, description, category, status, location_found, location,
+                           date_found, created_at
+                    FROM items WHERE status IN ('lost', 'found')
+                    """
+                )
+                self._records = {}
+                self._postings = {status: {} for status in ACTIVE_STATUSES}
+                self._counts = {status: 0 for status in ACTIVE_STATUSES}
+                for row in rows:
+                    self.add(row)
+                self.loaded = True
+                self.load_seconds = time.perf_counter() - started
+            print(f"SUCCESS - Matching index loaded: {len(self._records)} active items "
+                  f"in {self.load_seconds * 1000:.1f} ms")
+            return True
+        except Exception as e:
+            print(f"ERROR - Could not load matching index: {e}")
+            return False
+        finally:
+            if own_connection:
+                db.disconnect()
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            with self._lock:
+                # Another thread may have finished loading while this one waited
+                if not self.loaded:
+                    self.load()
+        return self.loaded
+
+    def start_loading(self):
+        """Load the index on a background thread"""
+        threading.Thread(target=self.ensure_loaded, name='matching-load', daemon=True).start()
+
+    # ----- scoring -----
+
+    def match(self, item_id, limit=MATCH_LIMIT, min_score=MATCH_MIN_SCORE):
+        """
+        Ranked candidates of the opposite status for an indexed item:
+        [{'id', 'score', 'matched_terms'}]. Empty for unknown or inactive items.
+        """
+        with self._lock:
+            record = self._records.get(str(item_id))
+            if record is None:
+                return []
+            opposite = OPPOSITE_STATUS[record.status]
+            postings = self._postings[opposite]
+            total = self._counts[opposite]
+            if not total:
+                return []
+
+            # Rarest tokens first: they carry the most evidence and find the
+            # candidates; once MATCH_MAX_CANDIDATES are known, common tokens only
+            # add to the scores of existing candidates instead of scanning everyone
+            shared = []
+            for token, weight in record.tokens.items():
+                ids = postings.get(token)
+                if not ids:
+                    continue
+                if total >= MIN_ITEMS_FOR_DF_CUTOFF and len(ids) > total * MAX_DOCUMENT_FREQUENCY:
+                    continue
+                shared.append((len(ids), token, weight, ids))
+            shared.sort(key=lambda entry: entry[0])
+
+            records = self._records
+            scores = {}
+            terms = {}
+            for document_frequency, token, weight, ids in shared:
+                idf = math.log(1 + total / document_frequency)
+                full = len(scores) >= MATCH_MAX_CANDIDATES
+                if full and document_frequency > len(scores):
+                    targets = [candidate_id for candidate_id in scores if candidate_id in ids]
+                else:
+                    targets = ids
+                for candidate_id in targets:
+                    previous = scores.get(candidate_id)
+                    if previous is None:
+                        if full:
+                            continue
+                        previous = 0.0
+                        terms[candidate_id] = []
+                        full = len(scores) + 1 >= MATCH_MAX_CANDIDATES
+                    contribution = idf * (weight + records[candidate_id].tokens[token]) / 2
+                    scores[candidate_id] = previous + contribution
+                    terms[candidate_id].append((contribution, token))
+
+            results = []
+            for candidate_id, score in scores.items():
+                candidate = self._records[candidate_id]
+                if record.category and record.category != 'other' and record.category == candidate.category:
+                    score += CATEGORY_BONUS
+                if record.status == 'lost':
+                    score *= _date_factor(record.date, candidate.date)
+                else:
+                    score *= _date_factor(candidate.date, record.date)
+                if score >= min_score:
+                    results.append((score, candidate_id))
+
+        results.sort(reverse=True)
+        return [
+            {
+                'id': candidate_id,
+                'score': round(score, 3),
+                'matched_terms': [token for _, token in sorted(terms[candidate_id], reverse=True)[:5]],
+            }
+            for score, candidate_id in results[:limit]
+        ]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'loaded': self.loaded,
+                'active_items': dict(self._counts),
+                'tokens': {status: len(postings) for status, postings in self._postings.items()},
+                'load_ms': round(self.load_seconds * 1000, 1) if self.load_seconds is not None else None,
+            }
+
+
+matching_engine = MatchingEngine()
+item_events.subscribe(matching_engine.on_item_event)
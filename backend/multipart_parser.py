@@ -0,0 +1,242 @@
+"""
+Streaming multipart/form-data parser
+
+Reads the request body incrementally from the socket, keeps regular fields in
+memory (bounded by MAX_FIELD_SIZE) and spools file parts to temporary files so
+memory per upload stays bounded regardless of the file size. Replaces
+cgi.FieldStorage, which is deprecated and removed in Python 3.13.
+"""
+import os
+import hashlib
+import tempfile
+from email.parser import HeaderParser
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# ======= UPLOAD LIMITS FROM ENVIRONMENT =======
+MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE', 5 * 1024 * 1024))
+MAX_FIELD_SIZE = int(os.getenv('MAX_FIELD_SIZE', 64 * 1024))
+MAX_REQUEST_SIZE = int(os.getenv('MAX_REQUEST_SIZE', MAX_FILE_SIZE + 1024 * 1024))
+MAX_PARTS = int(os.getenv('MAX_MULTIPART_PARTS', 50))
+# File parts larger than this are moved from memory to a temp file on disk
+MULTIPART_SPOOL_SIZE = int(os.getenv('MULTIPART_SPOOL_SIZE', 1024 * 1024))
+
+READ_CHUNK_SIZE = 64 * 1024
+MAX_HEADER_SIZE = 16 * 1024
+
+
+class MultipartError(Exception):
+    """Malformed or oversized multipart body; status_code is the HTTP status to answer with"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class UploadedFile:
+    """A file part spooled to memory or disk, hashed (sha256) as it is written"""
+
+    def __init__(self, field_name, filename, content_type):
+        self.field_name = field_name
+        self.filename = filename
+        self.content_type = content_type
+        self.file = tempfile.SpooledTemporaryFile(max_size=MULTIPART_SPOOL_SIZE)
+        self.size = 0
+        self._hash = hashlib.sha256()
+
+    def write(self, data):
+        self.file.write(data)
+        self._hash.update(data)
+        self.size += len(data)
+
+    def replace_content(self, data, filename, content_type):
+        """
+        Swap in processed content (e.g. a normalized image). sha256 keeps
+        describing the bytes that were uploaded.
+        """
+        self.file.close()
+        self.file = tempfile.SpooledTemporaryFile(max_size=MULTIPART_SPOOL_SIZE)
+        self.file.write(data)
+        self.file.seek(0)
+        self.size = len(data)
+        self.filename = filename
+        self.content_type = content_type
+
+    @property
+    def sha256(self):
+        """Hex digest of the content written so far"""
+        return self._hash.hexdigest()
+
+    def close(self):
+        self.file.close()
+
+
+class MultipartForm:
+    """Parsed form: text fields by name plus the uploaded files in body order"""
+
+    def __init__(self):
+        self.fields = {}
+        self.files = []
+
+    def close(self):
+        """Release spooled files that nobody took ownership of"""
+        for upload in self.files:
+            upload.close()
+
+
+def get_boundary(content_type):
+    """Extract the boundary parameter from a multipart Content-Type header"""
+    message = HeaderParser().parsestr(f'Content-Type: {content_type}\r\n\r\n')
+    boundary = message.get_param('boundary')
+    if not boundary or len(boundary) > 200:
+        raise MultipartError('Missing or invalid multipart boundary')
+    return boundary.encode('latin-1')
+
+
+def _parse_part_headers(raw_headers):
+    message = HeaderParser().parsestr(raw_headers.decode('utf-8', 'replace'))
+    if message.get_content_disposition() != 'form-data':
+        raise MultipartError('Multipart part is missing Content-Disposition: form-data')
+    name = message.get_param('name', header='content-disposition')
+    if name is None:
+        raise MultipartError('Multipart part is missing a field name')
+    filename = message.get_filename()
+    content_type = message.get('Content-Type')
+    return name, filename, content_type
+
+
+def parse_multipart(rfile, content_type, content_length,
+                    max_file_size=MAX_FILE_SIZE, max_field_size=MAX_FIELD_SIZE,
+                    max_request_size=MAX_REQUEST_SIZE):
+    """
+    Parse a multipart/form-data body of content_length bytes from rfile.
+
+    Regular fields end up in form.fields; parts with a (non-empty) filename are
+    spooled to UploadedFile objects in form.files, rewound and ready to read.
+    Raises MultipartError (413 for size limits, 400 for malformed bodies).
+    """
+    if content_length <= 0:
+        raise MultipartError('Empty request body')
+    if content_length > max_request_size:
+        raise MultipartError(f'Request body too large (limit {max_request_size} bytes)', 413)
+
+    boundary = get_boundary(content_type)
+    # Every delimiter is preceded by CRLF; prefixing the body with one lets the
+    # first delimiter be matched the same way as the rest
+    delimiter = b'\r\n--' + boundary
+    keep = len(delimiter) + 1
+
+    form = MultipartForm()
+    buffer = bytearray(b'\r\n')
+    remaining = content_length
+    state = 'preamble'
+    part_count = 0
+    current_file = None
+    current_field = None
+    field_name = None
+
+    def fill():
+        nonlocal remaining
+        if remaining <= 0:
+            return False
+        chunk = rfile.read(min(READ_CHUNK_SIZE, remaining))
+        if not chunk:
+            raise MultipartError('Request body ended early')
+        remaining -= len(chunk)
+        buffer.extend(chunk)
+        return True
+
+    def emit(data):
+        if current_file is not None:
+            if current_file.size + len(data) > max_file_size:
+                raise MultipartError(f'File too large (limit {max_file_size} bytes)', 413)
+            current_file.write(data)
+        else:
+            if len(current_field) + len(data) > max_field_size:
+                raise MultipartError(f"Field '{field_name}' too large (limit {max_field_size} bytes)", 413)
+            current_field.extend(data)
+
+    try:
+        while state != 'done':
+            if state == 'preamble':
+                index = buffer.find(delimiter)
+                if index == -1:
+                    # Discard preamble bytes that cannot start a delimiter
+                    del buffer[:max(0, len(buffer) - keep)]
+                    if not fill():
+                        raise MultipartError('Multipart boundary not found')
+                    continue
+                del buffer[:index + len(delimiter)]
+                state = 'after_delimiter'
+
+            elif state == 'after_delimiter':
+                if len(buffer) < 2 and fill():
+                    continue
+                if buffer[:2] == b'--':
+                    state = 'done'
+                elif buffer[:2] == b'\r\n':
+                    del buffer[:2]
+                    state = 'headers'
+                else:
+                    raise MultipartError('Malformed multipart delimiter')
+
+            elif state == 'headers':
+                index = buffer.find(b'\r\n\r\n')
+                if index == -1:
+                    if len(buffer) > MAX_HEADER_SIZE:
+                        raise MultipartError('Multipart part headers too large', 413)
+                    if not fill():
+                        raise MultipartError('Multipart body ended inside part headers')
+                    continue
+                raw_headers = bytes(buffer[:index + 2])
+                del buffer[:index + 4]
+
+                part_count += 1
+                if part_count > MAX_PARTS:
+                    raise MultipartError(f'Too many multipart parts (limit {MAX_PARTS})', 413)
+
+                field_name, filename, part_type = _parse_part_headers(raw_headers)
+                if filename:
+                    current_file = UploadedFile(field_name, filename, part_type)
+                    form.files.append(current_file)
+                    current_field = None
+                else:
+                    current_file = None
+                    current_field = bytearray()
+                state = 'body'
+
+            elif state == 'body':
+                index = buffer.find(delimiter)
+                if index == -1:
+                    # Everything except a possible partial delimiter at the end is part data
+                    safe = len(buffer) - keep
+                    if safe > 0:
+                        emit(bytes(buffer[:safe]))
+                        del buffer[:safe]
+                    if not fill():
+                        raise MultipartError('Multipart body ended inside a part')
+                    continue
+                emit(bytes(buffer[:index]))
+                del buffer[:index + len(delimiter)]
+
+                if current_file is not None:
+                    current_file.file.seek(0)
+                else:
+                    form.fields[field_name] = current_field.decode('utf-8', 'replace')
+                current_file = None
+                current_field = None
+                state = 'after_delimiter'
+
+        # Drain any epilogue so the connection is left at a request boundary
+        while remaining > 0:
+            chunk = rfile.read(min(READ_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+    except Exception:
+        form.close()
+        raise
+
+    return form
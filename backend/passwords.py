@@ -0,0 +1,243 @@
+"""
+Password hashing with bcrypt in a bounded process pool
+
+bcrypt is deliberately slow (~100-300 ms of CPU per hash at the default cost),
+so hashing and verification run in a small process pool instead of on request
+threads, where they would also hold the GIL. At most PASSWORD_MAX_PENDING
+operations may be queued or running; beyond that PasswordPoolBusy is raised so
+the caller can answer 503 instead of letting logins pile up. An operation that
+times out keeps its worker busy, so it stays counted as pending until the pool
+has actually finished it.
+
+Accounts created before bcrypt have an unsalted SHA-256 hex digest as their
+password_hash. verify_password() accepts those and reports that the hash needs
+upgrading, so the login handler can store a bcrypt hash on the next successful
+login (the same happens when BCRYPT_ROUNDS is raised).
+"""
+import os
+import hmac
+import time
+import hashlib
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import bcrypt
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# ======= PASSWORD HASHING CONFIGURATION =======
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+PASSWORD_WORKERS = int(os.getenv('PASSWORD_WORKERS', max(1, min(4, (os.cpu_count() or 2) - 1))))
+# Hash/verify operations queued or running before new ones are refused
+PASSWORD_MAX_PENDING = int(os.getenv('PASSWORD_MAX_PENDING', 32))
+# Seconds to wait for one operation
+PASSWORD_TIMEOUT = float(os.getenv('PASSWORD_TIMEOUT', 10))
+
+# bcrypt only uses the first 72 bytes of a password and refuses longer ones
+MAX_PASSWORD_BYTES = 72
+LATENCY_WINDOW = 1000
+
+
+class PasswordPoolBusy(Exception):
+    """Too many password operations are queued; retry later"""
+
+
+def is_legacy_hash(password_hash):
+    """Unsalted SHA-256 hex digest from before bcrypt"""
+    return len(password_hash) == 64 and all(char in '0123456789abcdef' for char in password_hash)
+
+
+def _bcrypt_rounds(password_hash):
+    """Cost factor of a $2b$12$... hash"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return 0
+
+
+# ----- worker process functions (return the time the work started, for queue-time metrics) -----
+
+def _hash_in_worker(password, rounds):
+    started = time.time()
+    return started, bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode('ascii')
+
+
+def _check_in_worker(password, password_hash):
+    started = time.time()
+    return started, bcrypt.checkpw(password, password_hash)
+
+
+class PasswordHasher:
+    """Process pool running bcrypt with a cap on pending work and timing metrics"""
+
+    def __init__(self, workers=PASSWORD_WORKERS, max_pending=PASSWORD_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._pool = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._hashes = 0
+        self._verifications = 0
+        self._legacy_verifications = 0
+        self._rehashes = 0
+        self._rejected = 0
+        self._failures = 0
+        self._timeouts = 0
+        self._queue_times = deque(maxlen=LATENCY_WINDOW)
+        self._run_times = deque(maxlen=LATENCY_WINDOW)
+        self._dummy_hash = None
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a process that runs request threads can copy held locks
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def _reset_pool(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _run(self, function, *args):
+        """Run function in the pool; raises PasswordPoolBusy when the cap is reached"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise PasswordPoolBusy()
+            self._pending += 1
+        submitted = time.time()
+        try:
+            future = self._get_pool().submit(function, *args)
+        except BaseException as e:
+            with self._lock:
+                self._pending -= 1
+                self._failures += 1
+            if isinstance(e, BrokenProcessPool):
+                print("ERROR - Password hashing process pool failed, restarting it")
+                self._reset_pool()
+            raise
+        # The operation stops being pending when the pool is done with it, not when this caller stops waiting
+        future.add_done_callback(lambda done: self._finished(done, submitted))
+        try:
+            started, result = future.result(timeout=PASSWORD_TIMEOUT)
+        except FutureTimeoutError:
+            print(f"WARNING - Password operation did not finish within {PASSWORD_TIMEOUT}s")
+            with self._lock:
+                self._timeouts += 1
+            raise
+        except BrokenProcessPool:
+            print("ERROR - Password hashing process pool failed, restarting it")
+            self._reset_pool()
+            with self._lock:
+                self._failures += 1
+            raise
+        except Exception:
+            with self._lock:
+                self._failures += 1
+            raise
+        return result
+
+    def _finished(self, future, submitted):
+        """Done callback of every submitted operation: release its pending slot and record its timings"""
+        finished = time.time()
+        timings = None
+        if not future.cancelled() and future.exception() is None:
+            started = future.result()[0]
+            timings = (max(0.0, started - submitted), finished - started)
+        with self._lock:
+            self._pending -= 1
+            if timings is not None:
+                self._queue_times.append(timings[0])
+                self._run_times.append(timings[1])
+
+    def hash_password(self, password):
+        """bcrypt hash (str) of a password; raises ValueError when it is longer than bcrypt allows"""
+        password = password.encode('utf-8')
+        if len(password) > MAX_PASSWORD_BYTES:
+            raise ValueError(f'Password must be at most {MAX_PASSWORD_BYTES} bytes')
+        password_hash = self._run(_hash_in_worker, password, BCRYPT_ROUNDS)
+        with self._lock:
+            self._hashes += 1
+        return password_hash
+
+    def verify_password(self, password, password_hash):
+        """
+        Returns (matches, needs_rehash). Legacy SHA-256 digests are checked in
+        place; bcrypt hashes in the pool.
+        """
+        if is_legacy_hash(password_hash):
+            with self._lock:
+                self._legacy_verifications += 1
+            digest = hashlib.sha256(password.encode('utf-8')).hexdigest()
+            return hmac.compare_digest(digest, password_hash), True
+
+        password = password.encode('utf-8')
+        if len(password) > MAX_PASSWORD_BYTES:
+            # Never accepted at registration, so it cannot match
+            return False, False
+        try:
+            matches = self._run(_check_in_worker, password, password_hash.encode('ascii'))
+        except ValueError:
+            # Not a bcrypt hash
+            return False, False
+        with self._lock:
+            self._verifications += 1
+        return matches, matches and _bcrypt_rounds(password_hash) < BCRYPT_ROUNDS
+
+    def verify_dummy(self, password):
+        """
+        Spend the time of a real check when the account does not exist, so timing
+        does not reveal it. The password is passed unchanged: one too long for
+        bcrypt is refused without hashing here exactly as for a real account.
+        """
+        if self._dummy_hash is None:
+            self._dummy_hash = self.hash_password('dummy password for unknown accounts')
+        self.verify_password(password, self._dummy_hash)
+        return False
+
+    def record_rehash(self):
+        with self._lock:
+            self._rehashes += 1
+
+    def metrics(self):
+        """Counters plus queue and run time percentiles (milliseconds)"""
+        with self._lock:
+            queue_times = sorted(self._queue_times)
+            run_times = sorted(self._run_times)
+            metrics = {
+                'workers': self.workers,
+                'rounds': BCRYPT_ROUNDS,
+                'pending': self._pending,
+                'max_pending': self.max_pending,
+                'hashes': self._hashes,
+                'verifications': self._verifications,
+                'legacy_verifications': self._legacy_verifications,
+                'rehashes': self._rehashes,
+                'rejected_busy': self._rejected,
+                'failures': self._failures,
+                'timeouts': self._timeouts,
+            }
+        for name, samples in (('queue_ms', queue_times), ('run_ms', run_times)):
+            if samples:
+                metrics[name] = {
+                    'p50': round(samples[len(samples) // 2] * 1000, 1),
+                    'p95': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 1),
+                    'max': round(samples[-1] * 1000, 1),
+                }
+        return metrics
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait)
+            self._pool = None
+
+
+password_hasher = PasswordHasher()
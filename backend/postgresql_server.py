@@ -2,26 +2,45 @@
 Enhanced Lost & Found Campus API Server with PostgreSQL Database and AWS S3 Integration
 """
 import http.server
-import socketserver
 import json
 import urllib.parse
 import uuid
-import hashlib
 import jwt
-import mimetypes
 import os
+import threading
+from contextlib import closing
 from datetime import datetime, timedelta
-from database_config import DatabaseManager
+from database_config import DatabaseManager, ITEM_USER_COLUMNS
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import Json
 from dotenv import load_dotenv
+from static_files import static_file_cache, safe_join, is_not_modified, parse_range, send_file_range
+from compression import maybe_compress, is_compressible, precompressed_candidates, stream_compressor
+from streaming import ResponseStream, iter_json_listing, iter_ndjson
+from multipart_parser import parse_multipart, MultipartError, MAX_FILE_SIZE
+from upload_worker import upload_pool, s3_enabled, fail_abandoned_uploads
+from image_blobs import acquire_blob, release_blob
+from storage import local_storage, STORAGE_BACKEND
+from health import health
+import item_events
+from matching import matching_engine
+from image_similarity import similarity_index, SIMILAR_IMAGE_LIMIT, SIMILAR_IMAGE_MAX_DISTANCE, HASH_BITS
+from search_index import search_index, SEARCH_INDEX_ENABLED
+from facets import facet_cache, facet_query, rows_to_facets
+from saved_searches import percolator, SAVED_SEARCH_LIMIT, SAVED_SEARCH_MAX_QUERY_LENGTH, SAVED_SEARCH_STATUSES
+from rate_limit import rate_limiter, retry_after_header, RATE_LIMIT_ENABLED, RATE_LIMIT_TRUST_PROXY
+from passwords import password_hasher, PasswordPoolBusy, MAX_PASSWORD_BYTES
+from suggest import suggest_index, FIELDS as SUGGEST_FIELDS, SUGGEST_LIMIT, SUGGEST_MAX_LIMIT
+from router import Router, timed
+from keepalive import RequestBody, connection_stats, KEEPALIVE_TIMEOUT, KEEPALIVE_MAX_REQUESTS, KEEPALIVE_DRAIN_LIMIT
+from json_serializer import dumps as json_dumps, dumps_rows, SERIALIZER_NAME
 
 # Load environment variables
 load_dotenv()
 
 # Import S3 upload functionality
 try:
-    from s3_upload import upload_file_to_s3, test_s3_connection
+    from s3_upload import upload_file_to_s3, create_presigned_upload, verify_uploaded_object
     S3_AVAILABLE = True
     print("S3 upload module loaded successfully")
 except ImportError as e:
@@ -29,39 +48,216 @@ except ImportError as e:
     S3_AVAILABLE = False
     def upload_file_to_s3(*args, **kwargs):
         raise NotImplementedError("S3 upload not available")
-    def test_s3_connection():
-        return False
 
 # Configuration from environment variables
 PORT = int(os.getenv('PORT', 8000))
 JWT_SECRET = os.getenv('JWT_SECRET', 'your-secret-key-change-this-in-production')
 UPLOAD_DIR = os.getenv('UPLOAD_DIR', 'uploads')
+ADMIN_STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'admin_build', 'static')
+
+# Candidate matches returned with a newly created item
+MATCH_PREVIEW_LIMIT = 5
+# Seconds after a presigned form expires that its upload may still be attached to a new item
+UPLOAD_TOKEN_GRACE = int(os.getenv('UPLOAD_TOKEN_GRACE', 3600))
+
+
+def item_filter_clause(search='', category='', status=''):
+    """WHERE clause and params selecting the items the public listing shows for a search/filter"""
+    conditions = []
+    params = []
+    
+    # ALWAYS exclude returned items from frontend view (users should not see returned items)
+    conditions.append("status != %s")
+    params.append("returned")
+    
+    if search:
+        conditions.append("(title ILIKE %s OR description ILIKE %s)")
+        params.extend([f"%{search}%", f"%{search}%"])
+    
+    if category:
+        conditions.append("category = %s")
+        params.append(category)
+    
+    if status:
+        conditions.append("status = %s")
+        params.append(status)
+    
+    return f"WHERE {' AND '.join(conditions)}", params
 
 class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
+    # Persistent connections: every response has a Content-Length, is chunked, or closes the connection
+    protocol_version = 'HTTP/1.1'
+    # Idle keep-alive connections are closed after this many seconds
+    timeout = KEEPALIVE_TIMEOUT
+    
     def __init__(self, *args, **kwargs):
         self.db = DatabaseManager()
+        self.requests_on_connection = 0
+        self.connection_header_sent = False
+        connection_stats.connection_opened()
         super().__init__(*args, **kwargs)
     
-    def do_OPTIONS(self):
+    def parse_request(self):
+        """Parse the request line and headers; also applies the per-connection request cap"""
+        self.connection_header_sent = False
+        if not super().parse_request():
+            return False
+        self.requests_on_connection += 1
+        connection_stats.request(self.requests_on_connection)
+        if self.requests_on_connection >= KEEPALIVE_MAX_REQUESTS:
+            self.close_connection = True
+        if 'Transfer-Encoding' in self.headers:
+            # Chunked request bodies are not supported, so the next request cannot be found
+            self.close_connection = True
+        return True
+    
+    def send_response(self, code, message=None):
+        self.connection_header_sent = False
+        super().send_response(code, message)
+    
+    def send_header(self, keyword, value):
+        if keyword.lower() == 'connection':
+            self.connection_header_sent = True
+        super().send_header(keyword, value)
+    
+    def end_headers(self):
+        """Tell the client whether the connection stays open, unless a handler already did"""
+        if getattr(self.rfile, 'remaining', 0) > KEEPALIVE_DRAIN_LIMIT:
+            # Answered without reading the body, and too much of it is left to discard
+            self.close_connection = True
+        if not self.connection_header_sent and self.request_version != 'HTTP/0.9':
+            if self.close_connection:
+                self.send_header('Connection', 'close')
+            elif self.request_version == 'HTTP/1.0':
+                # HTTP/1.0 clients asked for keep-alive explicitly (parse_request checked)
+                self.send_header('Connection', 'keep-alive')
+        super().end_headers()
+    
+    def log_error(self, format, *args):
+        # Idle keep-alive connections timing out are routine
+        if not format.startswith('Request timed out'):
+            super().log_error(format, *args)
+    
+    def send_preflight_response(self):
         """Handle CORS preflight requests"""
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        self.send_header('Content-Length', '0')
         self.end_headers()
     
-    def send_cors_response(self, status_code, data=None, content_type='application/json'):
-        """Send response with CORS headers"""
+    def send_cors_response(self, status_code, data=None, content_type='application/json', headers=None):
+        """Send response with CORS headers (plus any extra headers given as a dict)"""
         self.send_response(status_code)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
         self.send_header('Content-type', content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        
+        if not data:
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        
+        if isinstance(data, bytes):
+            body = data  # Already serialized
+        elif content_type == 'application/json':
+            body = json_dumps(data)
+        else:
+            body = data.encode()
+        body, encoding = maybe_compress(body, content_type, self.headers.get('Accept-Encoding'))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        if is_compressible(content_type):
+            self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Content-Length', str(len(body)))
         self.end_headers()
+        self.wfile.write(body)
+    
+    def send_streaming_response(self, status_code, chunks, content_type='application/json'):
+        """
+        Send a response body produced incrementally from an iterable of byte chunks.
+        Uses Transfer-Encoding: chunked for HTTP/1.1 clients, otherwise a
+        close-delimited body. Memory is bounded by STREAM_BUFFER_SIZE.
+        
+        Errors are handled here: once the status line is out no other response
+        can be sent, so a failure aborts the connection and the client sees a
+        truncated body. Callers must not send an error response afterwards.
+        """
+        chunked = self.request_version == 'HTTP/1.1' and self.protocol_version == 'HTTP/1.1'
+        compressor, encoding = stream_compressor(content_type, self.headers.get('Accept-Encoding'))
         
-        if data:
-            response = json.dumps(data, default=str) if content_type == 'application/json' else data
-            self.wfile.write(response.encode())
+        try:
+            self.send_response(status_code)
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
+            self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+            self.send_header('Content-type', content_type)
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
+            if is_compressible(content_type):
+                self.send_header('Vary', 'Accept-Encoding')
+            if chunked:
+                self.send_header('Transfer-Encoding', 'chunked')
+            else:
+                self.send_header('Connection', 'close')
+                self.close_connection = True
+            self.end_headers()
+            
+            stream = ResponseStream(self.wfile, chunked, compressor)
+            for chunk in chunks:
+                stream.write(chunk)
+            stream.close()
+        except Exception as e:
+            print(f"ERROR - Streaming response aborted: {e}")
+            self.close_connection = True
+    
+    def token_user_id(self):
+        """User id from a valid JWT, without a database lookup (None when absent or invalid)"""
+        auth_header = self.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return None
+        try:
+            return jwt.decode(auth_header.split(' ')[1], JWT_SECRET, algorithms=['HS256']).get('user_id')
+        except (jwt.InvalidTokenError, IndexError):
+            return None
+    
+    def issue_upload_token(self, user_id, key, expires_in):
+        """Signed token binding a presigned upload key to the user it was issued to"""
+        return jwt.encode({
+            'purpose': 'upload',
+            'user_id': user_id,
+            'key': key,
+            # The item is created after the upload finishes, so allow time beyond the form's expiry
+            'exp': datetime.utcnow() + timedelta(seconds=expires_in + UPLOAD_TOKEN_GRACE)
+        }, JWT_SECRET, algorithm='HS256')
+    
+    def upload_token_key(self, token, user_id):
+        """The key an upload token was issued for, if it is valid and belongs to user_id; else None"""
+        if not isinstance(token, str):
+            return None
+        try:
+            claims = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+        except jwt.InvalidTokenError:
+            return None
+        if claims.get('purpose') != 'upload' or claims.get('user_id') != user_id:
+            return None
+        return claims.get('key')
+    
+    def client_ip(self):
+        """Client address; behind a trusted proxy the address it appended to X-Forwarded-For"""
+        if RATE_LIMIT_TRUST_PROXY:
+            forwarded = self.headers.get('X-Forwarded-For')
+            if forwarded:
+                return forwarded.split(',')[-1].strip()
+        return self.client_address[0]
+    
+    def reject_request(self, status_code, message, retry_after):
+        """Refuse a request without handling it"""
+        self.send_cors_response(status_code, {'error': message}, headers={'Retry-After': retry_after_header(retry_after)})
     
     def get_user_from_token(self):
         """Extract user from JWT token"""
@@ -83,51 +279,90 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
         except (jwt.InvalidTokenError, IndexError, psycopg2.Error):
             return None
     
-    def do_GET(self):
-        """Handle GET requests"""
-        parsed_path = urllib.parse.urlparse(self.path)
-        path = parsed_path.path
-        query_params = urllib.parse.parse_qs(parsed_path.query)
+    def dispatch(self):
+        """Handle a request, reading no more than its body so the connection can be reused"""
+        try:
+            content_length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            content_length = -1
+        if content_length < 0:
+            self.close_connection = True
+            self.send_cors_response(400, {'error': 'Invalid Content-Length'})
+            return
         
+        body = self.rfile = RequestBody(self.rfile, content_length)
         try:
-            # Block statistics-related API calls
-            if path in ['/api/admin/statistics', '/api/admin/stats', '/api/statistics', '/api/stats']:
-                self.send_cors_response(404, {'error': 'Statistics functionality disabled'})
-                return
-            
-            if path == '/api/items':
-                self.handle_get_items(query_params)
-            elif path.startswith('/api/items/'):
-                item_id = path.split('/')[-1]
-                self.handle_get_item(item_id)
-            elif path == '/api/users/me':
-                self.handle_get_current_user()
-            elif path == '/api/categories':
-                self.handle_get_categories()
-            elif path == '/admin/login':
-                # Serve our custom admin login page
-                self.handle_admin_page()
-            elif path == '/admin' or path.startswith('/admin/'):
-                # All other admin routes serve the React app (it handles routing internally)
-                self.handle_react_admin_page()
-            elif path.startswith('/static/'):
-                self.handle_react_admin_static_file(path)
-            elif path == '/api/admin/items':
-                self.handle_get_admin_items(query_params)
-            elif path == '/api/admin/users':
-                self.handle_get_admin_users(query_params)
-            elif path.startswith('/uploads/'):
-                self.handle_static_file(path)
-            elif path == '/':
-                self.send_cors_response(404, {'error': 'Not found'})
+            if self.command == 'OPTIONS':
+                self.send_preflight_response()
             else:
-                self.send_cors_response(404, {'error': 'Not found'})
+                self.route_request()
+        finally:
+            self.rfile = body.raw
+            unread = body.remaining
+            kept = body.drain()
+            connection_stats.body_finished(unread, kept)
+            if not kept:
+                self.close_connection = True
+    
+    do_GET = do_POST = do_PUT = do_DELETE = do_OPTIONS = dispatch
+    
+    def route_request(self):
+        """Route a request through the route table (see ROUTER below the class)"""
+        url = urllib.parse.urlsplit(self.path)
+        match = ROUTER.match(self.command, url.path)
+        if match is None:
+            self.send_cors_response(404, {'error': 'Not found'})
+            return
+        
+        route, params = match
+        if route is None:
+            self.send_cors_response(405, {'error': 'Method not allowed'},
+                                    headers={'Allow': ', '.join(params + ['OPTIONS'])})
+            return
+        
+        self.query_params = urllib.parse.parse_qs(url.query)
+        try:
+            route.call(self, params)
         except Exception as e:
-            print(f"ERROR - GET: {e}")
+            print(f"ERROR - {self.command} {url.path}: {e}")
             self.send_cors_response(500, {'error': 'Internal server error'})
     
+    def handle_statistics_disabled(self):
+        """Statistics endpoints were removed"""
+        self.send_cors_response(404, {'error': 'Statistics functionality disabled'})
+    
+    def send_items_from_index(self, query_params):
+        """Answer the item listing from the in-memory search index; False when the database has to"""
+        try:
+            page = int(query_params.get('page', [1])[0])
+            per_page = int(query_params.get('per_page', [12])[0])
+        except ValueError:
+            return False
+        result = search_index.query(
+            search=query_params.get('search', [''])[0],
+            category=query_params.get('category', [''])[0],
+            status=query_params.get('status', [''])[0],
+            page=page,
+            per_page=per_page
+        )
+        if result is None:
+            return False
+        
+        total, rows = result
+        # Same body as the SQL path; the rows are already serialized
+        body = b''.join((
+            b'{"items":[', b','.join(rows), b'],',
+            json_dumps({'total': total, 'page': page, 'per_page': per_page,
+                        'pages': (total + per_page - 1) // per_page})[1:]
+        ))
+        self.send_cors_response(200, body)
+        return True
+    
     def handle_get_items(self, query_params):
         """Get items with search, filter, and pagination"""
+        if search_index.loaded and self.send_items_from_index(query_params):
+            return
+        
         if not self.db.connect():
             self.send_cors_response(500, {'error': 'Database connection failed'})
             return
@@ -140,37 +375,18 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
             category = query_params.get('category', [''])[0]
             status = query_params.get('status', [''])[0]
             
-            # Build query
-            conditions = []
-            params = []
-            
-            # ALWAYS exclude returned items from frontend view (users should not see returned items)
-            conditions.append("status != %s")
-            params.append("returned")
-            
-            if search:
-                conditions.append("(title ILIKE %s OR description ILIKE %s)")
-                params.extend([f"%{search}%", f"%{search}%"])
-            
-            if category:
-                conditions.append("category = %s")
-                params.append(category)
-            
-            if status:
-                conditions.append("status = %s")
-                params.append(status)
-            
-            where_clause = f"WHERE {' AND '.join(conditions)}"
+            where_clause, params = item_filter_clause(search, category, status)
             
             # Get total count
             count_query = f"SELECT COUNT(*) FROM items {where_clause}"
-            total_result = self.db.execute_query(count_query, params)
-            total = total_result[0]['count']
+            _, total_rows = self.db.execute_query_rows(count_query, params)
+            total = total_rows[0][0]
             
             # Get items with pagination - join with users table to get user names
+            # (fallback to defaults only if user not found - null join)
             offset = (page - 1) * per_page
             items_query = f"""
-                SELECT i.*, u.name as user_name, u.email as user_email
+                SELECT i.*, {ITEM_USER_COLUMNS}
                 FROM items i 
                 LEFT JOIN users u ON i.user_id = u.id
                 {where_clause} 
@@ -178,28 +394,16 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
                 LIMIT %s OFFSET %s
             """
             
-            items = self.db.execute_query(items_query, params + [per_page, offset])
-            
-            # Convert to list of dicts with actual user names
-            items_list = []
-            for item in items:
-                item_dict = dict(item)
-                # Fallback to 'Unknown' only if user not found (null join)
-                if not item_dict.get('user_name'):
-                    item_dict['user_name'] = 'Unknown'
-                if not item_dict.get('user_email'):
-                    item_dict['user_email'] = 'team@example.com'
-                items_list.append(item_dict)
+            columns, rows = self.db.execute_query_rows(items_query, params + [per_page, offset])
             
-            response = {
-                'items': items_list,
-                'total': total,
-                'page': page,
-                'per_page': per_page,
-                'pages': (total + per_page - 1) // per_page
-            }
+            # Rows are encoded straight from the tuples; the rest of the object is appended
+            body = b''.join((
+                b'{"items":', dumps_rows(columns, rows), b',',
+                json_dumps({'total': total, 'page': page, 'per_page': per_page,
+                            'pages': (total + per_page - 1) // per_page})[1:]
+            ))
             
-            self.send_cors_response(200, response)
+            self.send_cors_response(200, body)
             
         except Exception as e:
             print(f"ERROR - Error getting items: {e}")
@@ -207,6 +411,35 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
         finally:
             self.db.disconnect()
     
+    def handle_get_item_facets(self, query_params):
+        """Handle GET /api/items/facets - item counts per category, status and location for a search/filter"""
+        search = query_params.get('search', [''])[0]
+        category = query_params.get('category', [''])[0]
+        status = query_params.get('status', [''])[0]
+        key = (search, category, status)
+        
+        body = facet_cache.get(key)
+        if body is not None:
+            self.send_cors_response(200, body)
+            return
+        
+        if not self.db.connect():
+            self.send_cors_response(500, {'error': 'Database connection failed'})
+            return
+        
+        try:
+            generation = facet_cache.generation
+            where_clause, params = item_filter_clause(search, category, status)
+            rows = self.db.execute_query(facet_query(where_clause), params)
+            body = json_dumps(rows_to_facets(rows))
+            facet_cache.put(key, body, generation)
+            self.send_cors_response(200, body)
+        except Exception as e:
+            print(f"ERROR - Error getting item facets: {e}")
+            self.send_cors_response(500, {'error': 'Failed to get item facets'})
+        finally:
+            self.db.disconnect()
+    
     def handle_get_item(self, item_id):
         """Get single item by ID"""
         if not self.db.connect():
@@ -214,8 +447,8 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
             return
         
         try:
-            query = """
-                SELECT i.*, u.name as user_name, u.email as user_email
+            query = f"""
+                SELECT i.*, {ITEM_USER_COLUMNS}
                 FROM items i 
                 LEFT JOIN users u ON i.user_id = u.id
                 WHERE i.id = %s
@@ -227,11 +460,6 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
                 return
             
             item = dict(items[0])
-            # Fallback to defaults only if user not found (null join)
-            if not item.get('user_name'):
-                item['user_name'] = 'Unknown'
-            if not item.get('user_email'):
-                item['user_email'] = 'team@example.com'
             
             # Get additional images
             images_query = "SELECT * FROM item_images WHERE item_id = %s ORDER BY is_primary DESC"
@@ -246,6 +474,280 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
         finally:
             self.db.disconnect()
     
+    def handle_suggest(self, query_params):
+        """Handle GET /api/suggest?field=title|location&prefix= - frequent values starting with prefix"""
+        field = query_params.get('field', ['title'])[0]
+        if field not in SUGGEST_FIELDS:
+            self.send_cors_response(400, {'error': f"field must be one of: {', '.join(SUGGEST_FIELDS)}"})
+            return
+        try:
+            limit = min(max(int(query_params.get('limit', [SUGGEST_LIMIT])[0]), 1), SUGGEST_MAX_LIMIT)
+        except ValueError:
+            self.send_cors_response(400, {'error': 'limit must be a number'})
+            return
+        
+        if not suggest_index.ensure_loaded():
+            self.send_cors_response(503, {'error': 'Suggestions not available'})
+            return
+        
+        prefix = query_params.get('prefix', [''])[0]
+        self.send_cors_response(200, {
+            'field': field,
+            'prefix': prefix,
+            'suggestions': suggest_index.suggest(field, prefix, limit)
+        })
+    
+    def handle_get_saved_searches(self):
+        """Handle GET /api/saved-searches - the current user's saved searches"""
+        user = self.get_user_from_token()
+        if not user:
+            self.send_cors_response(401, {'error': 'Authentication required'})
+            return
+        
+        if not self.db.connect():
+            self.send_cors_response(500, {'error': 'Database connection failed'})
+            return
+        
+        try:
+            searches = self.db.execute_query(
+                "SELECT * FROM saved_searches WHERE user_id = %s ORDER BY created_at DESC", (user['id'],)
+            )
+            self.send_cors_response(200, {'saved_searches': [dict(search) for search in searches]})
+        except Exception as e:
+            print(f"ERROR - Error getting saved searches: {e}")
+            self.send_cors_response(500, {'error': 'Failed to get saved searches'})
+        finally:
+            self.db.disconnect()
+    
+    def handle_create_saved_search(self):
+        """Handle POST /api/saved-searches - save a search to be alerted about matching new items"""
+        user = self.get_user_from_token()
+        if not user:
+            self.send_cors_response(401, {'error': 'Authentication required'})
+            return
+        
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+            data = json.loads(self.rfile.read(content_length).decode('utf-8')) if content_length else {}
+        except (ValueError, UnicodeDecodeError):
+            self.send_cors_response(400, {'error': 'Invalid JSON'})
+            return
+        
+        query = str(data.get('query') or '').strip()
+        category = str(data.get('category') or '').strip()
+        status = str(data.get('status') or '').strip()
+        if not (query or category or status):
+            self.send_cors_response(400, {'error': 'A saved search needs a query, category or status'})
+            return
+        if len(query) > SAVED_SEARCH_MAX_QUERY_LENGTH:
+            self.send_cors_response(400, {'error': f'query is limited to {SAVED_SEARCH_MAX_QUERY_LENGTH} characters'})
+            return
+        if status and status not in SAVED_SEARCH_STATUSES:
+            self.send_cors_response(400, {'error': f"status must be one of: {', '.join(SAVED_SEARCH_STATUSES)}"})
+            return
+        
+        if not self.db.connect():
+            self.send_cors_response(500, {'error': 'Database connection failed'})
+            return
+        
+        try:
+            existing = self.db.execute_query(
+                "SELECT COUNT(*) AS count FROM saved_searches WHERE user_id = %s", (user['id'],)
+            )
+            if existing[0]['count'] >= SAVED_SEARCH_LIMIT:
+                self.send_cors_response(400, {'error': f'You can save up to {SAVED_SEARCH_LIMIT} searches'})
+                return
+            
+            search = self.db.execute_insert(
+                """
+                INSERT INTO saved_searches (user_id, query, category, status)
+                VALUES (%s, %s, %s, %s)
+                RETURNING *
+                """,
+                (user['id'], query or None, category or None, status or None)
+            )
+            percolator.add(search)
+            self.send_cors_response(201, dict(search))
+        except Exception as e:
+            print(f"ERROR - Error saving search: {e}")
+            self.send_cors_response(500, {'error': 'Failed to save search'})
+        finally:
+            self.db.disconnect()
+    
+    def handle_delete_saved_search(self, search_id):
+        """Handle DELETE /api/saved-searches/{id} - only the owner can delete a saved search"""
+        user = self.get_user_from_token()
+        if not user:
+            self.send_cors_response(401, {'error': 'Authentication required'})
+            return
+        
+        try:
+            uuid.UUID(search_id)
+        except ValueError:
+            self.send_cors_response(404, {'error': 'Saved search not found'})
+            return
+        
+        if not self.db.connect():
+            self.send_cors_response(500, {'error': 'Database connection failed'})
+            return
+        
+        try:
+            deleted = self.db.execute_query(
+                "DELETE FROM saved_searches WHERE id = %s AND user_id = %s RETURNING id", (search_id, user['id'])
+            )
+            if not deleted:
+                self.send_cors_response(404, {'error': 'Saved search not found'})
+                return
+            percolator.remove(search_id)
+            self.send_cors_response(200, {'message': 'Saved search deleted'})
+        except Exception as e:
+            print(f"ERROR - Error deleting saved search: {e}")
+            self.send_cors_response(500, {'error': 'Failed to delete saved search'})
+        finally:
+            self.db.disconnect()
+    
+    def handle_get_notifications(self):
+        """Handle GET /api/notifications - the current user's latest notifications"""
+        user = self.get_user_from_token()
+        if not user:
+            self.send_cors_response(401, {'error': 'Authentication required'})
+            return
+        
+        if not self.db.connect():
+            self.send_cors_response(500, {'error': 'Database connection failed'})
+            return
+        
+        try:
+            notifications = self.db.execute_query(
+                """
+                SELECT *, COUNT(*) FILTER (WHERE NOT is_read) OVER () AS unread_total
+                FROM notifications WHERE user_id = %s
+                ORDER BY created_at DESC
+                LIMIT 50
+                """,
+                (user['id'],)
+            )
+            notifications = [dict(notification) for notification in notifications]
+            unread = notifications[0]['unread_total'] if notifications else 0
+            for notification in notifications:
+                notification.pop('unread_total')
+            self.send_cors_response(200, {'notifications': notifications, 'unread': unread})
+        except Exception as e:
+            print(f"ERROR - Error getting notifications: {e}")
+            self.send_cors_response(500, {'error': 'Failed to get notifications'})
+        finally:
+            self.db.disconnect()
+    
+    def handle_get_similar_images(self, item_id, query_params):
+        """Handle GET /api/items/{id}/similar-images - listed items whose photo looks like this item's"""
+        try:
+            limit = min(max(int(query_params.get('limit', [SIMILAR_IMAGE_LIMIT])[0]), 1), 50)
+            max_distance = min(max(int(query_params.get('max_distance', [SIMILAR_IMAGE_MAX_DISTANCE])[0]), 0),
+                               HASH_BITS // 2)
+        except ValueError:
+            self.send_cors_response(400, {'error': 'limit and max_distance must be numbers'})
+            return
+        
+        if not similarity_index.ensure_loaded():
+            self.send_cors_response(503, {'error': 'Image similarity index not available'})
+            return
+        
+        if not self.db.connect():
+            self.send_cors_response(500, {'error': 'Database connection failed'})
+            return
+        
+        try:
+            item = self.db.execute_query("SELECT id, image_phash FROM items WHERE id = %s", (item_id,))
+            if not item:
+                self.send_cors_response(404, {'error': 'Item not found'})
+                return
+            
+            perceptual_hash = item[0]['image_phash']
+            items = []
+            if perceptual_hash is not None:
+                # Distances are computed in memory; only the closest rows are read back
+                nearest = similarity_index.nearest(perceptual_hash, limit=limit, max_distance=max_distance,
+                                                   exclude_id=item_id)
+                if nearest:
+                    query = f"""
+                        SELECT i.*, {ITEM_USER_COLUMNS}
+                        FROM items i 
+                        LEFT JOIN users u ON i.user_id = u.id
+                        WHERE i.id = ANY(%s::uuid[])
+                    """
+                    rows = {str(row['id']): dict(row) for row in
+                            self.db.execute_query(query, ([similar_id for similar_id, _ in nearest],))}
+                    for similar_id, distance in nearest:
+                        row = rows.get(similar_id)
+                        if row:
+                            row['image_distance'] = distance
+                            items.append(row)
+            
+            self.send_cors_response(200, {
+                'item_id': item_id,
+                # False while the item's image is still processing, or when it has none
+                'image_hashed': perceptual_hash is not None,
+                'similar': items
+            })
+        except Exception as e:
+            print(f"ERROR - Error finding similar images: {e}")
+            self.send_cors_response(500, {'error': 'Failed to find similar images'})
+        finally:
+            self.db.disconnect()
+    
+    def handle_get_item_matches(self, item_id, query_params):
+        """Handle GET /api/items/{id}/matches - ranked items of the opposite status"""
+        try:
+            limit = min(max(int(query_params.get('limit', [10])[0]), 1), 50)
+        except ValueError:
+            self.send_cors_response(400, {'error': 'limit must be a number'})
+            return
+        
+        if not matching_engine.ensure_loaded():
+            self.send_cors_response(503, {'error': 'Matching index not available'})
+            return
+        
+        if not self.db.connect():
+            self.send_cors_response(500, {'error': 'Database connection failed'})
+            return
+        
+        try:
+            item = self.db.execute_query("SELECT id, status FROM items WHERE id = %s", (item_id,))
+            if not item:
+                self.send_cors_response(404, {'error': 'Item not found'})
+                return
+            
+            # Scoring happens in memory; only the winning rows are read back
+            matches = matching_engine.match(item_id, limit=limit)
+            items = []
+            if matches:
+                query = f"""
+                    SELECT i.*, {ITEM_USER_COLUMNS}
+                    FROM items i 
+                    LEFT JOIN users u ON i.user_id = u.id
+                    WHERE i.id = ANY(%s::uuid[])
+                """
+                rows = {str(row['id']): dict(row) for row in
+                        self.db.execute_query(query, ([match['id'] for match in matches],))}
+                for match in matches:
+                    row = rows.get(match['id'])
+                    if row:
+                        row['match_score'] = match['score']
+                        row['matched_terms'] = match['matched_terms']
+                        items.append(row)
+            
+            self.send_cors_response(200, {
+                'item_id': item_id,
+                'status': item[0]['status'],
+                'matches': items
+            })
+        
+        except Exception as e:
+            print(f"ERROR - Error getting matches: {e}")
+            self.send_cors_response(500, {'error': 'Failed to get matches'})
+        finally:
+            self.db.disconnect()
+    
     def handle_get_current_user(self):
         """Get current user info from JWT token"""
         user = self.get_user_from_token()
@@ -276,29 +778,6 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
         finally:
             self.db.disconnect()
     
-    def do_POST(self):
-        """Handle POST requests"""
-        parsed_path = urllib.parse.urlparse(self.path)
-        path = parsed_path.path
-        
-        try:
-            if path == '/api/items':
-                self.handle_create_item()
-            elif path == '/api/users/register':
-                self.handle_register()
-            elif path == '/api/users/login':
-                self.handle_login()
-            elif path == '/api/admin/login':
-                self.handle_admin_login()
-            elif path.startswith('/api/items/') and path.endswith('/claim'):
-                item_id = path.split('/')[-2]
-                self.handle_claim_item(item_id)
-            else:
-                self.send_cors_response(404, {'error': 'Not found'})
-        except Exception as e:
-            print(f"ERROR - POST Error: {e}")
-            self.send_cors_response(500, {'error': 'Internal server error'})
-    
     def handle_create_item(self):
         """Create new item"""
         user = self.get_user_from_token()
@@ -335,14 +814,31 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
                 self.send_cors_response(400, {'error': 'Title is required'})
                 return
             
+            # An image uploaded directly to S3 via /api/uploads/presign is referenced by its key,
+            # which must be the one issued to this user (signed into upload_token)
+            image_url = data.get('image_url')
+            image_key = data.get('image_key')
+            if image_key:
+                if not s3_enabled():
+                    self.send_cors_response(400, {'error': 'Direct uploads are not available'})
+                    return
+                if self.upload_token_key(data.get('upload_token'), user['id']) != image_key:
+                    self.send_cors_response(403, {'error': 'Upload token missing, expired or not valid for this image'})
+                    return
+                if not verify_uploaded_object(image_key, MAX_FILE_SIZE):
+                    self.send_cors_response(400, {'error': 'Uploaded image not found or invalid'})
+                    return
+                # The worker ingests it like a multipart upload and fills in the image fields
+                image_url = None
+            
             # Insert item
             item_id = str(uuid.uuid4())
             insert_query = """
                 INSERT INTO items (
                     id, title, description, category, status, location_found, 
-                    date_found, image_url, user_id, custody_status, created_at, updated_at
+                    date_found, image_url, image_status, user_id, custody_status, created_at, updated_at
                 )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                 RETURNING *
             """
             
@@ -358,7 +854,8 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
                 data.get('status', 'found'),
                 location,
                 data.get('date_found', now.date()),
-                data.get('image_url'),
+                image_url,
+                'pending' if image_key else 'ready',
                 user['id'],
                 data.get('custody_status'),  # Add custody status
                 now,
@@ -369,8 +866,14 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
             
             if result:
                 response = dict(result)
+                item_events.publish(item_events.ITEM_CREATED, item_id, dict(result))
                 response['user_name'] = user['name']
+                response['matches'] = matching_engine.match(item_id, limit=MATCH_PREVIEW_LIMIT)
                 self.send_cors_response(201, response)
+                
+                if image_key and not upload_pool.submit_staged(item_id, image_key):
+                    print("WARNING - Upload queue full, ingesting direct upload inline")
+                    upload_pool.process_staged_inline(item_id, image_key)
             else:
                 self.send_cors_response(500, {'error': 'Failed to create item'})
         
@@ -380,86 +883,76 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
         finally:
             self.db.disconnect()
 
+    def handle_presign_upload(self):
+        """Handle POST /api/uploads/presign - presigned form for uploading an image straight to S3"""
+        user = self.get_user_from_token()
+        if not user:
+            self.send_cors_response(401, {'error': 'Authentication required'})
+            return
+        
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+            data = json.loads(self.rfile.read(content_length).decode('utf-8')) if content_length else {}
+        except (ValueError, UnicodeDecodeError):
+            self.send_cors_response(400, {'error': 'Invalid JSON'})
+            return
+        
+        # Without S3 the client falls back to a multipart upload through this server
+        if not s3_enabled():
+            self.send_cors_response(503, {'error': 'Direct uploads are not available'})
+            return
+        
+        filename = str(data.get('filename') or '')
+        if not filename:
+            self.send_cors_response(400, {'error': 'filename is required'})
+            return
+        size = data.get('size')
+        if isinstance(size, int) and size > MAX_FILE_SIZE:
+            self.send_cors_response(413, {'error': f'File too large (limit {MAX_FILE_SIZE} bytes)'})
+            return
+        
+        try:
+            presigned = create_presigned_upload(filename, MAX_FILE_SIZE)
+        except Exception as e:
+            print(f"ERROR - Could not presign upload: {e}")
+            self.send_cors_response(500, {'error': 'Failed to prepare upload'})
+            return
+        
+        if not presigned:
+            self.send_cors_response(400, {'error': 'Only JPEG, PNG, WebP and GIF images can be uploaded'})
+            return
+        
+        presigned['max_size'] = MAX_FILE_SIZE
+        presigned['upload_token'] = self.issue_upload_token(user['id'], presigned['key'], presigned['expires_in'])
+        print(f"📤 Presigned direct upload for {user['name']}: {presigned['key']}")
+        self.send_cors_response(200, presigned)
+
     def handle_create_item_multipart(self, user):
         """Handle multipart form data item creation with file upload"""
-        import cgi
-        import io
-        
+        form = None
         try:
-            # Use cgi.FieldStorage for proper multipart parsing
             content_length = int(self.headers.get('Content-Length', 0))
             
-            # Create a file-like object from the request body
-            fp = io.BytesIO(self.rfile.read(content_length))
-            
-            # Parse multipart form data using cgi.FieldStorage
-            form = cgi.FieldStorage(
-                fp=fp,
-                headers=self.headers,
-                environ={
-                    'REQUEST_METHOD': 'POST',
-                    'CONTENT_TYPE': self.headers.get('Content-Type', ''),
-                    'CONTENT_LENGTH': str(content_length)
-                }
-            )
+            # Stream the body: fields stay in memory, file parts are spooled to temp files
+            try:
+                form = parse_multipart(self.rfile, self.headers.get('Content-Type', ''), content_length)
+            except MultipartError as e:
+                print(f"ERROR - Rejected multipart upload: {e}")
+                # The rest of the body may still be unread, so the connection cannot be reused
+                self.close_connection = True
+                self.send_cors_response(e.status_code, {'error': str(e)})
+                return
             
-            # Extract form fields
-            item_data = {}
-            file_data = None
-            filename = None
+            item_data = form.fields
             
-            print(f"DEBUG - Parsing multipart form with {len(form.keys())} fields")
+            # The last non-empty file part is the item image
+            upload = None
+            for uploaded_file in form.files:
+                if uploaded_file.size > 0:
+                    upload = uploaded_file
             
-            for field_name in form.keys():
-                field = form[field_name]
-                print(f"LABEL - Processing field: '{field_name}'")
-                
-                if field.filename:  # This is a file field
-                    filename = field.filename
-                    file_data = field.file.read()
-                    print(f"📤 Found file: {filename} ({len(file_data)} bytes)")
-                else:  # This is a regular form field
-                    value = field.value if hasattr(field, 'value') else ''
-                    item_data[field_name] = value
-                    print(f"SUCCESS - Field '{field_name}': '{value}'")
-
-            # Handle image upload with S3 PRIORITY and local backup
-            image_url = None
-            if filename and file_data:
-                print(f"📤 Processing image upload: {filename}")
-                
-                # PRIORITY 1: Try AWS S3 first (always attempt if module available)
-                s3_success = False
-                if S3_AVAILABLE:
-                    try:
-                        image_url = upload_file_to_s3(file_data, filename)
-                        if image_url:  # S3 upload successful
-                            print(f"SUCCESS - Image uploaded to S3: {image_url}")
-                            s3_success = True
-                        else:
-                            print("WARNING - S3 upload returned None, trying local backup...")
-                    except Exception as e:
-                        print(f"WARNING - S3 upload failed: {e}, falling back to local storage...")
-                
-                # BACKUP: Use local storage only if S3 failed or unavailable
-                if not s3_success:
-                    try:
-                        print("💾 Using local storage as backup...")
-                        os.makedirs(UPLOAD_DIR, exist_ok=True)
-                        
-                        file_ext = os.path.splitext(filename)[1]
-                        unique_filename = str(uuid.uuid4()) + file_ext
-                        file_path = os.path.join(UPLOAD_DIR, unique_filename)
-                        
-                        with open(file_path, 'wb') as f:
-                            f.write(file_data)
-                        
-                        image_url = f"/uploads/{unique_filename}"
-                        print(f"SUCCESS - Image saved locally as backup: {image_url}")
-                        
-                    except Exception as e:
-                        print(f"ERROR - Local storage backup also failed: {e}")
-                        image_url = None
+            if upload:
+                print(f"📤 Received image upload: {upload.filename} ({upload.size} bytes)")
             else:
                 print("📝 Creating item without image")
             
@@ -469,8 +962,6 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
             status = item_data.get('status', 'found')
             category = item_data.get('category', 'other')
             
-            # Debug: Print what we received
-            print(f"DEBUG - Received form data: {item_data}")
             print(f"LABEL - Title received: '{title}'")
             print(f"📝 Description received: '{description}'")
             
@@ -483,15 +974,23 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
                 self.send_cors_response(500, {'error': 'Database connection failed'})
                 return
 
+            blob = None
             try:
+                # Content already stored - reference the existing blob instead of uploading again
+                if upload:
+                    blob = acquire_blob(self.db, upload.sha256)
+                    if blob:
+                        print(f"INFO - Image already stored, skipping upload: {blob['image_url']}")
+                
                 # Insert item
                 item_id = str(uuid.uuid4())
                 insert_query = """
                     INSERT INTO items (
                         id, title, description, category, status, location_found, 
-                        date_found, image_url, user_id, custody_status, created_at, updated_at
+                        date_found, image_url, image_variants, image_hash, image_phash, image_status,
+                        user_id, custody_status, created_at, updated_at
                     )
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                     RETURNING *
                 """
                 
@@ -504,7 +1003,12 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
                     status,
                     item_data.get('location_found', ''),
                     item_data.get('date_found', now.date()),
-                    image_url,
+                    # Otherwise the image fields are filled in by the upload worker
+                    blob['image_url'] if blob else None,
+                    Json(blob['image_variants']) if blob and blob['image_variants'] else None,
+                    upload.sha256 if blob else None,
+                    blob['perceptual_hash'] if blob else None,
+                    'pending' if upload and not blob else 'ready',
                     user['id'],
                     item_data.get('custody_status'),  # Add custody status
                     now,
@@ -515,14 +1019,25 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
                 
                 if result:
                     response = dict(result)
+                    item_events.publish(item_events.ITEM_CREATED, item_id, dict(result))
                     response['user_name'] = user['name']
-                    print(f"SUCCESS - Created item with image: {title} (ID: {item_id})")
+                    response['matches'] = matching_engine.match(item_id, limit=MATCH_PREVIEW_LIMIT)
+                    print(f"SUCCESS - Created item: {title} (ID: {item_id})")
                     self.send_cors_response(201, response)
+                    
+                    # Store the image in the background; the pool now owns the spooled file
+                    if upload and not blob:
+                        form.files.remove(upload)
+                        if not upload_pool.submit(item_id, upload):
+                            print("WARNING - Upload queue full, storing image inline")
+                            upload_pool.process_inline(item_id, upload)
                 else:
                     self.send_cors_response(500, {'error': 'Failed to create item'})
             
             except Exception as e:
                 print(f"ERROR - Error creating item: {e}")
+                if blob:
+                    release_blob(self.db, upload.sha256)
                 self.send_cors_response(500, {'error': 'Failed to create item'})
             finally:
                 self.db.disconnect()
@@ -532,6 +1047,9 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
             import traceback
             traceback.print_exc()
             self.send_cors_response(500, {'error': 'Failed to parse form data'})
+        finally:
+            if form is not None:
+                form.close()
     
     def handle_register(self):
         """Handle user registration"""
@@ -552,9 +1070,13 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
                 self.send_cors_response(400, {'error': 'Email already registered'})
                 return
             
+            if len(data['password'].encode('utf-8')) > MAX_PASSWORD_BYTES:
+                self.send_cors_response(400, {'error': f'Password must be at most {MAX_PASSWORD_BYTES} bytes'})
+                return
+            
             # Create user
             user_id = str(uuid.uuid4())
-            password_hash = hashlib.sha256(data['password'].encode()).hexdigest()
+            password_hash = password_hasher.hash_password(data['password'])
             
             insert_query = """
                 INSERT INTO users (id, name, email, password_hash, created_at)
@@ -585,6 +1107,8 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
             else:
                 self.send_cors_response(500, {'error': 'Failed to create user'})
         
+        except PasswordPoolBusy:
+            self.send_password_busy()
         except Exception as e:
             print(f"ERROR - Error registering user: {e}")
             self.send_cors_response(500, {'error': 'Registration failed'})
@@ -602,20 +1126,29 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
             return
         
         try:
-            password_hash = hashlib.sha256(data['password'].encode()).hexdigest()
-            
             query = """
-                SELECT id, name, email, created_at 
+                SELECT id, name, email, created_at, password_hash
                 FROM users 
-                WHERE email = %s AND password_hash = %s
+                WHERE email = %s
             """
-            users = self.db.execute_query(query, (data['email'], password_hash))
+            users = self.db.execute_query(query, (data['email'],))
             
             if not users:
+                # Take as long as a wrong password so response times do not reveal registered emails
+                password_hasher.verify_dummy(data['password'])
                 self.send_cors_response(401, {'error': 'Invalid credentials'})
                 return
             
             user = dict(users[0])
+            stored_hash = user.pop('password_hash')
+            matches, needs_rehash = password_hasher.verify_password(data['password'], stored_hash)
+            if not matches:
+                self.send_cors_response(401, {'error': 'Invalid credentials'})
+                return
+            
+            if needs_rehash:
+                self.rehash_password(user['id'], data['password'], stored_hash)
+            
             token = jwt.encode({
                 'user_id': user['id'],
                 'exp': datetime.utcnow() + timedelta(days=7)
@@ -627,12 +1160,35 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
             }
             self.send_cors_response(200, response)
         
+        except PasswordPoolBusy:
+            self.send_password_busy()
         except Exception as e:
             print(f"ERROR - Error logging in: {e}")
             self.send_cors_response(500, {'error': 'Login failed'})
         finally:
             self.db.disconnect()
     
+    def rehash_password(self, user_id, password, stored_hash):
+        """Replace a legacy SHA-256 (or lower-cost bcrypt) hash after a successful login"""
+        if len(password.encode('utf-8')) > MAX_PASSWORD_BYTES:
+            # Legacy accounts may predate the bcrypt length limit; keep their hash
+            return
+        try:
+            new_hash = password_hasher.hash_password(password)
+            # Only if the hash was not changed meanwhile (e.g. by a concurrent login)
+            self.db.execute_query(
+                "UPDATE users SET password_hash = %s WHERE id = %s AND password_hash = %s",
+                (new_hash, user_id, stored_hash)
+            )
+            password_hasher.record_rehash()
+        except Exception as e:
+            # The login itself succeeded; the hash is upgraded on a later one
+            print(f"WARNING - Could not upgrade password hash for user {user_id}: {e}")
+    
+    def send_password_busy(self):
+        """503 when the password hashing pool is saturated"""
+        self.send_cors_response(503, {'error': 'Server busy, please try again'}, headers={'Retry-After': '1'})
+    
     def handle_claim_item(self, item_id):
         """Handle item claim request"""
         user = self.get_user_from_token()
@@ -750,24 +1306,88 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
         finally:
             self.db.disconnect()
     
-    def handle_static_file(self, path):
-        """Serve static files from uploads directory"""
-        file_path = path[1:]  # Remove leading slash
+    def handle_static_file(self, file_path):
+        """Serve static files from uploads directory (sharded layout, then legacy flat files)"""
+        relative_path = urllib.parse.unquote(file_path)
+        
+        # Temp files of in-progress writes and other hidden files are never served
+        for file_path in local_storage.candidate_paths(relative_path):
+            if self.serve_file(file_path):
+                return
+        self.send_cors_response(404, {'error': 'File not found'})
+    
+    def serve_file(self, file_path, cache_control=None, precompressed=False):
+        """
+        Send a file with validators, Range support and sendfile.
+        With precompressed=True a matching .br/.gz sibling is sent instead when the client accepts it.
+        Returns False if the file does not exist so the caller can send its own 404.
+        """
+        meta = static_file_cache.lookup(file_path)
+        if meta is None:
+            return False
+        
+        content_type = meta.content_type
+        encoding = None
+        if precompressed:
+            for candidate_encoding, suffix in precompressed_candidates(self.headers.get('Accept-Encoding')):
+                variant_meta = static_file_cache.lookup(file_path + suffix)
+                if variant_meta is not None:
+                    meta, encoding = variant_meta, candidate_encoding
+                    break
+        
+        if is_not_modified(self.headers, meta):
+            self.send_response(304)
+            self.send_header('ETag', meta.etag)
+            self.send_header('Last-Modified', meta.last_modified)
+            self.send_header('Access-Control-Allow-Origin', '*')
+            if precompressed:
+                self.send_header('Vary', 'Accept-Encoding')
+            if cache_control:
+                self.send_header('Cache-Control', cache_control)
+            self.end_headers()
+            return True
         
-        if os.path.exists(file_path):
-            content_type, _ = mimetypes.guess_type(file_path)
-            if content_type is None:
-                content_type = 'application/octet-stream'
+        byte_range = parse_range(self.headers, meta)
+        if byte_range == 'unsatisfiable':
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{meta.size}')
+            self.send_header('Content-Length', '0')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            return True
+        
+        try:
+            f = open(meta.path, 'rb')
+        except OSError:
+            # File vanished since the metadata was cached
+            static_file_cache.invalidate(meta.path)
+            return False
+        
+        with f:
+            if byte_range:
+                start, end = byte_range
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{meta.size}')
+            else:
+                start, end = 0, meta.size - 1
+                self.send_response(200)
             
-            self.send_response(200)
-            self.send_header('Content-type', content_type)
+            self.send_header('Content-Type', content_type)
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
+            if precompressed:
+                self.send_header('Vary', 'Accept-Encoding')
+            self.send_header('Content-Length', str(end - start + 1))
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('ETag', meta.etag)
+            self.send_header('Last-Modified', meta.last_modified)
             self.send_header('Access-Control-Allow-Origin', '*')
+            if cache_control:
+                self.send_header('Cache-Control', cache_control)
             self.end_headers()
             
-            with open(file_path, 'rb') as f:
-                self.wfile.write(f.read())
-        else:
-            self.send_cors_response(404, {'error': 'File not found'})
+            send_file_range(self.connection, self.wfile, f, start, end - start + 1)
+        return True
     
     def handle_home(self):
         """Serve basic home page"""
@@ -815,39 +1435,6 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
         
         self.send_cors_response(200, html, 'text/html')
 
-    def do_PUT(self):
-        """Handle PUT requests"""
-        parsed_path = urllib.parse.urlparse(self.path)
-        path = parsed_path.path
-        
-        try:
-            if path.startswith('/api/items/'):
-                item_id = path.split('/')[-1]
-                self.handle_update_item(item_id)
-            else:
-                self.send_cors_response(404, {'error': 'Not found'})
-        except Exception as e:
-            print(f"ERROR - PUT Error: {e}")
-            self.send_cors_response(500, {'error': 'Internal server error'})
-
-    def do_DELETE(self):
-        """Handle DELETE requests"""
-        parsed_path = urllib.parse.urlparse(self.path)
-        path = parsed_path.path
-        
-        try:
-            if path.startswith('/api/items/'):
-                item_id = path.split('/')[-1]
-                self.handle_delete_item(item_id)
-            elif path.startswith('/api/admin/users/'):
-                user_id = path.split('/')[-1]
-                self.handle_delete_user(user_id)
-            else:
-                self.send_cors_response(404, {'error': 'Not found'})
-        except Exception as e:
-            print(f"ERROR - DELETE Error: {e}")
-            self.send_cors_response(500, {'error': 'Internal server error'})
-
     def handle_update_item(self, item_id):
         """Update item (for admin - change status, notes, location, etc.)"""
         if not self.db.connect():
@@ -890,7 +1477,7 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
                     fields.append("updated_at = CURRENT_TIMESTAMP")
                     values.append(item_id)
                     
-                    query = f"UPDATE items SET {', '.join(fields)} WHERE id = %s RETURNING id, title, status, admin_notes"
+                    query = f"UPDATE items SET {', '.join(fields)} WHERE id = %s RETURNING *"
                     
                     print(f"DEBUG - Executing query: {query}")
                     print(f"DEBUG - With values: {values}")
@@ -899,6 +1486,7 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
                     
                     if result and len(result) > 0:
                         updated_item = result[0]
+                        item_events.publish(item_events.ITEM_UPDATED, item_id, dict(updated_item))
                         print(f"SUCCESS - Item updated successfully: {updated_item}")
                         self.send_cors_response(200, {
                             'message': 'Item updated successfully',
@@ -935,9 +1523,14 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
             self.db.execute_query("DELETE FROM item_images WHERE item_id = %s", (item_id,))
             
             # Then delete the item
-            result = self.db.execute_query("DELETE FROM items WHERE id = %s", (item_id,))
+            result = self.db.execute_query("DELETE FROM items WHERE id = %s RETURNING image_hash", (item_id,))
             
             if result:
+                item_events.publish(item_events.ITEM_DELETED, item_id)
+                
+                # Drop the item's reference to its image; the last reference deletes the files
+                if result[0]['image_hash']:
+                    release_blob(self.db, result[0]['image_hash'])
                 self.send_cors_response(200, {'message': 'Item deleted successfully'})
             else:
                 self.send_cors_response(404, {'error': 'Item not found'})
@@ -1011,38 +1604,31 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
             
             # Get ALL items without pagination for admin - join with users table to get user names
             items_query = f"""
-                SELECT i.*, u.name as user_name, u.email as user_email
+                SELECT i.*, {ITEM_USER_COLUMNS}
                 FROM items i 
                 LEFT JOIN users u ON i.user_id = u.id
                 {where_clause} 
                 ORDER BY i.created_at DESC
             """
             
-            items = self.db.execute_query(items_query, params)
-            
-            # Convert to list of dicts with actual user names
-            items_list = []
-            for item in items:
-                item_dict = dict(item)
-                # Fallback to defaults only if user not found (null join)
-                if not item_dict.get('user_name'):
-                    item_dict['user_name'] = 'Unknown'
-                if not item_dict.get('user_email'):
-                    item_dict['user_email'] = 'team@example.com'
-                items_list.append(item_dict)
-            
-            response = {
-                'items': items_list,
-                'total': len(items_list),
-                'page': 1,
-                'per_page': len(items_list)
-            }
-            
-            self.send_cors_response(200, response)
-            
+            # Stream rows from a server-side cursor - admin listings are unpaginated
+            columns, rows = self.db.stream_query_rows(items_query, params)
         except Exception as e:
             print(f"ERROR - Error getting admin items: {e}")
+            self.db.disconnect()
             self.send_cors_response(500, {'error': 'Failed to get admin items'})
+            return
+        
+        # send_streaming_response handles its own errors: no second status once it has started
+        try:
+            with closing(rows):
+                if query_params.get('format', [''])[0] == 'ndjson':
+                    self.send_streaming_response(200, iter_ndjson(columns, rows), 'application/x-ndjson')
+                else:
+                    self.send_streaming_response(200, iter_json_listing(
+                        columns, rows, 'items',
+                        lambda count: {'total': count, 'page': 1, 'per_page': count}
+                    ))
         finally:
             self.db.disconnect()
 
@@ -1077,13 +1663,13 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
                     u.id,
                     u.name,
                     u.email,
-                    u.role,
+                    COALESCE(NULLIF(u.role, ''), 'user') as role,
                     u.created_at,
                     u.updated_at,
-                    COUNT(i.id) as item_count,
-                    COUNT(CASE WHEN i.status = 'lost' THEN 1 END) as lost_count,
-                    COUNT(CASE WHEN i.status = 'found' THEN 1 END) as found_count,
-                    COUNT(CASE WHEN i.status = 'returned' THEN 1 END) as returned_count
+                    COUNT(i.id)::int as item_count,
+                    COUNT(CASE WHEN i.status = 'lost' THEN 1 END)::int as lost_count,
+                    COUNT(CASE WHEN i.status = 'found' THEN 1 END)::int as found_count,
+                    COUNT(CASE WHEN i.status = 'returned' THEN 1 END)::int as returned_count
                 FROM users u
                 LEFT JOIN items i ON u.id = i.user_id
                 {where_clause}
@@ -1091,39 +1677,48 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
                 ORDER BY u.created_at DESC
             """
             
-            users = self.db.execute_query(users_query, params)
-            
-            # Convert to list of dicts
-            users_list = []
-            for user in users:
-                user_dict = dict(user)
-                # Ensure counts are integers (PostgreSQL returns them as strings sometimes)
-                user_dict['item_count'] = int(user_dict['item_count'] or 0)
-                user_dict['lost_count'] = int(user_dict['lost_count'] or 0)
-                user_dict['found_count'] = int(user_dict['found_count'] or 0)
-                user_dict['returned_count'] = int(user_dict['returned_count'] or 0)
-                
-                # Ensure role has a default value
-                if not user_dict.get('role'):
-                    user_dict['role'] = 'user'
-                    
-                users_list.append(user_dict)
-            
-            response = {
-                'users': users_list,
-                'total': len(users_list),
-                'page': 1,
-                'per_page': len(users_list)
-            }
-            
-            self.send_cors_response(200, response)
-            
+            # Counts are cast to int and the role defaulted in SQL, so rows serialize as-is
+            columns, rows = self.db.stream_query_rows(users_query, params)
         except Exception as e:
             print(f"ERROR - Error getting admin users: {e}")
+            self.db.disconnect()
             self.send_cors_response(500, {'error': 'Failed to get admin users'})
+            return
+        
+        # send_streaming_response handles its own errors: no second status once it has started
+        try:
+            with closing(rows):
+                if query_params.get('format', [''])[0] == 'ndjson':
+                    self.send_streaming_response(200, iter_ndjson(columns, rows), 'application/x-ndjson')
+                else:
+                    self.send_streaming_response(200, iter_json_listing(
+                        columns, rows, 'users',
+                        lambda count: {'total': count, 'page': 1, 'per_page': count}
+                    ))
         finally:
             self.db.disconnect()
 
+    def handle_get_metrics(self):
+        """Handle GET /api/admin/metrics - runtime counters for tuning"""
+        self.send_cors_response(200, {
+            'uploads': upload_pool.metrics(),
+            'matching': matching_engine.stats(),
+            'search_index': search_index.stats(),
+            'suggest': suggest_index.stats(),
+            'facet_cache': facet_cache.stats(),
+            'saved_searches': percolator.stats(),
+            'image_similarity': similarity_index.stats(),
+            'passwords': password_hasher.metrics(),
+            'rate_limits': rate_limiter.stats(),
+            'routes': ROUTER.stats(),
+            'connections': connection_stats.stats()
+        })
+
+    def handle_health(self):
+        """Handle GET /api/health - readiness for load balancers and deploy scripts (503 until ready)"""
+        state = health.snapshot()
+        self.send_cors_response(200 if state['ready'] else 503, state)
+
     def handle_delete_user(self, user_id):
         """Handle DELETE /api/admin/users/{id} - delete a user and all their items"""
         if not self.db.connect():
@@ -1143,9 +1738,13 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
             print(f"DELETE - Admin deleting user: {user['name']} ({user['email']})")
             
             # Delete user's items first (foreign key constraint)
-            items_delete_query = "DELETE FROM items WHERE user_id = %s"
+            items_delete_query = "DELETE FROM items WHERE user_id = %s RETURNING id, image_hash"
             items_deleted = self.db.execute_query(items_delete_query, [user_id])
             print(f"DELETE - Deleted {len(items_deleted) if items_deleted else 0} items for user {user_id}")
+            for deleted_item in items_deleted:
+                item_events.publish(item_events.ITEM_DELETED, deleted_item['id'])
+                if deleted_item['image_hash']:
+                    release_blob(self.db, deleted_item['image_hash'])
             
             # Delete the user
             user_delete_query = "DELETE FROM users WHERE id = %s RETURNING id, name, email"
@@ -1153,6 +1752,8 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
             
             if deleted_user and len(deleted_user) > 0:
                 deleted_user_data = dict(deleted_user[0])
+                # saved_searches rows go with the user (ON DELETE CASCADE)
+                percolator.remove_user(user_id)
                 print(f"SUCCESS - User deleted successfully: {deleted_user_data}")
                 self.send_cors_response(200, {
                     'message': 'User deleted successfully',
@@ -1591,97 +2192,170 @@ class PostgreSQLRequestHandler(http.server.BaseHTTPRequestHandler):
             print(f"ERROR - Error serving React admin page: {e}")
             self.send_cors_response(500, {'error': 'Failed to serve admin interface'})
 
-    def handle_react_admin_static_file(self, path):
+    def handle_react_admin_static_file(self, file_path):
         """Handle static file requests for React admin interface"""
         try:
-            # Remove the /static/ prefix to get the actual file path
-            file_path = path[8:]  # Remove '/static/'
-            admin_static_path = os.path.join(os.path.dirname(__file__), 'admin_build', 'static', file_path)
-            
-            if os.path.exists(admin_static_path):
-                # Determine content type
-                content_type, _ = mimetypes.guess_type(admin_static_path)
-                if content_type is None:
-                    content_type = 'application/octet-stream'
-                
-                # Read and serve the file
-                with open(admin_static_path, 'rb') as f:
-                    content = f.read()
-                
-                self.send_response(200)
-                self.send_header('Content-Type', content_type)
-                self.send_header('Content-Length', str(len(content)))
-                self.send_header('Access-Control-Allow-Origin', '*')
-                # Add cache headers for static assets
-                self.send_header('Cache-Control', 'public, max-age=31536000')
-                self.end_headers()
-                self.wfile.write(content)
-                
-                print(f"SUCCESS - Served React admin static file: {file_path}")
-            else:
-                print(f"ERROR - Admin static file not found: {admin_static_path}")
+            file_path = urllib.parse.unquote(file_path)
+            admin_static_path = safe_join(ADMIN_STATIC_DIR, file_path)
+            
+            # Hashed build assets never change, so they can be cached for a year
+            if admin_static_path is None or not self.serve_file(admin_static_path, 'public, max-age=31536000', precompressed=True):
+                print(f"ERROR - Admin static file not found: {file_path}")
                 self.send_cors_response(404, {'error': 'Static file not found'})
+                
         except Exception as e:
             print(f"ERROR - Error serving React admin static file: {e}")
             self.send_cors_response(500, {'error': 'Failed to serve static file'})
 
+
+# ======= ROUTES =======
+
+def limited(budget=None, when=None):
+    """
+    Middleware: load shedding (MAX_IN_FLIGHT) and, when budget is given, the
+    client's token buckets - both before the handler opens a database
+    connection. when(query_params) limits the budget to some requests.
+    """
+    def middleware(route, call_next):
+        def call(handler, params):
+            if not RATE_LIMIT_ENABLED:
+                call_next(handler, params)
+                return
+            if not rate_limiter.enter():
+                handler.reject_request(503, 'Server busy, please try again', 1)
+                return
+            try:
+                if budget and (when is None or when(handler.query_params)):
+                    wait = rate_limiter.check(budget, ip=handler.client_ip(), user_id=handler.token_user_id())
+                    if wait:
+                        handler.reject_request(429, 'Too many requests, please slow down', wait)
+                        return
+                call_next(handler, params)
+            finally:
+                rate_limiter.leave()
+        return call
+    return middleware
+
+
+def authenticated(route, call_next):
+    """Middleware: 401 without a valid token, before the handler looks the user up"""
+    def call(handler, params):
+        if handler.token_user_id() is None:
+            handler.send_cors_response(401, {'error': 'Authentication required'})
+            return
+        call_next(handler, params)
+    return call
+
+
+def is_search(query_params):
+    # Plain listings are cheap (and often served from the search index); searches scan
+    return bool(query_params.get('search', [''])[0])
+
+
+def build_router():
+    """Route table; literal segments take precedence over {parameters}, so order does not matter"""
+    router = Router()
+    handler = PostgreSQLRequestHandler
+    timing = timed(router)
+    api = (timing, limited())
+    private = (timing, limited(), authenticated)
+    static = (timing,)
+    routes = [
+        # Items
+        ('GET', '/api/items', handler.handle_get_items, (timing, limited('search', when=is_search))),
+        ('POST', '/api/items', handler.handle_create_item, (timing, limited('upload'), authenticated)),
+        ('GET', '/api/items/facets', handler.handle_get_item_facets, (timing, limited('search'))),
+        ('GET', '/api/items/{item_id}', handler.handle_get_item, api),
+        ('PUT', '/api/items/{item_id}', handler.handle_update_item, api),
+        ('DELETE', '/api/items/{item_id}', handler.handle_delete_item, api),
+        ('GET', '/api/items/{item_id}/matches', handler.handle_get_item_matches, api),
+        ('GET', '/api/items/{item_id}/similar-images', handler.handle_get_similar_images, (timing, limited('search'))),
+        ('POST', '/api/items/{item_id}/claim', handler.handle_claim_item, private),
+        ('POST', '/api/uploads/presign', handler.handle_presign_upload, (timing, limited('upload'), authenticated)),
+        ('GET', '/api/categories', handler.handle_get_categories, api),
+        ('GET', '/api/suggest', handler.handle_suggest, api),
+        # Users
+        ('POST', '/api/users/register', handler.handle_register, (timing, limited('auth'))),
+        ('POST', '/api/users/login', handler.handle_login, (timing, limited('auth'))),
+        ('GET', '/api/users/me', handler.handle_get_current_user, private),
+        ('GET', '/api/saved-searches', handler.handle_get_saved_searches, private),
+        ('POST', '/api/saved-searches', handler.handle_create_saved_search, private),
+        ('DELETE', '/api/saved-searches/{search_id}', handler.handle_delete_saved_search, private),
+        ('GET', '/api/notifications', handler.handle_get_notifications, private),
+        # Admin
+        ('POST', '/api/admin/login', handler.handle_admin_login, (timing, limited('auth'))),
+        ('GET', '/api/admin/items', handler.handle_get_admin_items, api),
+        ('GET', '/api/admin/users', handler.handle_get_admin_users, api),
+        ('DELETE', '/api/admin/users/{user_id}', handler.handle_delete_user, api),
+        ('GET', '/api/admin/metrics', handler.handle_get_metrics, api),
+        # Load balancers must reach the health check even when the server sheds load
+        ('GET', '/api/health', handler.handle_health, static),
+        # Pages and files
+        ('GET', '/admin/login', handler.handle_admin_page, static),
+        # The React admin routes internally
+        ('GET', '/admin/{page_path*}', handler.handle_react_admin_page, static),
+        ('GET', '/static/{file_path*}', handler.handle_react_admin_static_file, static),
+        ('GET', '/uploads/{file_path*}', handler.handle_static_file, static),
+    ]
+    for path in ('/api/admin/statistics', '/api/admin/stats', '/api/statistics', '/api/stats'):
+        routes.append(('GET', path, handler.handle_statistics_disabled, static))
+    
+    for method, pattern, function, middleware in routes:
+        router.add(method, pattern, function, middleware)
+    return router
+
+
+ROUTER = build_router()
+
+
 def main():
     """Start the PostgreSQL-powered server with AWS S3 integration"""
     print("DATABASE - Lost & Found Campus API Server with PostgreSQL & AWS S3")
     print("=" * 65)
     
-    # Test database connection
-    db = DatabaseManager()
-    if db.connect():
-        print("SUCCESS - PostgreSQL database connection successful")
-        
-        # Check if tables exist
-        try:
-            db.execute_query("SELECT COUNT(*) FROM users")
-            print("SUCCESS - Database tables are ready")
-        except psycopg2.Error:
-            print("WARNING - Database tables not found. Run 'python database_config.py' to set up tables.")
-        
-        db.disconnect()
-    else:
-        print("ERROR - PostgreSQL database connection failed!")
-        print("📋 Make sure PostgreSQL is running and database credentials are correct")
-        print("INFO - Check config/database.env.example for configuration")
-        return
-    
-    # Test S3 connection
-    print("\nCONFIG - Testing AWS S3 connection...")
-    if S3_AVAILABLE:
-        try:
-            if test_s3_connection():
-                print("SUCCESS - AWS S3 connection successful!")
-                print("📤 Images will be stored in AWS S3")
-            else:
-                print("WARNING - AWS S3 connection failed - will use local storage as fallback")
-        except Exception as e:
-            print(f"WARNING - S3 connection error: {e} - will use local storage as fallback")
-    else:
-        print("WARNING - S3 module not available - using local storage only")
-    
     # Ensure upload directory exists (for fallback)
     os.makedirs(UPLOAD_DIR, exist_ok=True)
     
     try:
-        with socketserver.TCPServer(("", PORT), PostgreSQLRequestHandler) as httpd:
+        # One thread per connection. TCPServer handled one request at a time, so a
+        # client slowly sending a photo, a bcrypt check or a long admin listing
+        # stalled every other client, health checks included. Handlers share no
+        # connection state (each has its own DatabaseManager) and the shared
+        # in-memory indexes and counters take their own locks.
+        with http.server.ThreadingHTTPServer(("", PORT), PostgreSQLRequestHandler) as httpd:
+            # Database and S3 are checked concurrently in the background; until the
+            # database answers, /api/health reports the server as not ready
+            print("\nCONFIG - Checking PostgreSQL and AWS S3 in the background...")
+            health.start()
+            threading.Thread(target=fail_abandoned_uploads, name='upload-sweep', daemon=True).start()
+            matching_engine.start_loading()
+            suggest_index.start_loading()
+            percolator.start_loading()
+            similarity_index.start_loading()
+            if SEARCH_INDEX_ENABLED:
+                search_index.start_loading()
+            
             print(f"\nSERVER - Server running at http://localhost:{PORT}")
             print(f"📱 Frontend should be available at http://localhost:3000")
             print(f"DATABASE - Database: PostgreSQL")
-            print(f"CLOUD - Images: {'AWS S3' if S3_AVAILABLE and test_s3_connection() else 'Local Storage'}")
+            print(f"CLOUD - Images: {STORAGE_BACKEND} storage backend")
             print(f"📁 Upload directory: {UPLOAD_DIR}")
+            print(f"CONFIG - JSON serializer: {SERIALIZER_NAME}")
+            print(f"CONFIG - Search index: {'enabled' if SEARCH_INDEX_ENABLED else 'disabled'}")
+            print(f"CONFIG - Rate limits: {'enabled' if RATE_LIMIT_ENABLED else 'disabled'}")
             print(f"ADMIN - Admin panel: http://localhost:{PORT}/admin")
+            print(f"🩺 Health: http://localhost:{PORT}/api/health")
             print("INFO - Press Ctrl+C to stop the server")
             httpd.serve_forever()
     except KeyboardInterrupt:
         print("\n🛑 Server stopped by user")
+        print("INFO - Waiting for pending image uploads...")
+        upload_pool.shutdown(wait=True)
+        password_hasher.shutdown(wait=False)
     except OSError as e:
-        if e.errno == 48:  # Address already in use
+        if e.errno in (48, 98):  # Address already in use (macOS, Linux)
             print(f"ERROR - Port {PORT} is already in use!")
-            print("INFO - Try: lsof -i :8000 and kill existing processes")
+            print(f"INFO - Try: lsof -i :{PORT} and kill existing processes")
         else:
             print(f"ERROR - Server error: {e}")
 
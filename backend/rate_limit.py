@@ -0,0 +1,181 @@
+"""
+Per-client rate limiting and load shedding
+
+Expensive routes draw from budgets (search, auth, upload; the route table in
+postgresql_server.py says which). Each budget has token buckets per client IP
+and per signed-in user: a bucket holds up to N tokens, refills at N per period
+and every request takes one, so a client can burst N requests and then sustain
+N per period. A request over budget is answered 429 with Retry-After before it
+touches the database.
+
+Independently, at most MAX_IN_FLIGHT API requests are handled at once; beyond
+that the server sheds load with 503 instead of opening more database
+connections.
+
+Limits are "requests/seconds" strings, e.g. RATE_LIMIT_SEARCH_IP=300/60.
+"""
+import os
+import math
+import time
+import threading
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+def parse_rate(value):
+    """'300/60' -> (capacity, refill per second); None when the limit is disabled ('' or '0')"""
+    if not value or value.strip() in ('0', 'off'):
+        return None
+    requests, _, seconds = value.partition('/')
+    requests = float(requests)
+    seconds = float(seconds or 1)
+    if requests <= 0 or seconds <= 0:
+        return None
+    return requests, requests / seconds
+
+
+# ======= RATE LIMIT CONFIGURATION =======
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+# Only behind a reverse proxy: take the client address from X-Forwarded-For
+RATE_LIMIT_TRUST_PROXY = os.getenv('RATE_LIMIT_TRUST_PROXY', 'false').lower() == 'true'
+# API requests handled concurrently before new ones get 503 (0 disables)
+MAX_IN_FLIGHT = int(os.getenv('MAX_IN_FLIGHT', 64))
+# Buckets kept before idle ones are dropped
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv('RATE_LIMIT_MAX_BUCKETS', 100000))
+
+# Campus networks put many users behind one address, so IP limits are looser than user limits
+BUDGETS = {
+    'search': {
+        'ip': parse_rate(os.getenv('RATE_LIMIT_SEARCH_IP', '300/60')),
+        'user': parse_rate(os.getenv('RATE_LIMIT_SEARCH_USER', '120/60')),
+    },
+    'auth': {
+        'ip': parse_rate(os.getenv('RATE_LIMIT_AUTH_IP', '30/60')),
+        'user': None,  # requests are not signed in yet
+    },
+    'upload': {
+        'ip': parse_rate(os.getenv('RATE_LIMIT_UPLOAD_IP', '60/60')),
+        'user': parse_rate(os.getenv('RATE_LIMIT_UPLOAD_USER', '20/60')),
+    },
+}
+
+
+class RateLimiter:
+    """Token buckets keyed by (budget, client) plus the in-flight cap; thread-safe"""
+
+    def __init__(self, budgets=BUDGETS, max_in_flight=MAX_IN_FLIGHT, max_buckets=RATE_LIMIT_MAX_BUCKETS):
+        self.budgets = budgets
+        self.max_in_flight = max_in_flight
+        self.max_buckets = max_buckets
+        self._lock = threading.Lock()
+        # (budget, 'ip'|'user', key) -> [tokens, last refill time]
+        self._buckets = {}
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.shed = 0
+        self.allowed = {name: 0 for name in budgets}
+        self.limited = {name: 0 for name in budgets}
+
+    # ----- token buckets -----
+
+    def check(self, budget, ip=None, user_id=None):
+        """Take a token from every bucket of the client; 0 when allowed, else seconds until it would be"""
+        limits = self.budgets.get(budget)
+        if limits is None:
+            return 0
+        buckets = []
+        for kind, key in (('ip', ip), ('user', user_id)):
+            if key is not None and limits.get(kind) is not None:
+                buckets.append(((budget, kind, key), limits[kind]))
+        if not buckets:
+            return 0
+
+        now = time.monotonic()
+        with self._lock:
+            if len(self._buckets) >= self.max_buckets:
+                self._prune(now)
+            states = []
+            wait = 0
+            for bucket_key, (capacity, refill) in buckets:
+                state = self._buckets.get(bucket_key)
+                if state is None:
+                    state = self._buckets[bucket_key] = [capacity, now]
+                else:
+                    state[0] = min(capacity, state[0] + (now - state[1]) * refill)
+                    state[1] = now
+                if state[0] < 1:
+                    wait = max(wait, (1 - state[0]) / refill)
+                states.append(state)
+            if wait:
+                # Nothing is taken when any bucket is empty
+                self.limited[budget] += 1
+                return wait
+            for state in states:
+                state[0] -= 1
+            self.allowed[budget] += 1
+            return 0
+
+    def _prune(self, now):
+        """Drop buckets that have refilled completely (they behave like new ones)"""
+        for bucket_key, state in list(self._buckets.items()):
+            capacity, refill = self.budgets[bucket_key[0]][bucket_key[1]]
+            if state[0] + (now - state[1]) * refill >= capacity:
+                del self._buckets[bucket_key]
+        if len(self._buckets) >= self.max_buckets:
+            # Everything is active - forget the oldest half rather than grow without bound
+            oldest = sorted(self._buckets, key=lambda bucket_key: self._buckets[bucket_key][1])
+            for bucket_key in oldest[:len(oldest) // 2]:
+                del self._buckets[bucket_key]
+
+    # ----- in-flight cap -----
+
+    def enter(self):
+        """Admit a request unless MAX_IN_FLIGHT are already running; pair with leave()"""
+        with self._lock:
+            if self.max_in_flight and self.in_flight >= self.max_in_flight:
+                self.shed += 1
+                return False
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': RATE_LIMIT_ENABLED,
+                'in_flight': self.in_flight,
+                'peak_in_flight': self.peak_in_flight,
+                'max_in_flight': self.max_in_flight,
+                'shed': self.shed,
+                'buckets': len(self._buckets),
+                'budgets': {
+                    name: {
+                        'allowed': self.allowed[name],
+                        'limited': self.limited[name],
+                        'ip_limit': _describe(limits.get('ip')),
+                        'user_limit': _describe(limits.get('user')),
+                    }
+                    for name, limits in self.budgets.items()
+                },
+            }
+
+
+def _describe(limit):
+    if limit is None:
+        return None
+    capacity, refill = limit
+    return f"{capacity:g}/{capacity / refill:g}s"
+
+
+def retry_after_header(seconds):
+    """Retry-After value: whole seconds, at least 1"""
+    return str(max(1, math.ceil(seconds)))
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,224 @@
+"""
+Table-driven request routing
+
+Routes are patterns of '/'-separated segments:
+
+    /api/items                  literal segments
+    /api/items/{item_id}        a parameter matches one non-empty segment
+    /uploads/{file_path*}       a trailing rest parameter matches the remainder
+
+They are compiled once into a segment trie, so matching a request walks one
+node per path segment however many routes exist. Literal segments win over
+parameters (/api/items/facets before /api/items/{item_id}), independent of
+the order routes were added. A path that exists for other methods only is
+reported so the caller can answer 405.
+
+Each route calls its handler as handler(request_handler, **path_params), plus
+query_params= when the handler takes it; path parameters the handler does not
+take are dropped. Middleware wraps that call and is composed when the route is
+added:
+
+    def middleware(route, call_next):
+        def call(request_handler, params):
+            ...
+            call_next(request_handler, params)
+        return call
+"""
+import time
+import inspect
+import threading
+
+
+class Route:
+    """One method + pattern; records call counts and durations"""
+    __slots__ = ('method', 'pattern', 'handler', 'middleware', 'call', 'calls', 'errors', 'seconds', 'max_seconds')
+
+    def __init__(self, method, pattern, handler, middleware=()):
+        self.method = method
+        self.pattern = pattern
+        self.handler = handler
+        self.middleware = tuple(middleware)
+        self.calls = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+        accepted = inspect.signature(handler).parameters
+        wants_query = 'query_params' in accepted
+        unused = [name for name in _pattern_params(pattern) if name not in accepted]
+        if unused:
+            # e.g. a catch-all page that does not look at the rest of the path
+            def call(request_handler, params):
+                for name in unused:
+                    params.pop(name, None)
+                if wants_query:
+                    params['query_params'] = request_handler.query_params
+                handler(request_handler, **params)
+        elif wants_query:
+            def call(request_handler, params):
+                handler(request_handler, query_params=request_handler.query_params, **params)
+        else:
+            def call(request_handler, params):
+                handler(request_handler, **params)
+        # The first middleware listed is the outermost
+        for middleware in reversed(self.middleware):
+            call = middleware(self, call)
+        self.call = call
+
+
+class _Node:
+    __slots__ = ('literals', 'param', 'param_node', 'rest', 'routes', 'rest_routes')
+
+    def __init__(self):
+        self.literals = {}
+        self.param = None
+        self.param_node = None
+        # Rest parameter name and its routes by method
+        self.rest = None
+        self.routes = {}
+        self.rest_routes = {}
+
+
+def _pattern_params(pattern):
+    return [name for kind, name in map(_parse_segment, pattern.split('/')) if kind != 'literal']
+
+
+def _parse_segment(segment):
+    """('literal', text) | ('param', name) | ('rest', name)"""
+    if segment.startswith('{') and segment.endswith('}'):
+        name = segment[1:-1]
+        if name.endswith('*'):
+            return 'rest', name[:-1]
+        return 'param', name
+    return 'literal', segment
+
+
+class Router:
+    """Segment trie of routes; matching is thread-safe once routes are added"""
+
+    def __init__(self):
+        self._root = _Node()
+        self._lock = threading.Lock()
+        self.routes = []
+
+    def add(self, method, pattern, handler, middleware=()):
+        """Register handler for method + pattern; conflicting parameter names are an error"""
+        route = Route(method, pattern, handler, middleware)
+        node = self._root
+        segments = pattern.strip('/').split('/') if pattern != '/' else ['']
+        for index, segment in enumerate(segments):
+            kind, value = _parse_segment(segment)
+            if kind == 'rest':
+                if index != len(segments) - 1:
+                    raise ValueError(f"Rest parameter must be last: {pattern}")
+                if node.rest not in (None, value):
+                    raise ValueError(f"Conflicting rest parameter in {pattern}")
+                node.rest = value
+                self._register(node.rest_routes, route)
+                return route
+            if kind == 'param':
+                if node.param not in (None, value):
+                    raise ValueError(f"Conflicting parameter {{{value}}} in {pattern}, already {{{node.param}}}")
+                node.param = value
+                if node.param_node is None:
+                    node.param_node = _Node()
+                node = node.param_node
+            else:
+                node = node.literals.setdefault(value, _Node())
+        self._register(node.routes, route)
+        return route
+
+    def _register(self, routes, route):
+        if route.method in routes:
+            raise ValueError(f"Duplicate route {route.method} {route.pattern}")
+        routes[route.method] = route
+        self.routes.append(route)
+
+    def route(self, method, pattern, middleware=()):
+        """Decorator form of add()"""
+        def decorator(handler):
+            self.add(method, pattern, handler, middleware)
+            return handler
+        return decorator
+
+    def match(self, method, path):
+        """
+        (route, params) for a request path; (None, allowed methods) when the
+        path exists for other methods only; None when nothing matches.
+        """
+        segments = path[1:].split('/') if path.startswith('/') else path.split('/')
+        params = {}
+        routes = self._find(self._root, segments, 0, params)
+        if routes is None:
+            return None
+        route = routes.get(method)
+        if route is None:
+            return None, sorted(routes)
+        return route, params
+
+    def _find(self, node, segments, index, params):
+        """Routes by method for segments[index:], filling params; literals first, then parameters"""
+        if index == len(segments):
+            if node.routes:
+                return node.routes
+            if node.rest_routes:
+                params[node.rest] = ''
+                return node.rest_routes
+            return None
+
+        segment = segments[index]
+        child = node.literals.get(segment)
+        if child is not None:
+            routes = self._find(child, segments, index + 1, params)
+            if routes is not None:
+                return routes
+        if node.param_node is not None and segment:
+            routes = self._find(node.param_node, segments, index + 1, params)
+            if routes is not None:
+                params[node.param] = segment
+                return routes
+        if node.rest_routes:
+            params[node.rest] = '/'.join(segments[index:])
+            return node.rest_routes
+        return None
+
+    # ----- timing -----
+
+    def record(self, route, seconds, failed=False):
+        with self._lock:
+            route.calls += 1
+            route.seconds += seconds
+            if seconds > route.max_seconds:
+                route.max_seconds = seconds
+            if failed:
+                route.errors += 1
+
+    def stats(self):
+        """Per-route call counts and timings (milliseconds), busiest first"""
+        with self._lock:
+            routes = [route for route in self.routes if route.calls]
+            return [
+                {
+                    'route': f"{route.method} {route.pattern}",
+                    'calls': route.calls,
+                    'errors': route.errors,
+                    'avg_ms': round(route.seconds / route.calls * 1000, 2),
+                    'max_ms': round(route.max_seconds * 1000, 2),
+                }
+                for route in sorted(routes, key=lambda route: -route.calls)
+            ]
+
+
+def timed(router):
+    """Middleware recording each call's duration in router.stats()"""
+    def middleware(route, call_next):
+        def call(request_handler, params):
+            started = time.perf_counter()
+            failed = True
+            try:
+                call_next(request_handler, params)
+                failed = False
+            finally:
+                router.record(route, time.perf_counter() - started, failed)
+        return call
+    return middleware
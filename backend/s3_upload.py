@@ -1,11 +1,16 @@
 # s3_upload.py
 
-import boto3
+import io
 import uuid
 import mimetypes
 import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
 from botocore.exceptions import NoCredentialsError, PartialCredentialsError, ClientError
 from dotenv import load_dotenv
+from multipart_parser import MAX_FILE_SIZE
 
 # Load environment variables
 load_dotenv()
@@ -16,62 +21,242 @@ AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
 AWS_S3_BUCKET_NAME = os.getenv('AWS_S3_BUCKET_NAME')
 AWS_REGION = os.getenv('AWS_REGION', 'ap-southeast-1')
 
+# ======= UPLOAD TUNING =======
+# Files at least this large are sent as concurrent multipart uploads. Opt-in (0 = off):
+# parts are at least 5 MiB, so splitting only pays off for uploads well above the
+# default MAX_FILE_SIZE of 5 MB - set it together with a larger MAX_FILE_SIZE
+S3_MULTIPART_THRESHOLD = int(os.getenv('S3_MULTIPART_THRESHOLD', 0))
+# Part size (S3 requires at least 5 MiB for every part but the last)
+S3_MULTIPART_CHUNK_SIZE = max(int(os.getenv('S3_MULTIPART_CHUNK_SIZE', 8 * 1024 * 1024)), 5 * 1024 * 1024)
+# Parts uploaded in parallel (also bounds the part buffers held in memory per upload)
+S3_MULTIPART_CONCURRENCY = int(os.getenv('S3_MULTIPART_CONCURRENCY', 4))
+S3_PART_RETRIES = int(os.getenv('S3_PART_RETRIES', 3))
+S3_MAX_POOL_CONNECTIONS = int(os.getenv('S3_MAX_POOL_CONNECTIONS', 32))
+
+# ======= PRESIGNED UPLOADS =======
+# Lifetime of presigned upload forms handed to browsers
+S3_PRESIGN_EXPIRES = int(os.getenv('S3_PRESIGN_EXPIRES', 300))
+# Only images may be uploaded directly; S3 enforces the type from the signed policy
+PRESIGN_CONTENT_TYPES = ('image/jpeg', 'image/png', 'image/webp', 'image/gif')
+
+# One client configuration shared by every upload: a connection pool large enough
+# for concurrent parts and adaptive retries (client-side rate limiting on throttling)
+S3_CLIENT_CONFIG = Config(
+    region_name=AWS_REGION,
+    max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+    retries={'mode': 'adaptive', 'max_attempts': int(os.getenv('S3_MAX_ATTEMPTS', 5))},
+    connect_timeout=float(os.getenv('S3_CONNECT_TIMEOUT', 5)),
+    read_timeout=float(os.getenv('S3_READ_TIMEOUT', 30)),
+)
+
 # ======= SAFETY CHECK =======
-if not all([AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_S3_BUCKET_NAME]):
+S3_CONFIGURED = all([AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_S3_BUCKET_NAME])
+if S3_MULTIPART_THRESHOLD > MAX_FILE_SIZE:
+    print(f"WARNING - S3_MULTIPART_THRESHOLD ({S3_MULTIPART_THRESHOLD}) is above MAX_FILE_SIZE ({MAX_FILE_SIZE}); "
+          "multipart uploads will never be used")
+if not S3_CONFIGURED:
     print("WARNING - AWS credentials not found in environment variables.")
     print("INFO - Please set AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, and AWS_S3_BUCKET_NAME in your .env file")
     # Don't exit, just disable S3 functionality
-    s3_client = None
-else:
-    # ======= INITIALIZE S3 CLIENT =======
+
+# ======= LAZY S3 CLIENT =======
+# Importing boto3 and building a client loads the service model, which slows
+# down startup; the client is created on first use instead
+_s3_client = None
+_s3_client_failed = False
+_s3_client_lock = threading.Lock()
+
+
+def get_s3_client():
+    """The shared S3 client, created on first call; None when S3 is not configured or unusable"""
+    global _s3_client, _s3_client_failed
+    if _s3_client is not None or _s3_client_failed or not S3_CONFIGURED:
+        return _s3_client
+
+    with _s3_client_lock:
+        if _s3_client is None and not _s3_client_failed:
+            try:
+                import boto3
+                _s3_client = boto3.client(
+                    's3',
+                    aws_access_key_id=AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+                    region_name=AWS_REGION,
+                    config=S3_CLIENT_CONFIG
+                )
+                print("SUCCESS - S3 client initialized successfully")
+            except Exception as e:
+                print(f"ERROR - Failed to initialize S3 client: {e}")
+                _s3_client_failed = True
+    return _s3_client
+
+
+def _build_key_and_content_type(original_filename, content_type=None, key_stem=None):
+    """Return an items/ key (named key_stem, or a new UUID) and the content type to store it with"""
+    extension = original_filename.split('.')[-1] if '.' in original_filename else 'jpg'
+    unique_key = f"items/{key_stem or uuid.uuid4()}.{extension.lower()}"
+
+    # Guess and correct content type
+    guessed_type, _ = mimetypes.guess_type(original_filename)
+    content_type = content_type or guessed_type or 'image/jpeg'
+
+    # Force correct content types for known extensions
+    ext = extension.lower()
+    if ext in ['jpg', 'jpeg']:
+        content_type = 'image/jpeg'
+    elif ext == 'png':
+        content_type = 'image/png'
+    elif ext == 'webp':
+        content_type = 'image/webp'
+    elif ext == 'gif':
+        content_type = 'image/gif'
+    else:
+        content_type = 'application/octet-stream'
+
+    return unique_key, content_type
+
+
+def _remaining_size(file_obj):
+    """Bytes left to read from the current position of a seekable file object"""
+    position = file_obj.tell()
+    size = file_obj.seek(0, os.SEEK_END) - position
+    file_obj.seek(position)
+    return size
+
+
+_part_executor = None
+_part_executor_lock = threading.Lock()
+
+
+def _get_part_executor():
+    """Shared thread pool for multipart part uploads, created on first use"""
+    global _part_executor
+    with _part_executor_lock:
+        if _part_executor is None:
+            _part_executor = ThreadPoolExecutor(
+                max_workers=S3_MULTIPART_CONCURRENCY * 2,
+                thread_name_prefix='s3-part'
+            )
+        return _part_executor
+
+
+def _upload_part(key, upload_id, part_number, body):
+    """Upload one part, retrying on failure with exponential backoff"""
+    for attempt in range(1, S3_PART_RETRIES + 1):
+        try:
+            response = get_s3_client().upload_part(
+                Bucket=AWS_S3_BUCKET_NAME,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                Body=body
+            )
+            return {'PartNumber': part_number, 'ETag': response['ETag']}
+        except ClientError as e:
+            if attempt == S3_PART_RETRIES:
+                raise
+            print(f"WARNING - Part {part_number} attempt {attempt}/{S3_PART_RETRIES} failed: {e}")
+            time.sleep(0.5 * (2 ** (attempt - 1)))
+
+
+def _multipart_upload(file_obj, key, content_type):
+    """
+    Upload file_obj as an S3 multipart upload with parts sent concurrently.
+    At most S3_MULTIPART_CONCURRENCY parts are buffered at once. On any failure
+    the multipart upload is aborted so no orphaned parts are billed.
+    """
+    s3_client = get_s3_client()
+    upload = s3_client.create_multipart_upload(
+        Bucket=AWS_S3_BUCKET_NAME,
+        Key=key,
+        ContentType=content_type
+    )
+    upload_id = upload['UploadId']
+    executor = _get_part_executor()
+    slots = threading.BoundedSemaphore(S3_MULTIPART_CONCURRENCY)
+    futures = []
+
+    def release_slot(_future):
+        slots.release()
+
     try:
-        s3_client = boto3.client(
-            's3',
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            region_name=AWS_REGION
+        part_number = 1
+        while True:
+            slots.acquire()
+            body = file_obj.read(S3_MULTIPART_CHUNK_SIZE)
+            if not body:
+                slots.release()
+                break
+            future = executor.submit(_upload_part, key, upload_id, part_number, body)
+            future.add_done_callback(release_slot)
+            futures.append(future)
+            part_number += 1
+
+        parts = [future.result() for future in futures]
+        s3_client.complete_multipart_upload(
+            Bucket=AWS_S3_BUCKET_NAME,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': parts}
         )
-        print("SUCCESS - S3 client initialized successfully")
-    except Exception as e:
-        print(f"ERROR - Failed to initialize S3 client: {e}")
-        s3_client = None
+        print(f"SUCCESS - Multipart upload completed: {key} ({len(parts)} parts)")
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        try:
+            s3_client.abort_multipart_upload(Bucket=AWS_S3_BUCKET_NAME, Key=key, UploadId=upload_id)
+            print(f"INFO - Aborted multipart upload for {key}")
+        except Exception as abort_error:
+            print(f"ERROR - Could not abort multipart upload for {key}: {abort_error}")
+        raise
+
 
+def s3_url(key):
+    """Public URL of an object in the bucket"""
+    return f"https://{AWS_S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{key}"
 
-def upload_file_to_s3(file_data, original_filename, content_type=None):
+
+def s3_key_from_url(url):
+    """Object key for a URL produced by s3_url, or None if it points elsewhere"""
+    prefix = s3_url('')
+    return url[len(prefix):] if url and url.startswith(prefix) else None
+
+
+def upload_file_to_s3_key(file_data, key, content_type):
     """
-    Uploads file to S3 and returns the file URL.
-    Ensures proper content type for supported image formats.
+    Uploads bytes or a binary file object to an exact key and returns the file URL.
+    When multipart uploads are enabled, files of S3_MULTIPART_THRESHOLD bytes or
+    more are uploaded in parallel parts.
     """
-    try:
-        extension = original_filename.split('.')[-1] if '.' in original_filename else 'jpg'
-        unique_key = f"items/{uuid.uuid4()}.{extension.lower()}"
-
-        # Guess and correct content type
-        guessed_type, _ = mimetypes.guess_type(original_filename)
-        content_type = content_type or guessed_type or 'image/jpeg'
-
-        # Force correct content types for known extensions
-        ext = extension.lower()
-        if ext in ['jpg', 'jpeg']:
-            content_type = 'image/jpeg'
-        elif ext == 'png':
-            content_type = 'image/png'
-        elif ext == 'webp':
-            content_type = 'image/webp'
-        elif ext == 'gif':
-            content_type = 'image/gif'
-        else:
-            content_type = 'application/octet-stream'
+    if isinstance(file_data, (bytes, bytearray, memoryview)):
+        file_data = io.BytesIO(file_data)
 
+    if S3_MULTIPART_THRESHOLD and _remaining_size(file_data) >= S3_MULTIPART_THRESHOLD:
+        _multipart_upload(file_data, key, content_type)
+    else:
         # Upload to S3
-        s3_client.put_object(
+        get_s3_client().put_object(
             Bucket=AWS_S3_BUCKET_NAME,
-            Key=unique_key,
+            Key=key,
             Body=file_data,
             ContentType=content_type
         )
 
-        file_url = f"https://{AWS_S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{unique_key}"
+    return s3_url(key)
+
+
+def upload_file_to_s3(file_data, original_filename, content_type=None, key_stem=None):
+    """
+    Uploads file to S3 and returns the file URL.
+    file_data may be bytes or a binary file object (read from its current position).
+    key_stem names the object (e.g. a content hash); a new UUID is used otherwise.
+    Large files may go up in parallel parts (see upload_file_to_s3_key).
+    Ensures proper content type for supported image formats.
+    """
+    try:
+        unique_key, content_type = _build_key_and_content_type(original_filename, content_type, key_stem)
+
+        file_url = upload_file_to_s3_key(file_data, unique_key, content_type)
         print(f"SUCCESS - File uploaded: {file_url}")
         return file_url
 
@@ -86,8 +271,69 @@ def upload_file_to_s3(file_data, original_filename, content_type=None):
         raise
 
 
+def create_presigned_upload(original_filename, max_size):
+    """
+    Presigned POST that lets a browser upload an image straight to a new items/ key.
+    The signed policy pins the Content-Type and limits the body to 1..max_size bytes.
+    Returns {'url', 'fields', 'key', 'content_type', 'expires_in'}, or None for
+    file types that cannot be uploaded directly.
+    """
+    key, content_type = _build_key_and_content_type(original_filename)
+    if content_type not in PRESIGN_CONTENT_TYPES:
+        return None
+
+    presigned = get_s3_client().generate_presigned_post(
+        Bucket=AWS_S3_BUCKET_NAME,
+        Key=key,
+        Fields={'Content-Type': content_type},
+        Conditions=[
+            {'Content-Type': content_type},
+            ['content-length-range', 1, max_size],
+        ],
+        ExpiresIn=S3_PRESIGN_EXPIRES
+    )
+    return {
+        'url': presigned['url'],
+        'fields': presigned['fields'],
+        'key': key,
+        'content_type': content_type,
+        'expires_in': S3_PRESIGN_EXPIRES,
+    }
+
+
+def verify_uploaded_object(key, max_size):
+    """
+    Check with head_object that a presigned upload actually landed.
+    Returns the object's metadata, or None if the key is not an items/ key, the
+    object is missing, or its size or content type is not acceptable.
+    """
+    if not key or not key.startswith('items/') or '..' in key:
+        return None
+    try:
+        head = get_s3_client().head_object(Bucket=AWS_S3_BUCKET_NAME, Key=key)
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+
+    if not 0 < head['ContentLength'] <= max_size:
+        print(f"WARNING - Rejected uploaded object {key}: {head['ContentLength']} bytes")
+        return None
+    if head.get('ContentType') not in PRESIGN_CONTENT_TYPES:
+        print(f"WARNING - Rejected uploaded object {key}: content type {head.get('ContentType')}")
+        return None
+    return head
+
+
+def delete_file_from_s3(key):
+    """Delete an object from the bucket"""
+    get_s3_client().delete_object(Bucket=AWS_S3_BUCKET_NAME, Key=key)
+    print(f"DELETE - Removed S3 object: {key}")
+
+
 def test_s3_connection():
     """Test S3 connection by checking bucket access."""
+    s3_client = get_s3_client()
     if s3_client is None:
         print("ERROR - S3 client not initialized")
         return False
@@ -0,0 +1,307 @@
+"""
+Saved searches with alerts on new items (percolation)
+
+Users save a search - keywords, category and/or status - and are notified
+when a newly created item matches it. Instead of running every saved search
+against each new item, the searches are indexed by one of their words:
+
+    key word -> saved search ids       (searches with keywords)
+    trigram -> key words starting with it
+    (category, status) -> search ids   (searches with filters only)
+
+A new item looks up the trigram at each position of its title/description
+words and keeps the key words that occur there, so only searches whose key
+word occurs in the item are checked in full - one lookup per character
+instead of one per substring. A saved
+search matches exactly the items the same /api/items search would list.
+Matches are written to the notifications table by a background thread, one
+multi-row INSERT for everything queued since the last write.
+"""
+import os
+import re
+import time
+import queue
+import threading
+from database_config import DatabaseManager
+import item_events
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# ======= SAVED SEARCH CONFIGURATION =======
+SAVED_SEARCH_LIMIT = int(os.getenv('SAVED_SEARCH_LIMIT', 20))  # per user
+SAVED_SEARCH_MAX_QUERY_LENGTH = 200
+SAVED_SEARCH_STATUSES = ('lost', 'found')
+NOTIFICATION_TYPE = 'saved_search_match'
+
+# Key words shorter than this would be found in most items; such searches are checked every time.
+# Also the length of the leading n-gram key words are indexed by
+MIN_KEY_LENGTH = 3
+
+WORD_PATTERN = re.compile(r'[^\W_]+')
+
+_EMPTY = frozenset()
+
+NOTIFICATION_INSERT = """
+    INSERT INTO notifications (user_id, item_id, type, title, message)
+    SELECT v.user_id, v.item_id, v.type, v.title, v.message
+    FROM (VALUES %s) AS v(user_id, item_id, type, title, message)
+    -- The user or the item may have been deleted while the alert was queued
+    WHERE EXISTS (SELECT 1 FROM users u WHERE u.id = v.user_id)
+      AND EXISTS (SELECT 1 FROM items i WHERE i.id = v.item_id)
+"""
+NOTIFICATION_TEMPLATE = "(%s::uuid, %s::uuid, %s, %s, %s)"
+
+
+class SavedSearch:
+    """A saved search as the percolator checks it"""
+    __slots__ = ('id', 'user_id', 'query', 'text', 'category', 'status', 'key')
+
+    def __init__(self, row):
+        self.id = str(row['id'])
+        self.user_id = str(row['user_id'])
+        self.query = row.get('query') or ''
+        self.text = self.query.lower()
+        self.category = row.get('category') or ''
+        self.status = row.get('status') or ''
+        # A word of the query that any matching item must contain
+        self.key = max(WORD_PATTERN.findall(self.text), key=len, default='')
+
+    def matches(self, item, title, description):
+        return ((not self.category or self.category == item.get('category'))
+                and (not self.status or self.status == item.get('status'))
+                and (not self.text or self.text in title or self.text in description))
+
+    def describe(self):
+        parts = []
+        if self.query:
+            parts.append(f'"{self.query}"')
+        if self.status:
+            parts.append(self.status)
+        if self.category:
+            parts.append(f"in {self.category}")
+        return ' '.join(parts)
+
+
+def _add_posting(postings, key, search_id):
+    postings.setdefault(key, set()).add(search_id)
+
+
+def _remove_posting(postings, key, search_id):
+    ids = postings.get(key)
+    if ids is not None:
+        ids.discard(search_id)
+        if not ids:
+            del postings[key]
+
+
+class Percolator:
+    """Index of saved searches, matched against new items; thread-safe"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._searches = {}
+        self._by_key = {}
+        # Leading MIN_KEY_LENGTH characters -> key words in _by_key starting with them
+        self._key_grams = {}
+        self._by_filter = {}
+        # Searches whose words are all too short to index
+        self._unindexed = set()
+        self._queue = queue.Queue()
+        self._writer = None
+        self.loaded = False
+        self.load_seconds = None
+        self.items_checked = 0
+        self.searches_checked = 0
+        self.notifications_queued = 0
+        self.notifications_written = 0
+        self.batches_written = 0
+
+    # ----- index maintenance -----
+
+    def add(self, row):
+        search = SavedSearch(row)
+        with self._lock:
+            self._remove(search.id)
+            self._searches[search.id] = search
+            if len(search.key) >= MIN_KEY_LENGTH:
+                if search.key not in self._by_key:
+                    _add_posting(self._key_grams, search.key[:MIN_KEY_LENGTH], search.key)
+                _add_posting(self._by_key, search.key, search.id)
+            elif search.text:
+                self._unindexed.add(search.id)
+            else:
+                _add_posting(self._by_filter, (search.category, search.status), search.id)
+
+    def remove(self, search_id):
+        with self._lock:
+            self._remove(str(search_id))
+
+    def remove_user(self, user_id):
+        user_id = str(user_id)
+        with self._lock:
+            for search in [search for search in self._searches.values() if search.user_id == user_id]:
+                self._remove(search.id)
+
+    def _remove(self, search_id):
+        search = self._searches.pop(search_id, None)
+        if search is None:
+            return
+        _remove_posting(self._by_key, search.key, search_id)
+        if search.key not in self._by_key:
+            _remove_posting(self._key_grams, search.key[:MIN_KEY_LENGTH], search.key)
+        _remove_posting(self._by_filter, (search.category, search.status), search_id)
+        self._unindexed.discard(search_id)
+
+    def load(self, db=None):
+        """(Re)build the index from the database; holds the lock so new items wait for it"""
+        own_connection = db is None
+        if own_connection:
+            db = DatabaseManager()
+            if not db.connect():
+                return False
+        try:
+            with self._lock:
+                started = time.perf_counter()
+                rows = db.execute_query("SELECT id, user_id, query, category, status FROM saved_searches")
+                self._searches = {}
+                self._by_key = {}
+                self._key_grams = {}
+                self._by_filter = {}
+                self._unindexed = set()
+                for row in rows:
+                    self.add(row)
+                self.loaded = True
+                self.load_seconds = time.perf_counter() - started
+            print(f"SUCCESS - Saved searches loaded: {len(self._searches)} in {self.load_seconds * 1000:.1f} ms")
+            return True
+        except Exception as e:
+            print(f"ERROR - Could not load saved searches: {e}")
+            return False
+        finally:
+            if own_connection:
+                db.disconnect()
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            with self._lock:
+                # Another thread may have finished loading while this one waited
+                if not self.loaded:
+                    self.load()
+        return self.loaded
+
+    def start_loading(self):
+        """Load the index on a background thread"""
+        threading.Thread(target=self.ensure_loaded, name='saved-search-load', daemon=True).start()
+
+    # ----- matching -----
+
+    def _candidates(self, item, words):
+        """Ids of the saved searches that can match an item with these words"""
+        candidates = set(self._unindexed)
+        category = item.get('category') or ''
+        status = item.get('status') or ''
+        for key in ((category, status), (category, ''), ('', status), ('', '')):
+            candidates |= self._by_filter.get(key, _EMPTY)
+
+        by_key = self._by_key
+        key_grams = self._key_grams
+        for word in words:
+            for start in range(len(word) - MIN_KEY_LENGTH + 1):
+                keys = key_grams.get(word[start:start + MIN_KEY_LENGTH])
+                if keys:
+                    for key in keys:
+                        if word.startswith(key, start):
+                            candidates |= by_key[key]
+        return candidates
+
+    def percolate(self, item):
+        """Saved searches of other users that match a new item"""
+        title = (item.get('title') or '').lower()
+        description = (item.get('description') or '').lower()
+        words = set(WORD_PATTERN.findall(title)) | set(WORD_PATTERN.findall(description))
+        owner = str(item.get('user_id'))
+        with self._lock:
+            candidates = self._candidates(item, words)
+            self.items_checked += 1
+            self.searches_checked += len(candidates)
+            return [
+                search for search in (self._searches[search_id] for search_id in candidates)
+                if search.user_id != owner and search.matches(item, title, description)
+            ]
+
+    def on_item_event(self, event_type, item_id, item):
+        if event_type != item_events.ITEM_CREATED or item is None or not self.loaded:
+            return
+        if item.get('status') not in SAVED_SEARCH_STATUSES:
+            return
+        matches = self.percolate(item)
+        if not matches:
+            return
+
+        # One alert per user, however many of their searches match
+        by_user = {}
+        for search in matches:
+            by_user.setdefault(search.user_id, search)
+        rows = [
+            (user_id, item_id, NOTIFICATION_TYPE,
+             f"New {item.get('status')} item matches your saved search",
+             f"'{item.get('title')}' matches {search.describe()}")
+            for user_id, search in by_user.items()
+        ]
+        with self._lock:
+            self.notifications_queued += len(rows)
+        self._queue.put(rows)
+        self._ensure_writer()
+
+    # ----- notification writer -----
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name='saved-search-alerts', daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            rows = self._queue.get()
+            # Everything queued meanwhile goes into the same INSERT
+            while True:
+                try:
+                    rows.extend(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(rows)
+
+    def _write(self, rows):
+        db = DatabaseManager()
+        if not db.connect():
+            print(f"ERROR - Could not write {len(rows)} saved search notifications: database unavailable")
+            return
+        try:
+            written = db.execute_batch_insert(NOTIFICATION_INSERT, rows, template=NOTIFICATION_TEMPLATE)
+            with self._lock:
+                self.notifications_written += written
+                self.batches_written += 1
+        except Exception as e:
+            print(f"ERROR - Could not write {len(rows)} saved search notifications: {e}")
+        finally:
+            db.disconnect()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'loaded': self.loaded,
+                'saved_searches': len(self._searches),
+                'items_checked': self.items_checked,
+                'searches_checked': self.searches_checked,
+                'notifications_queued': self.notifications_queued,
+                'notifications_written': self.notifications_written,
+                'batches_written': self.batches_written,
+                'load_ms': round(self.load_seconds * 1000, 1) if self.load_seconds is not None else None,
+            }
+
+
+percolator = Percolator()
+item_events.subscribe(percolator.on_item_event)
@@ -0,0 +1,375 @@
+"""
+In-memory index of listed items for GET /api/items
+
+Holds every item the public listing can show (status != 'returned') as a
+compact record - its pre-serialized JSON row, lower-cased title and
+description, and sort key - plus posting lists per status, per category and
+per word token. List and search requests are answered from memory with the
+same response body the SQL path produces:
+
+    filters  -> intersect the status / category postings (smallest first)
+    search   -> the longest word of the query selects candidate ids through the
+                token postings (tokens containing it are found through a
+                trigram index over the vocabulary); candidates are then checked
+                with a substring test so results match
+                "title ILIKE %q% OR description ILIKE %q%"
+    ordering -> created_at DESC: large result sets are paged off a sorted list
+                of all items, small ones by a top-k selection
+
+Queries the index cannot answer exactly (ILIKE wildcards in the search term,
+invalid paging) return None and fall back to the database. The index is
+optional (SEARCH_INDEX_ENABLED), loaded once at startup and kept current from
+item_events. Events for items whose owner is not cached yet need a database
+read; those are applied by a background thread, never on the request thread
+that published them.
+"""
+import os
+import re
+import time
+import queue
+import heapq
+import bisect
+import threading
+from datetime import datetime
+from database_config import DatabaseManager, ITEM_USER_COLUMNS
+from json_serializer import dumps as json_dumps
+import item_events
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# ======= SEARCH INDEX CONFIGURATION =======
+SEARCH_INDEX_ENABLED = os.getenv('SEARCH_INDEX_ENABLED', 'false').lower() == 'true'
+# Query words shorter than this match too many tokens to be worth a lookup; those searches scan.
+# Also the length of the n-grams indexing the vocabulary
+SEARCH_MIN_TOKEN_LENGTH = 3
+# Pages of result sets holding at least 1/DENSE_MATCH_RATIO of all items are read off the
+# sorted listing instead of selecting the newest matches with a heap
+DENSE_MATCH_RATIO = 8
+
+HIDDEN_STATUS = 'returned'
+# Characters with a meaning in ILIKE patterns - such searches are left to the database
+LIKE_SPECIAL_CHARACTERS = ('%', '_', '\\')
+# What ITEM_USER_COLUMNS yields for a null join
+DEFAULT_USER_COLUMNS = ('Unknown', 'team@example.com')
+
+WORD_PATTERN = re.compile(r'[^\W_]+')
+
+_EMPTY = frozenset()
+
+
+class IndexedItem:
+    """Compact per-item data: what the filters and the search test need, plus the response row"""
+    __slots__ = ('id', 'status', 'category', 'sort_key', 'title', 'description', 'tokens', 'body')
+
+    def __init__(self, item):
+        self.id = str(item['id'])
+        self.status = item.get('status')
+        self.category = item.get('category')
+        created_at = item.get('created_at')
+        # ORDER BY created_at DESC lists NULLs first; the id breaks ties deterministically
+        self.sort_key = (created_at is None, created_at or datetime.min, self.id)
+        self.title = (item.get('title') or '').lower()
+        self.description = (item.get('description') or '').lower()
+        self.tokens = frozenset(WORD_PATTERN.findall(self.title)) | frozenset(WORD_PATTERN.findall(self.description))
+        self.body = json_dumps(item)
+
+    def contains(self, text):
+        return text in self.title or text in self.description
+
+
+def _add_posting(postings, key, item_id):
+    postings.setdefault(key, set()).add(item_id)
+
+
+def _grams(word):
+    """The distinct SEARCH_MIN_TOKEN_LENGTH-character substrings of a word"""
+    size = SEARCH_MIN_TOKEN_LENGTH
+    return {word[index:index + size] for index in range(len(word) - size + 1)}
+
+
+def _remove_posting(postings, key, item_id):
+    ids = postings.get(key)
+    if ids is not None:
+        ids.discard(item_id)
+        if not ids:
+            del postings[key]
+
+
+class SearchIndex:
+    """Posting lists over listed items; thread-safe"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        # user id -> (user_name, user_email), as ITEM_USER_COLUMNS returns them
+        self._users = {}
+        self.loaded = False
+        self.load_seconds = None
+        self.queries = 0
+        self.fallbacks = 0
+        # Events waiting for the background thread (user lookups); while any are
+        # queued, later events queue behind them so they apply in order
+        self._events = queue.Queue()
+        self._deferred = 0
+        self._event_worker = None
+        self.deferred_events = 0
+
+    def _reset(self):
+        self._records = {}
+        # Sort keys of every record, ascending (the listing reads it back to front)
+        self._order = []
+        self._by_status = {}
+        self._by_category = {}
+        self._tokens = {}
+        # n-gram -> tokens containing it, for finding the tokens a query word lies in
+        self._token_grams = {}
+
+    # ----- index maintenance -----
+
+    def add(self, item):
+        """Index (or re-index) an item row that carries the user columns; hidden items are removed"""
+        record = IndexedItem(item)
+        with self._lock:
+            self._remove(record.id)
+            if record.status == HIDDEN_STATUS:
+                return
+            self._records[record.id] = record
+            bisect.insort(self._order, record.sort_key)
+            _add_posting(self._by_status, record.status, record.id)
+            _add_posting(self._by_category, record.category, record.id)
+            for token in record.tokens:
+                if token not in self._tokens:
+                    for gram in _grams(token):
+                        _add_posting(self._token_grams, gram, token)
+                _add_posting(self._tokens, token, record.id)
+
+    def remove(self, item_id):
+        with self._lock:
+            self._remove(str(item_id))
+
+    def _remove(self, item_id):
+        record = self._records.pop(item_id, None)
+        if record is None:
+            return
+        position = bisect.bisect_left(self._order, record.sort_key)
+        del self._order[position]
+        _remove_posting(self._by_status, record.status, item_id)
+        _remove_posting(self._by_category, record.category, item_id)
+        for token in record.tokens:
+            _remove_posting(self._tokens, token, item_id)
+            if token not in self._tokens:
+                for gram in _grams(token):
+                    _remove_posting(self._token_grams, gram, token)
+
+    def _user_columns(self, user_id, cached_only=False):
+        """
+        (user_name, user_email) for an item's owner; unknown users are read once
+        from the database. None when the read fails, or with cached_only, when
+        it would be needed.
+        """
+        if user_id is None:
+            return DEFAULT_USER_COLUMNS
+        user_id = str(user_id)
+        with self._lock:
+            columns = self._users.get(user_id)
+        if columns is not None or cached_only:
+            return columns
+
+        db = DatabaseManager()
+        if not db.connect():
+            return None
+        try:
+            rows = db.execute_query(f"SELECT {ITEM_USER_COLUMNS} FROM users u WHERE u.id = %s", (user_id,))
+        finally:
+            db.disconnect()
+        columns = (rows[0]['user_name'], rows[0]['user_email']) if rows else DEFAULT_USER_COLUMNS
+        with self._lock:
+            self._users[user_id] = columns
+        return columns
+
+    def on_item_event(self, event_type, item_id, item):
+        """Apply an event in place when that needs no database read; otherwise queue it for the background thread"""
+        with self._lock:
+            if not self.loaded:
+                # The initial load reads the committed row from the database
+                return
+            if not self._deferred and self._apply(event_type, item_id, item, cached_only=True):
+                return
+            self._deferred += 1
+            self.deferred_events += 1
+            if self._event_worker is None or not self._event_worker.is_alive():
+                self._event_worker = threading.Thread(target=self._event_loop, name='search-index-events',
+                                                      daemon=True)
+                self._event_worker.start()
+        self._events.put((event_type, item_id, item))
+
+    def _event_loop(self):
+        while True:
+            event_type, item_id, item = self._events.get()
+            try:
+                self._apply(event_type, item_id, item)
+            except Exception as e:
+                print(f"ERROR - Search index could not apply event for item {item_id}: {e}")
+            finally:
+                with self._lock:
+                    self._deferred -= 1
+
+    def _apply(self, event_type, item_id, item, cached_only=False):
+        """Update the index for one event; False (nothing changed) when cached_only and the owner is not cached"""
+        if event_type == item_events.ITEM_DELETED or item is None or item.get('status') == HIDDEN_STATUS:
+            self.remove(item_id)
+            return True
+
+        user_columns = self._user_columns(item.get('user_id'), cached_only)
+        if user_columns is None:
+            if cached_only:
+                return False
+            # The listing would serve a row without its owner; drop it until the next load
+            print(f"WARNING - Search index could not read the owner of item {item_id}; reloading")
+            with self._lock:
+                self.remove(item_id)
+                self.loaded = False
+            self.start_loading()
+            return True
+        row = dict(item)
+        row['user_name'], row['user_email'] = user_columns
+        self.add(row)
+        return True
+
+    def load(self, db=None):
+        """(Re)build the index from the database; holds the lock so events wait for it"""
+        own_connection = db is None
+        if own_connection:
+            db = DatabaseManager()
+            if not db.connect():
+                return False
+        try:
+            with self._lock:
+                started = time.perf_counter()
+                user_rows = db.execute_query(f"SELECT u.id, {ITEM_USER_COLUMNS} FROM users u")
+                columns, rows = db.execute_query_rows(
+                    f"""
+                    SELECT i.*, {ITEM_USER_COLUMNS}
+                    FROM items i
+                    LEFT JOIN users u ON i.user_id = u.id
+                    WHERE i.status != %s
+                    """,
+                    (HIDDEN_STATUS,)
+                )
+                self._users = {str(user['id']): (user['user_name'], user['user_email']) for user in user_rows}
+                self._reset()
+                for row in rows:
+                    self.add(dict(zip(columns, row)))
+                self.loaded = True
+                self.load_seconds = time.perf_counter() - started
+            print(f"SUCCESS - Search index loaded: {len(self._records)} items, {len(self._tokens)} tokens "
+                  f"in {self.load_seconds * 1000:.1f} ms")
+            return True
+        except Exception as e:
+            print(f"ERROR - Could not load search index: {e}")
+            return False
+        finally:
+            if own_connection:
+                db.disconnect()
+
+    def ensure_loaded(self):
+        with self._lock:
+            # Another thread may have finished loading while this one waited for the lock
+            if not self.loaded:
+                self.load()
+            return self.loaded
+
+    def start_loading(self):
+        """Load the index on a background thread"""
+        threading.Thread(target=self.ensure_loaded, name='search-index-load', daemon=True).start()
+
+    # ----- queries -----
+
+    def _search_candidates(self, text):
+        """Ids whose tokens can contain the search text, or None when every item is a candidate"""
+        longest = max(WORD_PATTERN.findall(text), key=len, default='')
+        if len(longest) < SEARCH_MIN_TOKEN_LENGTH:
+            return None
+        # A word of the query lies inside one word of any matching title/description;
+        # tokens holding every n-gram of the word are checked, not the whole vocabulary
+        gram_postings = sorted((self._token_grams.get(gram, _EMPTY) for gram in _grams(longest)), key=len)
+        candidates = set()
+        for token in gram_postings[0].intersection(*gram_postings[1:]):
+            if longest in token:
+                candidates |= self._tokens[token]
+        return candidates
+
+    def query(self, search='', category='', status='', page=1, per_page=12):
+        """
+        (total, [serialized item rows]) for one page of the listing, newest first,
+        or None when the query has to go to the database.
+        """
+        if page < 1 or per_page < 1 or any(char in search for char in LIKE_SPECIAL_CHARACTERS):
+            with self._lock:
+                self.fallbacks += 1
+            return None
+
+        offset = (page - 1) * per_page
+        text = search.lower()
+        with self._lock:
+            if not self.loaded or self._deferred:
+                # Queued events are not applied yet; the database has the committed rows
+                self.fallbacks += 1
+                return None
+            self.queries += 1
+            records = self._records
+
+            filters = []
+            if status:
+                filters.append(self._by_status.get(status, _EMPTY))
+            if category:
+                filters.append(self._by_category.get(category, _EMPTY))
+            if search:
+                candidates = self._search_candidates(text)
+                if candidates is not None:
+                    filters.append(candidates)
+
+            if not filters and not search:
+                total = len(self._order)
+                end = max(total - offset, 0)
+                keys = self._order[max(end - per_page, 0):end]
+                return total, [records[key[2]].body for key in reversed(keys)]
+
+            filters.sort(key=len)
+            matches = filters[0].intersection(*filters[1:]) if filters else records.keys()
+            if search:
+                matches = {item_id for item_id in matches if records[item_id].contains(text)}
+
+            wanted = offset + per_page
+            if len(matches) * DENSE_MATCH_RATIO >= len(self._order):
+                # Most items match: walking the listing order stops after a few pages
+                page_ids = []
+                for key in reversed(self._order):
+                    if key[2] in matches:
+                        page_ids.append(key[2])
+                        if len(page_ids) == wanted:
+                            break
+            else:
+                page_ids = heapq.nlargest(wanted, matches, key=lambda item_id: records[item_id].sort_key)
+            return len(matches), [records[item_id].body for item_id in page_ids[offset:]]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': SEARCH_INDEX_ENABLED,
+                'loaded': self.loaded,
+                'items': len(self._records),
+                'tokens': len(self._tokens),
+                'token_grams': len(self._token_grams),
+                'deferred_events': self.deferred_events,
+                'users': len(self._users),
+                'queries': self.queries,
+                'fallbacks': self.fallbacks,
+                'load_ms': round(self.load_seconds * 1000, 1) if self.load_seconds is not None else None,
+            }
+
+
+search_index = SearchIndex()
+item_events.subscribe(search_index.on_item_event)
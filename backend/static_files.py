@@ -0,0 +1,173 @@
+"""
+Static file serving helpers - cached file metadata, conditional requests,
+byte ranges and zero-copy transmission with sendfile
+"""
+import os
+import stat
+import mimetypes
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# How long (seconds) a cached stat() result is trusted before re-checking the file
+STATIC_STAT_TTL = float(os.getenv('STATIC_STAT_TTL', 5))
+# Maximum number of files whose metadata is kept in memory
+STATIC_CACHE_SIZE = int(os.getenv('STATIC_CACHE_SIZE', 2048))
+
+
+class FileMeta:
+    """Metadata needed to answer a static file request without touching the disk"""
+    __slots__ = ('path', 'size', 'mtime', 'etag', 'last_modified', 'content_type', 'checked_at')
+
+    def __init__(self, path, st):
+        self.path = path
+        self.size = st.st_size
+        self.mtime = int(st.st_mtime)
+        self.etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+        content_type, _ = mimetypes.guess_type(path)
+        self.content_type = content_type or 'application/octet-stream'
+        self.checked_at = time.monotonic()
+
+
+class StaticFileCache:
+    """Small thread-safe cache of FileMeta entries so hot assets are not stat()ed on every request"""
+
+    def __init__(self, ttl=STATIC_STAT_TTL, max_entries=STATIC_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, path):
+        """Return FileMeta for path, or None if it is missing or not a regular file"""
+        now = time.monotonic()
+        with self._lock:
+            meta = self._entries.get(path)
+        if meta is not None and now - meta.checked_at < self.ttl:
+            return meta
+
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+        # One stat call: a directory or device at the path is treated as missing
+        if st is None or not stat.S_ISREG(st.st_mode):
+            with self._lock:
+                self._entries.pop(path, None)
+            return None
+
+        meta = FileMeta(path, st)
+        with self._lock:
+            if path not in self._entries and len(self._entries) >= self.max_entries:
+                # Drop the oldest entry (dicts keep insertion order)
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[path] = meta
+        return meta
+
+    def invalidate(self, path=None):
+        """Forget one path, or everything when path is None"""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+
+
+static_file_cache = StaticFileCache()
+
+
+def safe_join(base_dir, relative_path):
+    """Join relative_path onto base_dir, returning None if the result escapes base_dir"""
+    base = os.path.realpath(base_dir)
+    full_path = os.path.realpath(os.path.join(base, relative_path.lstrip('/')))
+    if full_path != base and not full_path.startswith(base + os.sep):
+        return None
+    return full_path
+
+
+def is_not_modified(headers, meta):
+    """Evaluate If-None-Match / If-Modified-Since against the file metadata"""
+    if_none_match = headers.get('If-None-Match')
+    if if_none_match:
+        if if_none_match.strip() == '*':
+            return True
+        # Weak comparison: W/"x" matches "x"
+        candidates = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        return meta.etag in candidates
+
+    if_modified_since = headers.get('If-Modified-Since')
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since is None:
+            return False
+        return meta.mtime <= int(since.timestamp())
+
+    return False
+
+
+def parse_range(headers, meta):
+    """
+    Parse a single-range Range header.
+    Returns (start, end) inclusive, None to serve the whole file, or
+    'unsatisfiable' when the range cannot be served (416).
+    Multiple ranges are not supported and fall back to the whole file.
+    """
+    range_header = headers.get('Range')
+    if not range_header or not range_header.startswith('bytes='):
+        return None
+
+    # If-Range: only honour the range if the validator still matches
+    if_range = headers.get('If-Range')
+    if if_range and if_range.strip() not in (meta.etag, meta.last_modified):
+        return None
+
+    spec = range_header[len('bytes='):].strip()
+    if ',' in spec:
+        return None
+
+    start_text, _, end_text = spec.partition('-')
+    try:
+        if start_text == '':
+            # Suffix range: last N bytes
+            length = int(end_text)
+            if length <= 0:
+                return 'unsatisfiable'
+            start = max(meta.size - length, 0)
+            end = meta.size - 1
+        else:
+            start = int(start_text)
+            end = int(end_text) if end_text else meta.size - 1
+    except ValueError:
+        return None
+
+    if start >= meta.size:
+        return 'unsatisfiable'
+    if start > end:
+        return None
+    return start, min(end, meta.size - 1)
+
+
+def send_file_range(sock, wfile, file_obj, offset, count):
+    """Write count bytes of file_obj starting at offset, using sendfile when the socket allows it"""
+    if count <= 0:
+        return
+    try:
+        # socket.sendfile() uses os.sendfile() where available and falls back to send()
+        sock.sendfile(file_obj, offset, count)
+    except (AttributeError, NotImplementedError, ValueError):
+        file_obj.seek(offset)
+        remaining = count
+        while remaining > 0:
+            chunk = file_obj.read(min(65536, remaining))
+            if not chunk:
+                break
+            wfile.write(chunk)
+            remaining -= len(chunk)
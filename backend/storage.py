@@ -0,0 +1,384 @@
+"""
+Pluggable file storage for item images
+
+Stored files (originals and their variants) are addressed by a flat name such
+as "<sha256>.jpg" and live in one of these backends:
+    S3Storage     - the S3 bucket, under the items/ prefix
+    LocalStorage  - files under UPLOAD_DIR, served by the API at /uploads/
+    MemoryStorage - a process-local dict, for benchmarks and offline testing
+
+Run as a script to move files from the old flat UPLOAD_DIR layout into shards:
+    python storage.py --migrate-local [--dry-run]
+
+STORAGE_BACKEND selects the primary backend: auto (S3 when configured,
+otherwise local), s3, local or memory. Each backend recognises its own URLs,
+so files stored by an earlier configuration (or by the local fallback) can
+still be read and deleted through storage_for_url().
+"""
+import io
+import os
+import sys
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import mimetypes
+import threading
+from static_files import safe_join
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Import S3 upload functionality (optional - local storage is used without it)
+try:
+    import s3_upload
+    S3_AVAILABLE = True
+except ImportError:
+    s3_upload = None
+    S3_AVAILABLE = False
+
+# ======= STORAGE CONFIGURATION =======
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'auto').lower()
+UPLOAD_DIR = os.getenv('UPLOAD_DIR', 'uploads')
+S3_KEY_PREFIX = 'items/'
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Directory levels (two hex characters each) of the local sharded layout
+LOCAL_SHARD_DEPTH = 2
+HEX_DIGITS = frozenset('0123456789abcdef')
+# In-progress local writes are hidden temp files next to their target
+TEMP_SUFFIX = '.tmp'
+
+# Content types that mimetypes does not know on every platform
+EXTRA_CONTENT_TYPES = {
+    '.webp': 'image/webp',
+    '.heic': 'image/heic',
+}
+
+
+def content_type_for(name):
+    """Content type to store a file with, based on its extension"""
+    extension = os.path.splitext(name)[1].lower()
+    guessed_type, _ = mimetypes.guess_type(name)
+    return guessed_type or EXTRA_CONTENT_TYPES.get(extension, 'application/octet-stream')
+
+
+class StoredObject:
+    """Metadata returned by Storage.stat()"""
+    __slots__ = ('name', 'size', 'content_type')
+
+    def __init__(self, name, size, content_type):
+        self.name = name
+        self.size = size
+        self.content_type = content_type
+
+
+class Storage:
+    """
+    Interface implemented by every backend. data passed to put() may be bytes or
+    a binary file object, which is read from its current position.
+    """
+    name = 'base'
+
+    def put(self, name, data, content_type=None):
+        """Store data under name and return its public URL"""
+        raise NotImplementedError
+
+    def get(self, name):
+        """Return the stored bytes; raises FileNotFoundError if missing"""
+        raise NotImplementedError
+
+    def delete(self, name):
+        """Delete a stored file (missing files are ignored)"""
+        raise NotImplementedError
+
+    def url(self, name):
+        """Public URL of a stored file"""
+        raise NotImplementedError
+
+    def stat(self, name):
+        """StoredObject for name, or None if it does not exist"""
+        raise NotImplementedError
+
+    def name_from_url(self, url):
+        """Name of the file a URL produced by url() points to, or None for other URLs"""
+        raise NotImplementedError
+
+    def open(self, name):
+        """Readable binary file object with the stored content"""
+        return io.BytesIO(self.get(name))
+
+
+class S3Storage(Storage):
+    name = 's3'
+
+    def __init__(self, prefix=S3_KEY_PREFIX):
+        self.prefix = prefix
+
+    def put(self, name, data, content_type=None):
+        return s3_upload.upload_file_to_s3_key(data, self.prefix + name, content_type or content_type_for(name))
+
+    def get(self, name):
+        try:
+            response = s3_upload.get_s3_client().get_object(Bucket=s3_upload.AWS_S3_BUCKET_NAME, Key=self.prefix + name)
+        except s3_upload.ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                raise FileNotFoundError(name) from e
+            raise
+        return response['Body'].read()
+
+    def delete(self, name):
+        s3_upload.delete_file_from_s3(self.prefix + name)
+
+    def url(self, name):
+        return s3_upload.s3_url(self.prefix + name)
+
+    def stat(self, name):
+        try:
+            head = s3_upload.get_s3_client().head_object(Bucket=s3_upload.AWS_S3_BUCKET_NAME, Key=self.prefix + name)
+        except s3_upload.ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        return StoredObject(name, head['ContentLength'], head.get('ContentType'))
+
+    def name_from_url(self, url):
+        key = s3_upload.s3_key_from_url(url)
+        if key and key.startswith(self.prefix):
+            return key[len(self.prefix):]
+        return None
+
+
+class LocalStorage(Storage):
+    """
+    Files under root in a sharded layout: two directory levels named after the
+    first four hex characters of the file name (uploads/ab/cd/abcd...jpg), so no
+    directory grows past a few thousand entries. Writes go to a temp file in the
+    target directory and are renamed into place, so readers never see partial
+    files. URLs stay flat (/uploads/<name>); files from the old flat layout are
+    still found until migrate_flat_files() moves them.
+    """
+    name = 'local'
+
+    def __init__(self, root=UPLOAD_DIR, url_prefix='/uploads/'):
+        self.root = root
+        self.url_prefix = url_prefix
+
+    def _check_name(self, name):
+        if not name or '/' in name or '\\' in name or name.startswith('.'):
+            raise ValueError(f"Invalid storage name: {name}")
+
+    def shard_path(self, name):
+        """Path a file is written to in the sharded layout"""
+        self._check_name(name)
+        prefix = name[:2 * LOCAL_SHARD_DEPTH].lower()
+        if len(prefix) < 2 * LOCAL_SHARD_DEPTH or not set(prefix) <= HEX_DIGITS:
+            # Names that do not start with a UUID or content hash are sharded by their digest
+            prefix = hashlib.md5(name.encode('utf-8')).hexdigest()
+        shards = [prefix[i:i + 2] for i in range(0, 2 * LOCAL_SHARD_DEPTH, 2)]
+        return os.path.join(self.root, *shards, name)
+
+    def candidate_paths(self, relative_path):
+        """
+        Paths that may hold the file for a /uploads/ URL path: the sharded location,
+        then the legacy flat one. Temp and hidden files are never returned.
+        """
+        segments = relative_path.replace('\\', '/').split('/')
+        if any(not segment or segment.startswith('.') for segment in segments):
+            return []
+        if len(segments) == 1:
+            return [self.shard_path(relative_path), os.path.join(self.root, relative_path)]
+        # Explicit subdirectory paths (files stored before uploads were flat names)
+        path = safe_join(self.root, relative_path)
+        return [path] if path else []
+
+    def _resolve(self, name):
+        """Existing path of a stored file, or None"""
+        for path in self.candidate_paths(name):
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def put(self, name, data, content_type=None):
+        path = self.shard_path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(prefix='.', suffix=TEMP_SUFFIX, dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if isinstance(data, (bytes, bytearray, memoryview)):
+                    f.write(data)
+                else:
+                    shutil.copyfileobj(data, f, COPY_BUFFER_SIZE)
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        return self.url(name)
+
+    def get(self, name):
+        with self.open(name) as f:
+            return f.read()
+
+    def open(self, name):
+        path = self._resolve(name)
+        if path is None:
+            raise FileNotFoundError(name)
+        return open(path, 'rb')
+
+    def delete(self, name):
+        for path in self.candidate_paths(name):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def url(self, name):
+        return self.url_prefix + name
+
+    def stat(self, name):
+        path = self._resolve(name)
+        if path is None:
+            return None
+        return StoredObject(name, os.path.getsize(path), content_type_for(name))
+
+    def name_from_url(self, url):
+        if url and url.startswith(self.url_prefix):
+            return url[len(self.url_prefix):]
+        return None
+
+    def migrate_flat_files(self, dry_run=False, temp_max_age=3600):
+        """
+        Move files from the flat layout into their shards (URLs do not change) and
+        remove temp files abandoned by interrupted writes. Returns (moved, removed).
+        """
+        moved = removed = 0
+        if not os.path.isdir(self.root):
+            return moved, removed
+
+        with os.scandir(self.root) as entries:
+            flat_files = [entry for entry in entries
+                          if entry.is_file(follow_symlinks=False) and not entry.name.startswith('.')]
+
+        for entry in flat_files:
+            target = self.shard_path(entry.name)
+            if not dry_run:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(entry.path, target)
+            moved += 1
+            if moved % 1000 == 0:
+                print(f"INFO - Moved {moved} files...")
+
+        cutoff = time.time() - temp_max_age
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if not (filename.startswith('.') and filename.endswith(TEMP_SUFFIX)):
+                    continue
+                path = os.path.join(directory, filename)
+                if os.path.getmtime(path) < cutoff:
+                    if not dry_run:
+                        os.remove(path)
+                    removed += 1
+
+        return moved, removed
+
+
+class MemoryStorage(Storage):
+    """Keeps files in a dict - nothing leaves the process, so no credentials or disk are needed"""
+    name = 'memory'
+
+    def __init__(self, url_prefix='memory://'):
+        self.url_prefix = url_prefix
+        self._objects = {}
+        self._lock = threading.Lock()
+
+    def put(self, name, data, content_type=None):
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            data = data.read()
+        with self._lock:
+            self._objects[name] = (bytes(data), content_type or content_type_for(name))
+        return self.url(name)
+
+    def get(self, name):
+        with self._lock:
+            stored = self._objects.get(name)
+        if stored is None:
+            raise FileNotFoundError(name)
+        return stored[0]
+
+    def delete(self, name):
+        with self._lock:
+            self._objects.pop(name, None)
+
+    def url(self, name):
+        return self.url_prefix + name
+
+    def stat(self, name):
+        with self._lock:
+            stored = self._objects.get(name)
+        if stored is None:
+            return None
+        return StoredObject(name, len(stored[0]), stored[1])
+
+    def name_from_url(self, url):
+        if url and url.startswith(self.url_prefix):
+            return url[len(self.url_prefix):]
+        return None
+
+
+def s3_configured():
+    """True when S3 credentials are set and the (lazily created) client is usable"""
+    return S3_AVAILABLE and s3_upload.S3_CONFIGURED and s3_upload.get_s3_client() is not None
+
+
+local_storage = LocalStorage()
+memory_storage = MemoryStorage()
+s3_storage = S3Storage() if S3_AVAILABLE else None
+
+
+def get_storage():
+    """The primary backend new files are written to, per STORAGE_BACKEND"""
+    if STORAGE_BACKEND == 'memory':
+        return memory_storage
+    if STORAGE_BACKEND == 'local':
+        return local_storage
+    if STORAGE_BACKEND == 's3' or (STORAGE_BACKEND == 'auto' and s3_configured()):
+        if not s3_configured():
+            print("WARNING - STORAGE_BACKEND=s3 but S3 is not configured, using local storage")
+            return local_storage
+        return s3_storage
+    return local_storage
+
+
+def storage_for_url(url):
+    """(backend, name) for a URL produced by any backend, or (None, None) if none owns it"""
+    for backend in (s3_storage, local_storage, memory_storage):
+        if backend is None:
+            continue
+        name = backend.name_from_url(url)
+        if name:
+            return backend, name
+    return None, None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Storage maintenance")
+    parser.add_argument('--migrate-local', action='store_true',
+                        help='move flat UPLOAD_DIR files into the sharded layout')
+    parser.add_argument('--dry-run', action='store_true', help='only report what would change')
+    args = parser.parse_args()
+
+    if args.migrate_local:
+        moved, removed = local_storage.migrate_flat_files(dry_run=args.dry_run)
+        prefix = "DRY RUN - Would have" if args.dry_run else "SUCCESS -"
+        print(f"{prefix} moved {moved} files into shards and removed {removed} stale temp files in {UPLOAD_DIR}")
+        sys.exit(0)
+    parser.print_help()
@@ -0,0 +1,92 @@
+"""
+Streaming response helpers - incremental JSON / NDJSON encoding of row
+iterators written through a bounded buffer, with optional chunked
+transfer encoding and on-the-fly compression
+"""
+import os
+from dotenv import load_dotenv
+from json_serializer import dumps, row_encoder
+
+# Load environment variables
+load_dotenv()
+
+# Bytes buffered before a chunk is written to the socket
+STREAM_BUFFER_SIZE = int(os.getenv('STREAM_BUFFER_SIZE', 65536))
+
+
+class ResponseStream:
+    """
+    File-like writer that buffers up to buffer_size bytes, optionally compresses,
+    and writes HTTP/1.1 chunks (or raw bytes for HTTP/1.0 close-delimited bodies)
+    """
+
+    def __init__(self, wfile, chunked=True, compressor=None, buffer_size=STREAM_BUFFER_SIZE):
+        self.wfile = wfile
+        self.chunked = chunked
+        self.compressor = compressor
+        self.buffer_size = buffer_size
+        self._buffer = []
+        self._buffered = 0
+        self.bytes_written = 0
+
+    def write(self, data):
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        data = b''.join(self._buffer)
+        self._buffer = []
+        self._buffered = 0
+        if self.compressor is not None:
+            data = self.compressor.compress(data)
+        self._send(data)
+
+    def close(self):
+        """Flush what is left, finish compression and send the terminating chunk"""
+        self.flush()
+        if self.compressor is not None:
+            self._send(self.compressor.flush())
+        if self.chunked:
+            self.wfile.write(b'0\r\n\r\n')
+
+    def _send(self, data):
+        if not data:
+            return
+        if self.chunked:
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        else:
+            self.wfile.write(data)
+        self.bytes_written += len(data)
+
+
+def iter_ndjson(columns, rows):
+    """Yield one JSON object per line for each row"""
+    encode = row_encoder(columns)
+    for row in rows:
+        yield (encode(row) + '\n').encode('utf-8')
+
+
+def iter_json_listing(columns, rows, key='items', trailer=None):
+    """
+    Yield a JSON object {key: [rows...], **trailer(count)} incrementally.
+    The trailer is built after the rows, so totals can be reported without
+    materializing the list first.
+    """
+    yield b'{' + dumps(key) + b':['
+    encode = row_encoder(columns)
+    count = 0
+    for row in rows:
+        if count:
+            yield (',' + encode(row)).encode('utf-8')
+        else:
+            yield encode(row).encode('utf-8')
+        count += 1
+    yield b']'
+
+    for name, value in (trailer(count) if trailer else {}).items():
+        yield b',' + dumps(name) + b':' + dumps(value)
+    yield b'}'
@@ -0,0 +1,223 @@
+"""
+Typeahead suggestions for item titles and locations
+
+Per field, every distinct value (case and whitespace folded) is counted over
+the items the public listing shows (not 'returned' ones) and kept in a sorted array of keys. A prefix lookup bisects to the
+block of keys starting with the prefix and returns its most frequent values;
+results for short prefixes - whose blocks are large - are cached until a
+value under that prefix changes. Counts are loaded once from the database
+and kept current from item_events.
+"""
+import os
+import re
+import time
+import heapq
+import bisect
+import threading
+from database_config import DatabaseManager
+import item_events
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# ======= SUGGEST CONFIGURATION =======
+SUGGEST_LIMIT = int(os.getenv('SUGGEST_LIMIT', 8))
+SUGGEST_MAX_LIMIT = 20
+# Results are cached for prefixes up to this length (longer prefixes select few keys)
+SUGGEST_CACHED_PREFIX_LENGTH = int(os.getenv('SUGGEST_CACHED_PREFIX_LENGTH', 4))
+# Longer values are not useful as suggestions
+SUGGEST_MAX_VALUE_LENGTH = 100
+
+# Items with this status are hidden from the public listing, so their values are not suggested
+HIDDEN_STATUS = 'returned'
+
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def _title(item):
+    return item.get('title')
+
+
+def _location(item):
+    # Older rows keep the location in `location`
+    return item.get('location_found') or item.get('location')
+
+
+# field name -> how its value is read from an item row
+FIELDS = {
+    'title': _title,
+    'location': _location,
+}
+
+
+def normalize(value):
+    """Display form of a value (trimmed, single spaces) or None when it is not suggestible"""
+    if not value:
+        return None
+    value = WHITESPACE_PATTERN.sub(' ', str(value)).strip()
+    if not value or len(value) > SUGGEST_MAX_VALUE_LENGTH:
+        return None
+    return value
+
+
+class PrefixIndex:
+    """Value counts for one field with frequency-ranked prefix lookups; not locked - see SuggestIndex"""
+
+    def __init__(self):
+        # lower-cased value -> [count, display form]
+        self._counts = {}
+        self._keys = []
+        # prefix -> [(-count, key)] for prefixes up to SUGGEST_CACHED_PREFIX_LENGTH
+        self._cache = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, value, delta=1):
+        key = value.lower()
+        entry = self._counts.get(key)
+        if entry is None:
+            if delta <= 0:
+                return
+            # The first spelling seen is the one suggested
+            entry = self._counts[key] = [0, value]
+            bisect.insort(self._keys, key)
+        entry[0] += delta
+        if entry[0] <= 0:
+            del self._counts[key]
+            del self._keys[bisect.bisect_left(self._keys, key)]
+        for length in range(min(len(key), SUGGEST_CACHED_PREFIX_LENGTH) + 1):
+            self._cache.pop(key[:length], None)
+
+    def _ranked(self, prefix, limit):
+        """(count, key) of the most frequent keys starting with prefix, most frequent first"""
+        start = bisect.bisect_left(self._keys, prefix)
+        # '\U0010ffff' sorts after every character a key can continue with
+        end = bisect.bisect_left(self._keys, prefix + '\U0010ffff', start)
+        counts = self._counts
+        return heapq.nsmallest(
+            limit,
+            ((-counts[key][0], key) for key in self._keys[start:end])
+        )
+
+    def lookup(self, prefix, limit=SUGGEST_LIMIT):
+        """[{'value', 'count'}] for the most frequent values starting with prefix"""
+        prefix = WHITESPACE_PATTERN.sub(' ', prefix).lstrip().lower()
+        if len(prefix) <= SUGGEST_CACHED_PREFIX_LENGTH:
+            ranked = self._cache.get(prefix)
+            if ranked is None:
+                ranked = self._cache[prefix] = self._ranked(prefix, SUGGEST_MAX_LIMIT)
+        else:
+            ranked = self._ranked(prefix, limit)
+        return [{'value': self._counts[key][1], 'count': -negative_count} for negative_count, key in ranked[:limit]]
+
+
+class SuggestIndex:
+    """PrefixIndex per field, maintained from item rows; thread-safe"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._fields = {field: PrefixIndex() for field in FIELDS}
+        # item id -> {field: value} as currently counted, so updates and deletes can be undone
+        self._items = {}
+        self.loaded = False
+        self.load_seconds = None
+
+    def add(self, item):
+        """Count (or re-count) an item row; hidden items are not counted"""
+        item_id = str(item['id'])
+        if item.get('status') == HIDDEN_STATUS:
+            self.remove(item_id)
+            return
+        values = {}
+        for field, read in FIELDS.items():
+            value = normalize(read(item))
+            if value is not None:
+                values[field] = value
+        with self._lock:
+            self._remove(item_id)
+            for field, value in values.items():
+                self._fields[field].add(value)
+            self._items[item_id] = values
+
+    def remove(self, item_id):
+        with self._lock:
+            self._remove(str(item_id))
+
+    def _remove(self, item_id):
+        values = self._items.pop(item_id, None)
+        if values is None:
+            return
+        for field, value in values.items():
+            self._fields[field].add(value, -1)
+
+    def on_item_event(self, event_type, item_id, item):
+        with self._lock:
+            if not self.loaded:
+                # The initial load reads the committed row from the database
+                return
+            if event_type == item_events.ITEM_DELETED or item is None:
+                self._remove(item_id)
+            else:
+                self.add(item)
+
+    def load(self, db=None):
+        """(Re)build the counts from the database; holds the lock so events wait for it"""
+        own_connection = db is None
+        if own_connection:
+            db = DatabaseManager()
+            if not db.connect():
+                return False
+        try:
+            with self._lock:
+                started = time.perf_counter()
+                rows = db.execute_query(
+                    "SELECT id, title, location_found, location, status FROM items WHERE status != %s",
+                    (HIDDEN_STATUS,)
+                )
+                self._fields = {field: PrefixIndex() for field in FIELDS}
+                self._items = {}
+                for row in rows:
+                    self.add(row)
+                self.loaded = True
+                self.load_seconds = time.perf_counter() - started
+            print(f"SUCCESS - Suggestions loaded: "
+                  + ', '.join(f"{len(index)} {field}s" for field, index in self._fields.items())
+                  + f" in {self.load_seconds * 1000:.1f} ms")
+            return True
+        except Exception as e:
+            print(f"ERROR - Could not load suggestions: {e}")
+            return False
+        finally:
+            if own_connection:
+                db.disconnect()
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            with self._lock:
+                # Another thread may have finished loading while this one waited
+                if not self.loaded:
+                    self.load()
+        return self.loaded
+
+    def start_loading(self):
+        """Load the counts on a background thread"""
+        threading.Thread(target=self.ensure_loaded, name='suggest-load', daemon=True).start()
+
+    def suggest(self, field, prefix, limit=SUGGEST_LIMIT):
+        """Suggestions for a field in FIELDS"""
+        with self._lock:
+            return self._fields[field].lookup(prefix, limit)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'loaded': self.loaded,
+                'values': {field: len(index) for field, index in self._fields.items()},
+                'load_ms': round(self.load_seconds * 1000, 1) if self.load_seconds is not None else None,
+            }
+
+
+suggest_index = SuggestIndex()
+item_events.subscribe(suggest_index.on_item_event)
@@ -0,0 +1,10 @@
+"""
+Shared test setup: the backend modules are flat files imported by name, as
+postgresql_server.py does, so the backend directory goes on sys.path.
+
+    cd backend && python -m pytest -q tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
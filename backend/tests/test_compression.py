@@ -0,0 +1,79 @@
+"""Accept-Encoding negotiation and response compression"""
+import gzip
+import zlib
+
+import pytest
+
+import compression
+from compression import (parse_accept_encoding, choose_encoding, maybe_compress, stream_compressor,
+                         precompressed_candidates, precompress_directory)
+
+
+@pytest.fixture
+def no_brotli(monkeypatch):
+    monkeypatch.setattr(compression, 'BROTLI_AVAILABLE', False)
+
+
+def test_parse_accept_encoding_keeps_refusals():
+    assert parse_accept_encoding('gzip, br;q=0.5, deflate;q=0, *;q=bad') == {
+        'gzip': 1.0, 'br': 0.5, 'deflate': 0.0, '*': 0.0}
+    assert parse_accept_encoding(None) == {}
+
+
+def test_choose_encoding(no_brotli):
+    assert choose_encoding('gzip, deflate') == 'gzip'
+    assert choose_encoding('identity') is None
+    assert choose_encoding('') is None
+    assert choose_encoding('*') == 'gzip'
+
+
+def test_wildcard_does_not_override_an_explicit_refusal(no_brotli):
+    assert choose_encoding('gzip;q=0, *') is None
+    assert choose_encoding('*, gzip;q=0') is None
+    assert choose_encoding('gzip;q=0.1, *;q=0') == 'gzip'
+
+
+def test_brotli_preferred_when_available(monkeypatch):
+    monkeypatch.setattr(compression, 'BROTLI_AVAILABLE', True)
+    assert choose_encoding('gzip, br') == 'br'
+    assert choose_encoding('br;q=0, *') == 'gzip'
+
+
+def test_maybe_compress_skips_small_and_binary_bodies(no_brotli):
+    small = b'{"a": 1}'
+    assert maybe_compress(small, 'application/json', 'gzip') == (small, None)
+    image = b'\xff' * 5000
+    assert maybe_compress(image, 'image/jpeg', 'gzip') == (image, None)
+
+
+def test_maybe_compress_gzip_round_trip(no_brotli):
+    body = b'{"items": [' + b'{"title": "Black backpack"},' * 200 + b'{}]}'
+    compressed, encoding = maybe_compress(body, 'application/json', 'gzip')
+    assert encoding == 'gzip'
+    assert len(compressed) < len(body)
+    assert gzip.decompress(compressed) == body
+
+
+def test_stream_compressor_produces_gzip(no_brotli):
+    compressor, encoding = stream_compressor('application/x-ndjson', 'gzip')
+    assert encoding == 'gzip'
+    data = compressor.compress(b'{"id": 1}\n' * 100) + compressor.flush()
+    assert zlib.decompress(data, 31) == b'{"id": 1}\n' * 100
+    assert stream_compressor('image/png', 'gzip') == (None, None)
+
+
+def test_precompressed_candidates_respect_refusals():
+    assert list(precompressed_candidates('br, gzip')) == [('br', '.br'), ('gzip', '.gz')]
+    assert list(precompressed_candidates('gzip;q=0, *')) == [('br', '.br')]
+    assert list(precompressed_candidates('identity')) == []
+
+
+def test_precompress_directory_writes_smaller_variants_only(tmp_path, no_brotli):
+    (tmp_path / 'app.js').write_text('console.log("lost and found");\n' * 200)
+    (tmp_path / 'tiny.css').write_text('a{}')
+    (tmp_path / 'app.js.map').write_text('{}' * 2000)
+
+    assert precompress_directory(str(tmp_path)) == 1
+    assert gzip.decompress((tmp_path / 'app.js.gz').read_bytes()) == (tmp_path / 'app.js').read_bytes()
+    assert not (tmp_path / 'tiny.css.gz').exists()
+    assert not (tmp_path / 'app.js.map.gz').exists()
@@ -0,0 +1,124 @@
+"""Tests for faceted counts: GROUPING() bitmasks, the TTL cache and its generation counter"""
+import pytest
+
+import facets
+from facets import FacetCache, facet_query, rows_to_facets
+from database_config import DatabaseManager
+
+
+def row(grouping, count, category=None, status=None, location=None):
+    return {'category': category, 'status': status, 'location': location, 'count': count, 'grouping': grouping}
+
+
+def test_grouping_bitmasks_map_to_facets():
+    rows = [
+        row(0b111, 9),
+        row(0b011, 5, category='electronics'),
+        row(0b011, 4, category='bags'),
+        row(0b101, 6, status='lost'),
+        row(0b101, 3, status='found'),
+        row(0b110, 2, location='Library'),
+        row(0b110, 2, location='Gym'),
+        # Items without a location form a NULL group, which is not a facet value
+        row(0b110, 5, location=None),
+        row(0b110, 1, location=''),
+    ]
+    assert rows_to_facets(rows) == {
+        'total': 9,
+        'facets': {
+            'category': [{'value': 'electronics', 'count': 5}, {'value': 'bags', 'count': 4}],
+            'status': [{'value': 'lost', 'count': 6}, {'value': 'found', 'count': 3}],
+            'location': [{'value': 'Gym', 'count': 2}, {'value': 'Library', 'count': 2}],
+        },
+    }
+
+
+def test_unknown_groupings_are_ignored_and_locations_capped(monkeypatch):
+    monkeypatch.setattr(facets, 'LOCATION_FACET_LIMIT', 2)
+    rows = [row(0b001, 7, category='x', status='y')] + [row(0b110, n, location=f'L{n}') for n in range(1, 5)]
+    result = rows_to_facets(rows)
+    assert result['total'] == 0 and result['facets']['category'] == []
+    assert [entry['value'] for entry in result['facets']['location']] == ['L4', 'L3']
+
+
+class Clock:
+    now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(facets.time, 'monotonic', clock)
+    return clock
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = FacetCache(ttl=30)
+    cache.put('key', b'body', cache.generation)
+    clock.now += 29
+    assert cache.get('key') == b'body'
+    clock.now += 1
+    assert cache.get('key') is None
+    assert (cache.stats()['hits'], cache.stats()['misses']) == (1, 1)
+
+
+def test_load_that_raced_an_invalidation_is_not_stored(clock):
+    cache = FacetCache()
+    generation = cache.generation
+    # An item changes while the facet query runs
+    cache.on_item_event('updated', 'item-1', {})
+    cache.put('key', b'stale counts', generation)
+    assert cache.get('key') is None
+    cache.put('key', b'fresh counts', cache.generation)
+    assert cache.get('key') == b'fresh counts'
+
+
+def test_invalidate_drops_cached_entries(clock):
+    cache = FacetCache()
+    cache.put('key', b'body', cache.generation)
+    cache.invalidate()
+    assert cache.get('key') is None and cache.stats()['entries'] == 0
+
+
+def test_oldest_entry_is_evicted_when_full(clock):
+    cache = FacetCache(max_entries=2)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, key.encode(), cache.generation)
+    assert cache.get('a') is None and cache.get('b') == b'b' and cache.get('c') == b'c'
+
+
+def test_item_events_invalidate_the_shared_cache():
+    import item_events
+    generation = facets.facet_cache.generation
+    item_events.publish(item_events.ITEM_DELETED, 'item-1')
+    assert facets.facet_cache.generation == generation + 1
+
+
+def test_facet_query_groupings_in_postgresql():
+    db = DatabaseManager()
+    if not db.connect():
+        pytest.skip('PostgreSQL is not reachable')
+    try:
+        # A temporary table shadows the real items table for this session only
+        db.execute_query("""
+            CREATE TEMP TABLE items (category TEXT, status TEXT, location_found TEXT, location TEXT)
+        """)
+        db.execute_query("""
+            INSERT INTO items VALUES ('bags', 'lost', 'Library', NULL), ('bags', 'found', '', 'Gym'),
+                                     ('keys', 'lost', NULL, NULL)
+        """)
+        result = rows_to_facets(db.execute_query(facet_query(''), None))
+        db.execute_query("DROP TABLE pg_temp.items")
+    finally:
+        db.disconnect()
+    assert result == {
+        'total': 3,
+        'facets': {
+            'category': [{'value': 'bags', 'count': 2}, {'value': 'keys', 'count': 1}],
+            'status': [{'value': 'lost', 'count': 2}, {'value': 'found', 'count': 1}],
+            'location': [{'value': 'Gym', 'count': 1}, {'value': 'Library', 'count': 1}],
+        },
+    }
@@ -0,0 +1,91 @@
+"""Tests for startup health checks: readiness follows the database, hung checks time out"""
+import threading
+import time
+
+import pytest
+
+import health
+import postgresql_server
+from health import HealthState
+
+
+@pytest.fixture
+def checks(monkeypatch):
+    checks = {'database': lambda: ('ok', None), 's3': lambda: ('disabled', 'not configured')}
+    monkeypatch.setattr(health, 'CHECKS', checks)
+    return checks
+
+
+class FakeRequest:
+    def __init__(self):
+        self.responses = []
+
+    def send_cors_response(self, status, body):
+        self.responses.append((status, body))
+
+
+def health_status(monkeypatch, state):
+    monkeypatch.setattr(postgresql_server, 'health', state)
+    request = FakeRequest()
+    postgresql_server.PostgreSQLRequestHandler.handle_health(request)
+    [(status, body)] = request.responses
+    return status, body
+
+
+def test_starting_server_answers_503(monkeypatch, checks):
+    status, body = health_status(monkeypatch, HealthState())
+    assert status == 503 and body['status'] == 'starting'
+
+
+def test_ready_once_the_database_is_ok(monkeypatch, checks):
+    state = HealthState()
+    assert state.run_checks()
+    status, body = health_status(monkeypatch, state)
+    assert status == 200 and body['status'] == 'ready'
+    assert body['checks']['s3'] == {'status': 'disabled', 'detail': 'not configured'}
+
+
+def test_s3_errors_do_not_affect_readiness(monkeypatch, checks):
+    checks['s3'] = lambda: (_ for _ in ()).throw(RuntimeError('bucket gone'))
+    state = HealthState()
+    assert state.run_checks()
+    assert health_status(monkeypatch, state)[0] == 200
+    assert state.checks['s3'] == {'status': 'error', 'detail': 'bucket gone'}
+
+
+def test_database_error_is_unavailable(monkeypatch, checks):
+    checks['database'] = lambda: ('error', 'connection failed')
+    state = HealthState()
+    assert not state.run_checks()
+    status, body = health_status(monkeypatch, state)
+    assert status == 503 and body['status'] == 'unavailable'
+
+
+def test_hung_check_times_out_instead_of_blocking(checks):
+    release = threading.Event()
+    checks['database'] = lambda: (release.wait(5), ('ok', None))[1]
+    state = HealthState(timeout=0.1)
+    started = time.monotonic()
+    assert not state.run_checks()
+    assert time.monotonic() - started < 1
+    assert state.checks['database']['status'] == 'timeout'
+    release.set()
+
+
+def test_snapshot_never_waits_for_checks(monkeypatch, checks):
+    release = threading.Event()
+    checks['database'] = lambda: (release.wait(5), ('ok', None))[1]
+    monkeypatch.setattr(health, 'HEALTH_RECHECK_INTERVAL', 0)
+    state = HealthState(timeout=5)
+    state.checked_at = time.time() - 1
+    started = time.monotonic()
+    assert state.snapshot()['ready'] is False
+    assert time.monotonic() - started < 1
+    # The stale state started a background re-check, which finishes on its own
+    assert state._running
+    release.set()
+    for _ in range(500):
+        if state.ready:
+            break
+        time.sleep(0.01)
+    assert state.ready
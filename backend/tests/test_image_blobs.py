@@ -0,0 +1,130 @@
+"""Tests for image blob reference counting"""
+import threading
+import uuid
+
+import pytest
+
+import image_blobs
+from database_config import DatabaseManager
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.result = None
+
+    def execute(self, query, params):
+        query = ' '.join(query.split())
+        self.db.statements.append(query)
+        if query.startswith('SELECT'):
+            self.result = dict(self.db.blob) if self.db.blob else None
+        elif query.startswith('UPDATE'):
+            self.db.blob['ref_count'] -= 1
+        elif query.startswith('DELETE'):
+            self.db.blob = None
+
+    def fetchone(self):
+        return self.result
+
+
+class FakeDatabase:
+    """One blob row; records statements and whether the transaction is still open"""
+
+    def __init__(self, ref_count):
+        self.blob = {'ref_count': ref_count, 'image_url': '/uploads/ab.jpg',
+                     'image_variants': {'small': '/uploads/ab_small.webp'}}
+        self.statements = []
+        self.committed = False
+
+    def transaction(self):
+        db = self
+
+        class Transaction:
+            def __enter__(self):
+                return FakeCursor(db)
+
+            def __exit__(self, *exc_info):
+                db.committed = exc_info[0] is None
+        return Transaction()
+
+
+@pytest.fixture
+def deleted(monkeypatch):
+    deleted = []
+    monkeypatch.setattr(image_blobs, 'delete_stored_files', lambda url, variants: deleted.append(url))
+    return deleted
+
+
+def test_release_of_shared_blob_only_decrements(deleted):
+    db = FakeDatabase(ref_count=2)
+    assert image_blobs.release_blob(db, 'ab' * 32) is False
+    assert db.blob['ref_count'] == 1 and deleted == [] and db.committed
+    assert db.statements[0].endswith('FOR UPDATE')
+
+
+def test_release_of_last_reference_deletes_files_before_commit(deleted, monkeypatch):
+    db = FakeDatabase(ref_count=1)
+    seen = []
+    monkeypatch.setattr(image_blobs, 'delete_stored_files',
+                        lambda url, variants: seen.append((url, db.committed)))
+    assert image_blobs.release_blob(db, 'ab' * 32) is True
+    # The row lock is still held while the files go
+    assert db.blob is None and seen == [('/uploads/ab.jpg', False)] and db.committed
+
+
+def test_release_of_unknown_blob(deleted):
+    db = FakeDatabase(ref_count=1)
+    db.blob = None
+    assert image_blobs.release_blob(db, 'ab' * 32) is False and deleted == []
+
+
+# ----- against PostgreSQL, when it is reachable -----
+
+@pytest.fixture
+def pg():
+    connections = []
+
+    def connect():
+        db = DatabaseManager()
+        if not db.connect():
+            pytest.skip('PostgreSQL is not reachable')
+        connections.append(db)
+        return db
+    yield connect
+    for db in connections:
+        db.disconnect()
+
+
+def test_release_and_acquire_race(pg, deleted):
+    """Either the acquire wins and the blob survives, or it finds nothing after the files are gone"""
+    setup = pg()
+    try:
+        setup.execute_query("SELECT 1 FROM image_blobs LIMIT 1")
+    except Exception:
+        pytest.skip('image_blobs table does not exist')
+
+    for _ in range(20):
+        content_hash = uuid.uuid4().hex * 2
+        setup.execute_query(
+            "INSERT INTO image_blobs (content_hash, image_url, ref_count) VALUES (%s, %s, 1)",
+            (content_hash, f'/uploads/{content_hash}.jpg')
+        )
+        deleted.clear()
+        releaser, acquirer = pg(), pg()
+        results = {}
+        threads = [
+            threading.Thread(target=lambda: results.update(released=image_blobs.release_blob(releaser, content_hash))),
+            threading.Thread(target=lambda: results.update(acquired=image_blobs.acquire_blob(acquirer, content_hash))),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        rows = setup.execute_query("SELECT ref_count FROM image_blobs WHERE content_hash = %s", (content_hash,))
+        if results['acquired']:
+            # The acquire took its reference first (2), the release dropped it back to 1
+            assert not results['released'] and deleted == [] and rows[0]['ref_count'] == 1
+        else:
+            assert results['released'] and deleted == [f'/uploads/{content_hash}.jpg'] and rows == []
+        setup.execute_query("DELETE FROM image_blobs WHERE content_hash = %s", (content_hash,))
@@ -0,0 +1,152 @@
+"""Tests for ingest-time image normalization and its fallback to storing originals unchanged"""
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from PIL import Image, ImageCms
+
+import image_ingest
+from image_ingest import normalize_image, normalize_upload
+from multipart_parser import UploadedFile
+
+EXIF_ORIENTATION = 0x0112
+EXIF_MAKE = 0x010F
+
+
+def encode(image, image_format, **params):
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **params)
+    return buffer.getvalue()
+
+
+def decode(data):
+    return Image.open(io.BytesIO(data))
+
+
+def test_exif_orientation_is_applied_and_metadata_dropped():
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION] = 6  # rotate 90 degrees clockwise to display
+    exif[EXIF_MAKE] = 'Camera Co'
+    data = encode(Image.new('RGB', (200, 100), 'red'), 'JPEG', exif=exif.tobytes())
+    normalized, extension, content_type = normalize_image(data)
+    assert (extension, content_type) == ('jpg', 'image/jpeg')
+    output = decode(normalized)
+    assert output.size == (100, 200)
+    assert EXIF_MAKE not in output.getexif() and EXIF_ORIENTATION not in output.getexif()
+
+
+@pytest.mark.parametrize('image_format', ['PNG', 'JPEG'])
+def test_large_images_are_downscaled_to_the_max_edge(image_format):
+    data = encode(Image.new('RGB', (3000, 1500), 'blue'), image_format)
+    normalized, _, _ = normalize_image(data, max_edge=1000)
+    assert decode(normalized).size == (1000, 500)
+
+
+def test_small_images_keep_their_size():
+    normalized, _, _ = normalize_image(encode(Image.new('RGB', (640, 480)), 'PNG'), max_edge=1000)
+    assert decode(normalized).size == (640, 480)
+
+
+def test_opaque_images_become_jpeg():
+    normalized, extension, _ = normalize_image(encode(Image.new('L', (50, 50), 128), 'PNG'))
+    assert extension == 'jpg' and decode(normalized).mode == 'RGB'
+
+
+@pytest.mark.parametrize('image', [
+    Image.new('RGBA', (60, 40), (10, 20, 30, 100)),
+    Image.new('LA', (60, 40), (10, 100)),
+])
+def test_transparent_images_stay_png(image):
+    normalized, extension, content_type = normalize_image(encode(image, 'PNG'))
+    assert (extension, content_type) == ('png', 'image/png')
+    assert decode(normalized).size == (60, 40)
+
+
+def test_palette_image_with_transparency_stays_png():
+    image = Image.new('P', (30, 30), 0)
+    data = encode(image, 'PNG', transparency=0)
+    assert normalize_image(data)[1] == 'png'
+
+
+@pytest.mark.parametrize('image_format', ['JPEG', 'PNG'])
+def test_icc_profile_is_preserved(image_format):
+    profile = ImageCms.ImageCmsProfile(ImageCms.createProfile('sRGB')).tobytes()
+    mode = 'RGB' if image_format == 'JPEG' else 'RGBA'
+    data = encode(Image.new(mode, (80, 80)), image_format, icc_profile=profile)
+    normalized, _, _ = normalize_image(data)
+    assert decode(normalized).info.get('icc_profile') == profile
+
+
+def test_animations_are_kept_unchanged():
+    frames = [Image.new('RGB', (20, 20), color) for color in ('red', 'blue')]
+    data = encode(frames[0], 'GIF', save_all=True, append_images=frames[1:])
+    assert normalize_image(data) is None
+
+
+def test_undecodable_data_raises():
+    with pytest.raises(Exception):
+        normalize_image(b'not an image')
+
+
+# ----- normalize_upload: the pool and its fallbacks -----
+
+def upload_of(data, filename='IMG_0001.heic'):
+    upload = UploadedFile('image', filename, 'image/png')
+    upload.write(data)
+    upload.file.seek(0)
+    return upload
+
+
+@pytest.fixture
+def thread_pool(monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(image_ingest, '_get_pool', lambda: executor)
+    monkeypatch.setattr(image_ingest, 'INGEST_ENABLED', True)
+    yield executor
+    executor.shutdown(wait=False)
+
+
+def test_upload_is_replaced_with_the_normalized_image(thread_pool):
+    data = encode(Image.new('RGB', (300, 200), 'green'), 'PNG')
+    upload = upload_of(data)
+    original_hash = upload.sha256
+    before, after = normalize_upload(upload)
+    assert before == len(data) and after == upload.size
+    assert (upload.filename, upload.content_type) == ('IMG_0001.jpg', 'image/jpeg')
+    assert decode(upload.file.read()).format == 'JPEG'
+    # Deduplication keys on what was uploaded
+    assert upload.sha256 == original_hash
+
+
+def test_undecodable_upload_is_stored_unchanged(thread_pool):
+    upload = upload_of(b'garbage', 'notes.png')
+    assert normalize_upload(upload) is None
+    assert (upload.filename, upload.file.read()) == ('notes.png', b'garbage')
+
+
+def test_timed_out_normalization_keeps_the_original(thread_pool, monkeypatch):
+    monkeypatch.setattr(image_ingest, 'normalize_image', lambda data: time.sleep(0.5))
+    upload = upload_of(b'original bytes', 'slow.jpg')
+    assert normalize_upload(upload, timeout=0.05) is None
+    assert (upload.filename, upload.file.read()) == ('slow.jpg', b'original bytes')
+
+
+def test_broken_pool_is_reset(monkeypatch):
+    class BrokenPool:
+        def submit(self, *args):
+            raise BrokenProcessPool('worker died')
+
+    resets = []
+    monkeypatch.setattr(image_ingest, 'INGEST_ENABLED', True)
+    monkeypatch.setattr(image_ingest, '_get_pool', lambda: BrokenPool())
+    monkeypatch.setattr(image_ingest, '_reset_pool', lambda: resets.append(True))
+    assert normalize_upload(upload_of(b'x')) is None
+    assert resets == [True]
+
+
+def test_disabled_ingest_does_nothing(monkeypatch):
+    monkeypatch.setattr(image_ingest, 'INGEST_ENABLED', False)
+    monkeypatch.setattr(image_ingest, '_get_pool', lambda: pytest.fail('pool used'))
+    assert normalize_upload(upload_of(b'x')) is None
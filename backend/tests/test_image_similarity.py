@@ -0,0 +1,148 @@
+"""Tests for perceptual hashes: BIGINT conversion, popcount, dHash distances and the index"""
+import io
+import random
+import types
+
+import numpy as np
+import pytest
+from PIL import Image, ImageEnhance
+
+import image_similarity
+import item_events
+from image_similarity import (SimilarityIndex, dhash, to_db, from_db, _popcount, compute_hash,
+                              SIMILAR_IMAGE_MAX_DISTANCE, INITIAL_CAPACITY)
+from database_config import DatabaseManager
+
+INT64_MIN, INT64_MAX = -(1 << 63), (1 << 63) - 1
+BOUNDARY_HASHES = [0, 1, INT64_MAX, 1 << 63, (1 << 63) + 1, (1 << 64) - 1, 0xAAAAAAAAAAAAAAAA]
+
+
+@pytest.mark.parametrize('value', BOUNDARY_HASHES)
+def test_db_round_trip_at_the_sign_bit(value):
+    stored = to_db(value)
+    assert INT64_MIN <= stored <= INT64_MAX
+    assert (stored < 0) == (value >= 1 << 63)
+    assert from_db(stored) == value
+
+
+def test_db_values():
+    assert to_db((1 << 64) - 1) == -1
+    assert to_db(1 << 63) == INT64_MIN
+    assert to_db(INT64_MAX) == INT64_MAX
+
+
+def test_postgresql_bigint_round_trip():
+    db = DatabaseManager()
+    if not db.connect():
+        pytest.skip('PostgreSQL is not reachable')
+    try:
+        # Stored the way items.image_phash is written: a parameter into a BIGINT column
+        db.execute_query("CREATE TEMP TABLE phashes (position INT, image_phash BIGINT)")
+        for position, value in enumerate(BOUNDARY_HASHES):
+            db.execute_query("INSERT INTO phashes VALUES (%s, %s)", (position, to_db(value)))
+        rows = db.execute_query("SELECT image_phash FROM phashes ORDER BY position")
+        db.execute_query("DROP TABLE pg_temp.phashes")
+    finally:
+        db.disconnect()
+    assert [from_db(row['image_phash']) for row in rows] == BOUNDARY_HASHES
+
+
+def reference_popcount(values):
+    return [bin(int(value)).count('1') for value in values]
+
+
+def test_popcount(monkeypatch):
+    values = np.array(BOUNDARY_HASHES, dtype=np.uint64)
+    assert list(_popcount(values)) == reference_popcount(values)
+    # NumPy < 2.0 has no bitwise_count: the byte lookup table is used
+    monkeypatch.setattr(image_similarity, 'np', types.SimpleNamespace(uint8=np.uint8))
+    assert list(_popcount(values)) == reference_popcount(values)
+
+
+def photo(seed, size=(640, 480)):
+    """A photo-like image: smooth blobs of light and dark"""
+    rng = random.Random(seed)
+    small = Image.new('L', (12, 9))
+    small.putdata([rng.randint(0, 255) for _ in range(12 * 9)])
+    return small.resize(size, Image.BICUBIC).convert('RGB')
+
+
+def encoded(image, image_format='JPEG', **params):
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **params)
+    buffer.seek(0)
+    return buffer
+
+
+def distance(first, second):
+    return bin(dhash(first) ^ dhash(second)).count('1')
+
+
+def test_near_identical_photos_are_within_the_threshold():
+    original = photo(1)
+    variants = [
+        encoded(original.resize((320, 240)), quality=60),
+        encoded(ImageEnhance.Brightness(original).enhance(1.1), quality=90),
+        encoded(original.crop((8, 6, 632, 474))),
+        encoded(original, 'PNG'),
+    ]
+    for variant in variants:
+        assert distance(encoded(original), variant) <= SIMILAR_IMAGE_MAX_DISTANCE
+
+
+def test_different_photos_are_beyond_the_threshold():
+    for seed in range(2, 12):
+        assert distance(encoded(photo(1)), encoded(photo(seed))) > SIMILAR_IMAGE_MAX_DISTANCE
+
+
+def test_dhash_restores_the_file_position():
+    data = encoded(photo(1))
+    data.seek(10)
+    dhash(data)
+    assert data.tell() == 10
+
+
+def test_compute_hash_is_signed_and_none_for_non_images():
+    data = encoded(photo(1))
+    assert compute_hash(data) == to_db(dhash(data))
+    assert compute_hash(io.BytesIO(b'not an image')) is None
+
+
+# ----- index -----
+
+def loaded_index(hashes):
+    index = SimilarityIndex()
+    for item_id, value in hashes.items():
+        index.add(item_id, to_db(value))
+    index.loaded = True
+    return index
+
+
+def test_nearest_orders_by_distance_and_excludes_the_item_itself():
+    base = 0xF0F0F0F0F0F0F0F0
+    index = loaded_index({'self': base, 'one-bit': base ^ 1, 'three-bits': base ^ 0b111,
+                          'far': ~base & (2 ** 64 - 1), 'high-bit': base ^ (1 << 63)})
+    assert index.nearest(to_db(base), exclude_id='self') == [('one-bit', 1), ('high-bit', 1), ('three-bits', 3)]
+    assert index.nearest(to_db(base), max_distance=0) == [('self', 0)]
+    assert len(index.nearest(to_db(base), limit=2)) == 2
+
+
+def test_index_grows_and_removal_keeps_positions_consistent():
+    index = loaded_index({f'item-{n}': n for n in range(INITIAL_CAPACITY + 5)})
+    index.remove('item-3')
+    index.remove('missing')
+    assert index.nearest(to_db(3), max_distance=0) == []
+    # The last entry was moved into the hole
+    assert index.nearest(to_db(INITIAL_CAPACITY + 4), max_distance=0) == [(f'item-{INITIAL_CAPACITY + 4}', 0)]
+    assert index.stats()['images'] == INITIAL_CAPACITY + 4
+
+
+def test_events_update_the_index():
+    index = loaded_index({})
+    index.on_item_event(item_events.ITEM_CREATED, 'a', {'status': 'found', 'image_phash': to_db(1 << 63)})
+    assert index.nearest(to_db(1 << 63), max_distance=0) == [('a', 0)]
+    index.on_item_event(item_events.ITEM_UPDATED, 'a', {'status': 'returned', 'image_phash': to_db(1 << 63)})
+    assert index.nearest(to_db(1 << 63)) == []
+    index.on_item_event(item_events.ITEM_UPDATED, 'a', {'status': 'found', 'image_phash': -1})
+    index.on_item_event(item_events.ITEM_DELETED, 'a', None)
+    assert index.stats()['images'] == 0
@@ -0,0 +1,107 @@
+"""Tests for responsive image variants: sizes, aliasing of small originals and the backfill"""
+import io
+
+import pytest
+from PIL import Image
+
+import image_variants
+from image_variants import generate_variants, create_image_variants, backfill_variants
+from storage import memory_storage
+
+
+def image_bytes(size, mode='RGB', image_format='PNG'):
+    buffer = io.BytesIO()
+    Image.new(mode, size, (200, 40, 40, 128)[:len(mode)]).save(buffer, image_format)
+    buffer.seek(0)
+    return buffer
+
+
+def opened(data):
+    return Image.open(io.BytesIO(data))
+
+
+@pytest.fixture(autouse=True)
+def empty_memory_storage():
+    memory_storage._objects.clear()
+    yield
+    memory_storage._objects.clear()
+
+
+def test_large_original_gets_every_size():
+    renditions, aliases, extension, content_type = generate_variants(image_bytes((2000, 1000)))
+    assert aliases == {}
+    assert (extension, content_type) == ('webp', 'image/webp')
+    sizes = {name: opened(data).size for name, data in renditions.items()}
+    assert sizes == {'small': (320, 160), 'medium': (800, 400), 'large': (1600, 800)}
+    assert all(opened(data).format == 'WEBP' for data in renditions.values())
+
+
+def test_small_original_is_never_upscaled_and_larger_names_alias():
+    renditions, aliases, _, _ = generate_variants(image_bytes((500, 300)))
+    assert set(renditions) == {'small', 'medium'}
+    assert aliases == {'large': 'medium'}
+    assert opened(renditions['medium']).size == (500, 300)
+
+
+def test_tiny_original_aliases_everything_to_small():
+    renditions, aliases, _, _ = generate_variants(image_bytes((100, 80)))
+    assert set(renditions) == {'small'} and aliases == {'medium': 'small', 'large': 'small'}
+
+
+def test_jpeg_output_flattens_transparency(monkeypatch):
+    monkeypatch.setattr(image_variants, 'IMAGE_VARIANT_FORMAT', 'jpeg')
+    renditions, _, extension, content_type = generate_variants(image_bytes((400, 400), mode='RGBA'))
+    assert (extension, content_type) == ('jpg', 'image/jpeg')
+    assert opened(renditions['small']).mode == 'RGB'
+
+
+def test_variants_are_stored_next_to_the_original_and_aliases_share_urls():
+    urls = create_image_variants(image_bytes((700, 500)), 'memory://abcd1234.jpg')
+    assert urls == {'small': 'memory://abcd1234_small.webp', 'medium': 'memory://abcd1234_medium.webp',
+                    'large': 'memory://abcd1234_medium.webp'}
+    assert opened(memory_storage.get('abcd1234_small.webp')).size == (320, 229)
+
+
+def test_unknown_image_location_is_an_error():
+    with pytest.raises(ValueError):
+        create_image_variants(image_bytes((400, 400)), 'ftp://elsewhere/x.jpg')
+
+
+class FakeDatabase:
+    items = []
+    updates = []
+
+    def connect(self):
+        return True
+
+    def disconnect(self):
+        pass
+
+    def execute_query(self, query, params=None):
+        if query.lstrip().startswith('UPDATE'):
+            FakeDatabase.updates.append((params[0].adapted, params[1]))
+            return []
+        return FakeDatabase.items[:params[0]] if params else FakeDatabase.items
+
+
+def test_backfill_stores_variants_and_skips_items_that_fail(monkeypatch):
+    memory_storage.put('0f0f.png', image_bytes((1000, 1000)).getvalue())
+    FakeDatabase.items = [{'id': 'item-1', 'image_url': 'memory://0f0f.png'},
+                          {'id': 'item-2', 'image_url': 'memory://missing.png'}]
+    FakeDatabase.updates = []
+    monkeypatch.setattr(image_variants, 'DatabaseManager', FakeDatabase)
+
+    assert backfill_variants()
+    [(variant_urls, item_id)] = FakeDatabase.updates
+    assert item_id == 'item-1'
+    assert variant_urls['large'] == 'memory://0f0f_large.webp'
+    assert opened(memory_storage.get('0f0f_large.webp')).size == (1000, 1000)
+
+
+def test_backfill_limit(monkeypatch):
+    memory_storage.put('0f0f.png', image_bytes((50, 50)).getvalue())
+    FakeDatabase.items = [{'id': f'item-{n}', 'image_url': 'memory://0f0f.png'} for n in range(3)]
+    FakeDatabase.updates = []
+    monkeypatch.setattr(image_variants, 'DatabaseManager', FakeDatabase)
+    assert backfill_variants(limit=2)
+    assert [item_id for _, item_id in FakeDatabase.updates] == ['item-0', 'item-1']
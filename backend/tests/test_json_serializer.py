@@ -0,0 +1,48 @@
+"""Tests for json_serializer: tuple rows are encoded like the equivalent dicts"""
+import json
+import uuid
+from datetime import datetime, date, time, timezone
+from decimal import Decimal
+
+from json_serializer import dumps_rows, row_encoder, stdlib_dumps
+from streaming import iter_json_listing, iter_ndjson
+
+COLUMNS = ['id', 'title', 'views', 'price', 'found', 'image_url', 'created_at', 'found_on', 'opens', 'tags']
+
+ROWS = [
+    (uuid.UUID('7f14bfc2-d4fc-458e-a1bf-1fcfaa0405df'), 'Black wallet "leather", café\n', 12, Decimal('9.50'),
+     True, None, datetime(2025, 3, 1, 12, 30, tzinfo=timezone.utc), date(2025, 3, 1), time(8, 0), ['a', 'b']),
+    (uuid.UUID('00000000-0000-0000-0000-000000000001'), '', 0, 1.5, False, 'https://x/y.jpg',
+     datetime(2024, 1, 2, 3, 4, 5, 6), date(2024, 1, 2), time(23, 59, 59), []),
+]
+
+
+def as_dicts(rows):
+    return [dict(zip(COLUMNS, row)) for row in rows]
+
+
+def test_dumps_rows_matches_dict_serialization_byte_for_byte():
+    assert dumps_rows(COLUMNS, ROWS) == stdlib_dumps(as_dicts(ROWS))
+
+
+def test_dumps_rows_empty():
+    assert dumps_rows(COLUMNS, []) == b'[]'
+
+
+def test_row_encoder_escapes_strings_and_column_names():
+    encode = row_encoder(['a"b', 'line'])
+    assert json.loads(encode(('x', 'tab\there \\ "quoted"'))) == {'a"b': 'x', 'line': 'tab\there \\ "quoted"'}
+
+
+def test_row_encoder_single_column():
+    assert row_encoder(['id'])((5,)) == '{"id":5}'
+
+
+def test_streamed_listing_matches_dumps_rows():
+    body = b''.join(iter_json_listing(COLUMNS, iter(ROWS), trailer=lambda count: {'count': count}))
+    assert json.loads(body) == {'items': json.loads(dumps_rows(COLUMNS, ROWS)), 'count': 2}
+
+
+def test_ndjson_one_object_per_line():
+    lines = b''.join(iter_ndjson(COLUMNS, ROWS)).splitlines()
+    assert [json.loads(line) for line in lines] == json.loads(stdlib_dumps(as_dicts(ROWS)))
@@ -0,0 +1,109 @@
+"""Tests for keep-alive support: bounded request bodies, draining, and reuse of a real connection"""
+import io
+import http.client
+import http.server
+import threading
+
+import pytest
+
+import keepalive
+from keepalive import RequestBody, ConnectionStats
+from postgresql_server import PostgreSQLRequestHandler
+
+
+class BrokenReader(io.BytesIO):
+    def read(self, size=-1):
+        raise ConnectionResetError()
+
+
+def test_reads_stop_at_content_length():
+    raw = io.BytesIO(b'hello worldNEXT REQUEST')
+    body = RequestBody(raw, 11)
+    assert body.read(5) == b'hello'
+    assert body.read() == b' world'
+    assert body.read() == b'' and body.read(10) == b''
+    assert raw.read() == b'NEXT REQUEST'
+
+
+def test_readline_stops_at_content_length():
+    raw = io.BytesIO(b'a=1\r\nb=2GET / HTTP/1.1\r\n')
+    body = RequestBody(raw, 8)
+    assert body.readline() == b'a=1\r\n'
+    assert body.readline() == b'b=2'
+    assert body.readline() == b''
+    assert raw.readline() == b'GET / HTTP/1.1\r\n'
+
+
+def test_drain_discards_the_rest_within_the_limit():
+    raw = io.BytesIO(b'x' * 40000 + b'NEXT')
+    body = RequestBody(raw, 40000)
+    body.read(10)
+    assert body.drain(limit=65536)
+    assert body.remaining == 0 and raw.read() == b'NEXT'
+
+
+def test_drain_over_the_limit_gives_up_without_reading():
+    raw = io.BytesIO(b'x' * 100)
+    body = RequestBody(raw, 100)
+    assert not body.drain(limit=99)
+    assert raw.tell() == 0
+
+
+@pytest.mark.parametrize('raw', [io.BytesIO(b'short'), BrokenReader()])
+def test_drain_of_a_truncated_or_broken_body_fails(raw):
+    assert not RequestBody(raw, 100).drain()
+
+
+def test_connection_stats(monkeypatch):
+    monkeypatch.setattr(keepalive, 'KEEPALIVE_MAX_REQUESTS', 3)
+    stats = ConnectionStats()
+    for connection in range(2):
+        stats.connection_opened()
+    for number in (1, 2, 3, 1):
+        stats.request(number)
+    stats.body_finished(100, True)
+    stats.body_finished(10 ** 6, False)
+    result = stats.stats()
+    assert (result['connections'], result['requests'], result['reused_requests']) == (2, 4, 2)
+    assert result['requests_per_connection'] == 2
+    assert result['closed_at_request_limit'] == 1
+    assert (result['drained_bytes'], result['closed_unread_body']) == (100, 1)
+
+
+@pytest.fixture
+def server():
+    # Unknown paths are answered 404 by the route table without touching the database or the body
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), PostgreSQLRequestHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def request(connection, method, body=None):
+    connection.request(method, '/no/such/route', body=body)
+    response = connection.getresponse()
+    response.read()
+    return response
+
+
+def test_unread_body_is_drained_and_the_connection_reused(server):
+    connection = http.client.HTTPConnection(*server.server_address, timeout=5)
+    first = request(connection, 'POST', b'{"ignored": true}' * 100)
+    sock = connection.sock
+    second = request(connection, 'GET')
+    assert (first.status, second.status) == (404, 404)
+    assert first.getheader('Connection') is None
+    assert connection.sock is sock
+    connection.close()
+
+
+def test_body_over_the_drain_limit_closes_the_connection(server):
+    connection = http.client.HTTPConnection(*server.server_address, timeout=5)
+    response = request(connection, 'POST', b'x' * (keepalive.KEEPALIVE_DRAIN_LIMIT + 1))
+    assert response.status == 404
+    assert response.getheader('Connection') == 'close'
+    assert response.will_close
+    connection.close()
@@ -0,0 +1,140 @@
+"""Tests for the lost-to-found matching engine: candidates, scoring and incremental updates"""
+from datetime import date, timedelta
+
+import pytest
+
+import item_events
+import matching
+from matching import MatchingEngine, tokenize, _date_factor, MATCH_DATE_WINDOW_DAYS
+
+DAY = date(2025, 3, 10)
+
+
+def item(item_id, status, title, description='', category='other', location='', day=DAY):
+    return {'id': item_id, 'status': status, 'title': title, 'description': description, 'category': category,
+            'location_found': location, 'location': None, 'date_found': day}
+
+
+def engine_with(*items):
+    engine = MatchingEngine()
+    for row in items:
+        engine.add(row)
+    engine.loaded = True
+    return engine
+
+
+def ids(results):
+    return [result['id'] for result in results]
+
+
+def test_tokenize_drops_stopwords_and_plurals():
+    assert tokenize('Lost my BLACK Wallets near the Library!') == ['black', 'wallet', 'library']
+    assert tokenize('glass bus keys') == ['glass', 'bus', 'key']
+
+
+def test_only_items_of_the_opposite_status_are_candidates():
+    engine = engine_with(
+        item('lost-1', 'lost', 'Black leather wallet'),
+        item('lost-2', 'lost', 'Black leather wallet'),
+        item('found-1', 'found', 'Black leather wallet'),
+        item('returned-1', 'returned', 'Black leather wallet'),
+    )
+    assert ids(engine.match('lost-1', min_score=0)) == ['found-1']
+    assert sorted(ids(engine.match('found-1', min_score=0))) == ['lost-1', 'lost-2']
+    assert engine.match('returned-1') == [] and engine.match('unknown') == []
+
+
+def test_ranking_prefers_more_and_rarer_shared_terms():
+    engine = engine_with(
+        item('lost', 'lost', 'Blue Hydroflask bottle', 'dented', category='personal'),
+        item('best', 'found', 'Blue Hydroflask bottle', 'dented'),
+        item('title-only', 'found', 'Hydroflask', ''),
+        item('description-only', 'found', 'Umbrella', 'hydroflask'),
+        item('same-category', 'found', 'Bottle', category='personal'),
+        item('unrelated', 'found', 'Laptop charger'),
+    )
+    results = engine.match('lost', min_score=0)
+    assert ids(results)[0] == 'best'
+    # 'blue' is on one found item, 'hydroflask' on three: the rarest title term contributes most
+    assert results[0]['matched_terms'][0] == 'blue'
+    assert set(results[0]['matched_terms']) == {'blue', 'hydroflask', 'bottle', 'dented'}
+    assert ids(results).index('title-only') < ids(results).index('description-only')
+    assert 'unrelated' not in ids(results)
+    scores = {result['id']: result['score'] for result in results}
+    # The category bonus is added on top of the shared-term score
+    engine.remove('same-category')
+    engine.add(item('same-category', 'found', 'Bottle', category='electronics'))
+    without_bonus = {result['id']: result['score'] for result in engine.match('lost', min_score=0)}
+    assert scores['same-category'] - without_bonus['same-category'] == pytest.approx(matching.CATEGORY_BONUS)
+
+
+def test_min_score_and_limit():
+    engine = engine_with(
+        item('lost', 'lost', 'Red umbrella', 'wooden handle'),
+        item('strong', 'found', 'Red umbrella', 'wooden handle'),
+        item('weak', 'found', 'Scarf', 'red'),
+    )
+    scores = {result['id']: result['score'] for result in engine.match('lost', min_score=0)}
+    cutoff = (scores['weak'] + scores['strong']) / 2
+    assert ids(engine.match('lost', min_score=cutoff)) == ['strong']
+    assert ids(engine.match('lost', limit=1, min_score=0)) == ['strong']
+
+
+def test_date_window_scales_scores():
+    engine = engine_with(
+        item('lost', 'lost', 'Silver watch', day=DAY),
+        item('same-day', 'found', 'Silver watch', day=DAY),
+        item('week-later', 'found', 'Silver watch', day=DAY + timedelta(days=7)),
+        item('outside-window', 'found', 'Silver watch', day=DAY + timedelta(days=MATCH_DATE_WINDOW_DAYS + 1)),
+        item('found-before-lost', 'found', 'Silver watch', day=DAY - timedelta(days=5)),
+    )
+    scores = {result['id']: result['score'] for result in engine.match('lost', min_score=0)}
+    assert ids(engine.match('lost', min_score=0))[0] == 'same-day'
+    assert scores['week-later'] == pytest.approx(scores['same-day'] * _date_factor(DAY, DAY + timedelta(days=7)),
+                                                 abs=0.01)
+    assert scores['outside-window'] == pytest.approx(scores['same-day'] * 0.25, abs=0.01)
+    assert scores['found-before-lost'] == pytest.approx(scores['same-day'] * 0.25, abs=0.01)
+    # Symmetric from the found side: the lost report's date comes first
+    assert engine.match('week-later', min_score=0)[0]['score'] == pytest.approx(scores['week-later'])
+
+
+def test_candidates_are_capped(monkeypatch):
+    monkeypatch.setattr(matching, 'MATCH_MAX_CANDIDATES', 3)
+    engine = engine_with(item('lost', 'lost', 'Calculator'),
+                         *[item(f'found-{n}', 'found', 'Calculator') for n in range(10)])
+    assert len(engine.match('lost', min_score=0)) == 3
+
+
+def test_very_common_tokens_are_ignored_once_there_are_enough_items():
+    engine = engine_with(item('lost', 'lost', 'Phone charger cable'),
+                         *[item(f'phone-{n}', 'found', f'Phone model{n}') for n in range(60)],
+                         item('charger', 'found', 'Charger'))
+    assert ids(engine.match('lost', min_score=0)) == ['charger']
+
+
+def test_events_keep_the_index_current():
+    engine = engine_with(item('lost', 'lost', 'Green backpack'))
+    engine.on_item_event(item_events.ITEM_CREATED, 'found-1', item('found-1', 'found', 'Green backpack'))
+    assert ids(engine.match('lost')) == ['found-1']
+
+    # Returned items leave the index
+    engine.on_item_event(item_events.ITEM_UPDATED, 'found-1', item('found-1', 'returned', 'Green backpack'))
+    assert engine.match('lost') == []
+    assert engine.stats()['active_items'] == {'lost': 1, 'found': 0}
+
+    engine.on_item_event(item_events.ITEM_UPDATED, 'found-1', item('found-1', 'found', 'Green backpack'))
+    engine.on_item_event(item_events.ITEM_DELETED, 'found-1', None)
+    assert engine.match('lost') == []
+    assert engine.stats()['tokens'] == {'lost': 2, 'found': 0}
+
+
+def test_status_change_moves_an_item_to_the_other_side():
+    engine = engine_with(item('a', 'lost', 'Keys'), item('b', 'lost', 'Keys'))
+    engine.on_item_event(item_events.ITEM_UPDATED, 'b', item('b', 'found', 'Keys'))
+    assert ids(engine.match('a', min_score=0)) == ['b']
+
+
+def test_events_before_the_first_load_are_ignored():
+    engine = MatchingEngine()
+    engine.on_item_event(item_events.ITEM_CREATED, 'x', item('x', 'lost', 'Keys'))
+    assert engine.stats()['active_items'] == {'lost': 0, 'found': 0}
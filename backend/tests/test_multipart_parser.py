@@ -0,0 +1,123 @@
+"""Tests for the streaming multipart/form-data parser"""
+import io
+import hashlib
+
+import pytest
+
+from multipart_parser import parse_multipart, get_boundary, MultipartError
+
+BOUNDARY = 'XyZboundary42'
+CONTENT_TYPE = f'multipart/form-data; boundary={BOUNDARY}'
+
+
+def build_body(parts, preamble=b'', epilogue=b''):
+    """parts: (name, value bytes, filename or None, content type or None)"""
+    body = preamble
+    for name, value, filename, content_type in parts:
+        disposition = f'form-data; name="{name}"'
+        if filename is not None:
+            disposition += f'; filename="{filename}"'
+        body += f'--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n'.encode()
+        if content_type:
+            body += f'Content-Type: {content_type}\r\n'.encode()
+        body += b'\r\n' + value + b'\r\n'
+    return body + f'--{BOUNDARY}--\r\n'.encode() + epilogue
+
+
+class TrickleReader(io.BytesIO):
+    """Returns at most `step` bytes per read, like a slow socket"""
+
+    def __init__(self, data, step):
+        super().__init__(data)
+        self.step = step
+
+    def read(self, size=-1):
+        return super().read(min(size, self.step) if size and size > 0 else self.step)
+
+
+def parse(body, **limits):
+    return parse_multipart(io.BytesIO(body), CONTENT_TYPE, len(body), **limits)
+
+
+def test_fields_and_file():
+    image = bytes(range(256)) * 40 + b'\r\n--XyZ not a delimiter\r\n'
+    body = build_body([
+        ('title', 'Blue umbrella é'.encode(), None, None),
+        ('description', b'', None, None),
+        ('image', image, 'umbrella.jpg', 'image/jpeg'),
+    ])
+    form = parse(body)
+    assert form.fields == {'title': 'Blue umbrella é', 'description': ''}
+    [upload] = form.files
+    assert (upload.field_name, upload.filename, upload.content_type) == ('image', 'umbrella.jpg', 'image/jpeg')
+    assert upload.file.read() == image
+    assert upload.size == len(image)
+    assert upload.sha256 == hashlib.sha256(image).hexdigest()
+    form.close()
+
+
+@pytest.mark.parametrize('step', [1, 3, 7, 64])
+def test_delimiters_split_across_reads(step):
+    image = b'\r\n-' * 500 + b'tail'
+    body = build_body([('a', b'1', None, None), ('image', image, 'x.png', 'image/png'), ('b', b'2', None, None)],
+                      preamble=b'ignored preamble\r\n', epilogue=b'ignored epilogue')
+    reader = TrickleReader(body, step)
+    form = parse_multipart(reader, CONTENT_TYPE, len(body))
+    assert form.fields == {'a': '1', 'b': '2'}
+    assert form.files[0].file.read() == image
+    # The epilogue is drained so a keep-alive connection is left at the next request
+    assert reader.tell() == len(body)
+
+
+def test_empty_filename_is_a_field():
+    form = parse(build_body([('image', b'', '', 'application/octet-stream')]))
+    assert form.files == [] and form.fields == {'image': ''}
+
+
+def test_file_too_large_is_413():
+    body = build_body([('image', b'x' * 101, 'a.jpg', 'image/jpeg')])
+    with pytest.raises(MultipartError) as error:
+        parse(body, max_file_size=100)
+    assert error.value.status_code == 413
+
+
+def test_field_too_large_is_413():
+    with pytest.raises(MultipartError) as error:
+        parse(build_body([('title', b'x' * 11, None, None)]), max_field_size=10)
+    assert error.value.status_code == 413
+
+
+def test_request_too_large_is_413_before_reading():
+    reader = io.BytesIO(b'')
+    with pytest.raises(MultipartError) as error:
+        parse_multipart(reader, CONTENT_TYPE, 1000, max_request_size=999)
+    assert error.value.status_code == 413
+
+
+@pytest.mark.parametrize('body, message', [
+    (b'no delimiter here at all', 'boundary not found'),
+    (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="a"\r\n\r\nvalue'.encode(), 'ended inside a part'),
+    (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="a"'.encode(), 'inside part headers'),
+    (f'--{BOUNDARY}\r\nContent-Disposition: attachment; name="a"\r\n\r\nv\r\n--{BOUNDARY}--'.encode(),
+     'Content-Disposition'),
+    (f'--{BOUNDARY}\r\nContent-Disposition: form-data\r\n\r\nv\r\n--{BOUNDARY}--'.encode(), 'field name'),
+    (f'--{BOUNDARY}XX'.encode(), 'Malformed'),
+])
+def test_malformed_bodies_are_400(body, message):
+    with pytest.raises(MultipartError, match=message) as error:
+        parse(body)
+    assert error.value.status_code == 400
+
+
+def test_body_shorter_than_content_length():
+    body = build_body([('a', b'1', None, None)])
+    with pytest.raises(MultipartError, match='ended early'):
+        parse_multipart(io.BytesIO(body[:-10]), CONTENT_TYPE, len(body))
+
+
+def test_boundary_parsing():
+    assert get_boundary('multipart/form-data; boundary="quoted value"') == b'quoted value'
+    with pytest.raises(MultipartError):
+        get_boundary('multipart/form-data')
+    with pytest.raises(MultipartError):
+        get_boundary('multipart/form-data; boundary=' + 'x' * 201)
@@ -0,0 +1,108 @@
+"""Tests for the password hasher's pending cap, timeouts and hash checks"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import pytest
+
+import passwords
+from passwords import PasswordHasher, PasswordPoolBusy
+
+
+def blocking_job(release):
+    started = time.time()
+    release.wait(5)
+    return started, 'done'
+
+
+def quick_job(value):
+    return time.time(), value
+
+
+@pytest.fixture
+def hasher(monkeypatch):
+    # Threads instead of processes: the accounting is the same and jobs can share an Event
+    hasher = PasswordHasher(workers=1, max_pending=2)
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(hasher, '_get_pool', lambda: executor)
+    yield hasher
+    executor.shutdown(wait=True)
+
+
+def wait_for(condition):
+    deadline = time.time() + 5
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def test_completed_operation_releases_its_slot_and_records_timings(hasher):
+    assert hasher._run(quick_job, 'x') == 'x'
+    wait_for(lambda: hasher.metrics()['pending'] == 0)
+    metrics = hasher.metrics()
+    assert 'queue_ms' in metrics and 'run_ms' in metrics and metrics['failures'] == 0
+
+
+def test_timed_out_operation_stays_pending_until_it_finishes(hasher, monkeypatch):
+    monkeypatch.setattr(passwords, 'PASSWORD_TIMEOUT', 0.05)
+    release = threading.Event()
+    with pytest.raises(FutureTimeoutError):
+        hasher._run(blocking_job, release)
+    metrics = hasher.metrics()
+    assert metrics['timeouts'] == 1 and metrics['failures'] == 0
+    # The worker is still busy with it, so it still counts against the cap
+    assert metrics['pending'] == 1
+
+    with pytest.raises(FutureTimeoutError):
+        hasher._run(quick_job, 'queued behind it')
+    with pytest.raises(PasswordPoolBusy):
+        hasher._run(quick_job, 'over the cap')
+    assert hasher.metrics()['rejected_busy'] == 1
+
+    release.set()
+    wait_for(lambda: hasher.metrics()['pending'] == 0)
+    assert hasher._run(quick_job, 'after') == 'after'
+
+
+def test_failed_operation_releases_its_slot(hasher):
+    def failing_job():
+        raise RuntimeError('boom')
+    with pytest.raises(RuntimeError):
+        hasher._run(failing_job)
+    wait_for(lambda: hasher.metrics()['pending'] == 0)
+    assert hasher.metrics()['failures'] == 1
+
+
+def test_submit_failure_releases_its_slot(hasher, monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=1)
+    executor.shutdown()
+    monkeypatch.setattr(hasher, '_get_pool', lambda: executor)
+    with pytest.raises(RuntimeError):
+        hasher._run(quick_job, 'x')
+    assert hasher.metrics()['pending'] == 0 and hasher.metrics()['failures'] == 1
+
+
+def test_legacy_sha256_hash_verifies_and_needs_rehash():
+    legacy = passwords.hashlib.sha256(b'secret').hexdigest()
+    hasher = PasswordHasher()
+    assert hasher.verify_password('secret', legacy) == (True, True)
+    assert hasher.verify_password('wrong', legacy) == (False, True)
+
+
+def test_overlong_password_is_rejected_without_hashing():
+    with pytest.raises(ValueError):
+        PasswordHasher().hash_password('x' * (passwords.MAX_PASSWORD_BYTES + 1))
+
+
+@pytest.mark.parametrize('password', ['x' * 73, 'é' * 40])
+def test_overlong_password_costs_the_same_for_unknown_accounts(monkeypatch, password):
+    """Over 72 bytes, neither a real nor a dummy check runs bcrypt"""
+    hasher = PasswordHasher()
+    hasher._dummy_hash = '$2b$04$' + 'a' * 53
+    checks = []
+    monkeypatch.setattr(hasher, '_run', lambda function, *args: checks.append(function))
+    assert hasher.verify_password(password, hasher._dummy_hash) == (False, False)
+    assert hasher.verify_dummy(password) is False
+    assert checks == []
+    hasher.verify_dummy('short enough')
+    assert checks == [passwords._check_in_worker]
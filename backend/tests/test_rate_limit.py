@@ -0,0 +1,115 @@
+"""Tests for the token-bucket rate limiter and the in-flight cap"""
+import pytest
+
+import rate_limit
+from rate_limit import RateLimiter, parse_rate, retry_after_header
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, 'monotonic', clock)
+    return clock
+
+
+def limiter(ip='3/60', user='2/60', **kwargs):
+    return RateLimiter({'search': {'ip': parse_rate(ip), 'user': parse_rate(user)}}, **kwargs)
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('300/60', (300.0, 5.0)),
+    ('10', (10.0, 10.0)),
+    ('0', None),
+    ('off', None),
+    ('', None),
+    (None, None),
+    ('5/0', None),
+])
+def test_parse_rate(value, expected):
+    assert parse_rate(value) == expected
+
+
+def test_burst_then_limited(clock):
+    rates = limiter()
+    assert [rates.check('search', ip='1.2.3.4') for _ in range(3)] == [0, 0, 0]
+    wait = rates.check('search', ip='1.2.3.4')
+    # 3 per 60 s: one token every 20 s
+    assert wait == pytest.approx(20)
+    assert rates.check('search', ip='5.6.7.8') == 0
+    assert rates.stats()['budgets']['search'] == {'allowed': 4, 'limited': 1, 'ip_limit': '3/60s',
+                                                  'user_limit': '2/60s'}
+
+
+def test_tokens_refill_over_time(clock):
+    rates = limiter()
+    for _ in range(3):
+        rates.check('search', ip='ip')
+    clock.now += 10
+    assert rates.check('search', ip='ip') == pytest.approx(10)
+    clock.now += 10
+    assert rates.check('search', ip='ip') == 0
+    # Never more than the capacity, however long the client was idle
+    clock.now += 3600
+    assert [rates.check('search', ip='ip') for _ in range(4)][-1] > 0
+
+
+def test_nothing_is_taken_when_any_bucket_is_empty(clock):
+    rates = limiter()
+    assert rates.check('search', ip='ip', user_id='u') == 0
+    assert rates.check('search', ip='ip', user_id='u') == 0
+    # The user bucket is empty: the request is refused and the IP bucket keeps its last token
+    assert rates.check('search', ip='ip', user_id='u') > 0
+    assert rates._buckets[('search', 'ip', 'ip')][0] == pytest.approx(1)
+    assert rates.check('search', ip='ip') == 0
+
+
+def test_unknown_or_unlimited_budgets_always_allow(clock):
+    rates = limiter(ip='0', user='0')
+    assert rates.check('search', ip='ip', user_id='u') == 0
+    assert rates.check('no such budget', ip='ip') == 0
+    assert rates._buckets == {}
+
+
+def test_prune_drops_refilled_buckets_then_the_oldest_half(clock):
+    rates = limiter(max_buckets=4)
+    rates.check('search', ip='idle')
+    clock.now += 60
+    for address in ('a', 'b', 'c'):
+        rates.check('search', ip=address)
+        clock.now += 1
+    # Full: the idle bucket has refilled and goes, the active ones stay
+    rates.check('search', ip='d')
+    assert ('search', 'ip', 'idle') not in rates._buckets
+    assert len(rates._buckets) == 4
+
+    # Full of active buckets: the oldest half is forgotten
+    rates.check('search', ip='e')
+    assert sorted(key[2] for key in rates._buckets) == ['c', 'd', 'e']
+
+
+def test_in_flight_cap():
+    rates = limiter(max_in_flight=2)
+    assert rates.enter() and rates.enter()
+    assert not rates.enter()
+    rates.leave()
+    assert rates.enter()
+    stats = rates.stats()
+    assert (stats['in_flight'], stats['peak_in_flight'], stats['shed']) == (2, 2, 1)
+
+
+def test_in_flight_cap_disabled():
+    rates = limiter(max_in_flight=0)
+    assert all(rates.enter() for _ in range(100))
+
+
+@pytest.mark.parametrize('seconds, header', [(0.01, '1'), (1, '1'), (1.2, '2'), (20, '20')])
+def test_retry_after_header(seconds, header):
+    assert retry_after_header(seconds) == header
@@ -0,0 +1,142 @@
+"""Tests for the segment-trie router: matching precedence, 405s, handler calls and middleware"""
+import pytest
+
+from router import Router, timed
+
+
+class FakeRequest:
+    def __init__(self, query_params=None):
+        self.query_params = query_params or {}
+        self.calls = []
+
+
+def handler(name, param=None):
+    """A handler taking the path parameter `param`, as the server's handlers name theirs"""
+    if param is None:
+        return lambda request: request.calls.append((name, {}))
+    return {
+        'item_id': lambda request, item_id: request.calls.append((name, {'item_id': item_id})),
+        'file_path': lambda request, file_path: request.calls.append((name, {'file_path': file_path})),
+    }[param]
+
+
+def call(router, method, path, request=None):
+    request = request or FakeRequest()
+    route, params = router.match(method, path)
+    route.call(request, params)
+    return request.calls
+
+
+@pytest.fixture
+def router():
+    router = Router()
+    router.add('GET', '/api/items', handler('list'))
+    router.add('POST', '/api/items', handler('create'))
+    router.add('GET', '/api/items/facets', handler('facets'))
+    router.add('GET', '/api/items/{item_id}', handler('item', 'item_id'))
+    router.add('DELETE', '/api/items/{item_id}', handler('delete', 'item_id'))
+    router.add('GET', '/api/items/{item_id}/matches', handler('matches', 'item_id'))
+    router.add('GET', '/uploads/{file_path*}', handler('upload', 'file_path'))
+    router.add('GET', '/', handler('home'))
+    return router
+
+
+def test_literal_segments_win_over_parameters(router):
+    assert call(router, 'GET', '/api/items/facets') == [('facets', {})]
+    assert call(router, 'GET', '/api/items/42') == [('item', {'item_id': '42'})]
+    assert call(router, 'GET', '/api/items/42/matches') == [('matches', {'item_id': '42'})]
+
+
+def test_literal_wins_regardless_of_insertion_order():
+    router = Router()
+    router.add('GET', '/api/items/{item_id}', handler('item', 'item_id'))
+    router.add('GET', '/api/items/facets', handler('facets'))
+    assert call(router, 'GET', '/api/items/facets') == [('facets', {})]
+
+
+def test_rest_parameter_takes_the_remainder(router):
+    assert call(router, 'GET', '/uploads/ab/cd/abcd.jpg') == [('upload', {'file_path': 'ab/cd/abcd.jpg'})]
+    assert call(router, 'GET', '/uploads/') == [('upload', {'file_path': ''})]
+    assert call(router, 'GET', '/') == [('home', {})]
+
+
+def test_parameters_do_not_match_empty_segments(router):
+    assert router.match('GET', '/api/items/') is None
+    assert router.match('GET', '/api/items/42/other') is None
+    assert router.match('GET', '/nothing') is None
+
+
+def test_other_methods_only_reports_allowed_methods(router):
+    assert router.match('PUT', '/api/items/42') == (None, ['DELETE', 'GET'])
+    assert router.match('PATCH', '/api/items') == (None, ['GET', 'POST'])
+
+
+@pytest.mark.parametrize('pattern, message', [
+    ('/api/items/{id}/other', 'Conflicting parameter'),
+    ('/uploads/{name*}', 'Conflicting rest'),
+    ('/files/{path*}/x', 'must be last'),
+])
+def test_conflicting_patterns_are_errors(router, pattern, message):
+    with pytest.raises(ValueError, match=message):
+        router.add('GET', pattern, handler('x'))
+
+
+def test_duplicate_route_is_an_error(router):
+    with pytest.raises(ValueError, match='Duplicate route GET /api/items'):
+        router.add('GET', '/api/items', handler('again'))
+
+
+def test_query_params_are_passed_to_handlers_that_take_them():
+    router = Router()
+    seen = []
+    router.add('GET', '/search/{scope}', lambda request, scope, query_params: seen.append((scope, query_params)))
+    call(router, 'GET', '/search/items', FakeRequest({'q': ['wallet']}))
+    assert seen == [('items', {'q': ['wallet']})]
+
+
+def test_unused_path_parameters_are_dropped():
+    router = Router()
+    seen = []
+    router.add('GET', '/admin/{page*}', lambda request: seen.append('admin'))
+    router.add('GET', '/docs/{section}/{page}', lambda request, page, query_params: seen.append((page, query_params)))
+    call(router, 'GET', '/admin/items/7')
+    call(router, 'GET', '/docs/api/auth', FakeRequest({'v': ['2']}))
+    assert seen == ['admin', ('auth', {'v': ['2']})]
+
+
+def test_first_middleware_is_outermost():
+    order = []
+
+    def tag(name):
+        def middleware(route, call_next):
+            def wrapped(request, params):
+                order.append(f'{name} in')
+                call_next(request, params)
+                order.append(f'{name} out')
+            return wrapped
+        return middleware
+
+    router = Router()
+    router.add('GET', '/x', lambda request: order.append('handler'), middleware=[tag('outer'), tag('inner')])
+    call(router, 'GET', '/x')
+    assert order == ['outer in', 'inner in', 'handler', 'inner out', 'outer out']
+
+
+def test_timed_middleware_records_calls_and_errors():
+    router = Router()
+
+    def failing(request):
+        raise RuntimeError('boom')
+
+    router.add('GET', '/ok', lambda request: None, middleware=[timed(router)])
+    router.add('GET', '/fail', failing, middleware=[timed(router)])
+    router.add('GET', '/unused', lambda request: None, middleware=[timed(router)])
+    call(router, 'GET', '/ok')
+    call(router, 'GET', '/ok')
+    with pytest.raises(RuntimeError):
+        call(router, 'GET', '/fail')
+
+    stats = router.stats()
+    assert [(entry['route'], entry['calls'], entry['errors']) for entry in stats] == [
+        ('GET /ok', 2, 0), ('GET /fail', 1, 1)]
+    assert all(entry['max_ms'] >= entry['avg_ms'] >= 0 for entry in stats)
@@ -0,0 +1,81 @@
+"""Tests for S3 uploads: single PUT vs. parallel multipart, against a fake client"""
+import io
+import threading
+
+import pytest
+from botocore.exceptions import ClientError
+
+import s3_upload
+
+
+class FakeS3:
+    def __init__(self, fail_part=None):
+        self.fail_part = fail_part
+        self.lock = threading.Lock()
+        self.put = []
+        self.parts = {}
+        self.completed = None
+        self.aborted = False
+        self.content_type = None
+
+    def put_object(self, Bucket, Key, Body, ContentType):
+        self.put.append((Key, Body.read(), ContentType))
+
+    def create_multipart_upload(self, Bucket, Key, ContentType):
+        self.content_type = ContentType
+        return {'UploadId': 'upload-1'}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        if PartNumber == self.fail_part:
+            raise ClientError({'Error': {'Code': '500', 'Message': 'boom'}}, 'UploadPart')
+        with self.lock:
+            self.parts[PartNumber] = Body
+        return {'ETag': f'"etag-{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.completed = MultipartUpload['Parts']
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.aborted = True
+
+
+@pytest.fixture
+def fake_s3(monkeypatch):
+    client = FakeS3()
+    monkeypatch.setattr(s3_upload, 'get_s3_client', lambda: client)
+    monkeypatch.setattr(s3_upload, 'S3_MULTIPART_CHUNK_SIZE', 10)
+    monkeypatch.setattr(s3_upload, 'S3_MULTIPART_CONCURRENCY', 2)
+    monkeypatch.setattr(s3_upload.time, 'sleep', lambda seconds: None)
+    return client
+
+
+def test_multipart_is_off_by_default(fake_s3, monkeypatch):
+    monkeypatch.setattr(s3_upload, 'S3_MULTIPART_THRESHOLD', 0)
+    s3_upload.upload_file_to_s3_key(b'x' * 100, 'items/a.jpg', 'image/jpeg')
+    assert fake_s3.put == [('items/a.jpg', b'x' * 100, 'image/jpeg')] and not fake_s3.parts
+
+
+def test_small_file_uses_single_put(fake_s3, monkeypatch):
+    monkeypatch.setattr(s3_upload, 'S3_MULTIPART_THRESHOLD', 50)
+    s3_upload.upload_file_to_s3_key(b'x' * 49, 'items/a.jpg', 'image/jpeg')
+    assert len(fake_s3.put) == 1 and not fake_s3.parts
+
+
+def test_large_file_is_uploaded_in_ordered_parts(fake_s3, monkeypatch):
+    monkeypatch.setattr(s3_upload, 'S3_MULTIPART_THRESHOLD', 50)
+    data = bytes(range(95))
+    url = s3_upload.upload_file_to_s3_key(io.BytesIO(data), 'items/big.png', 'image/png')
+
+    assert url == s3_upload.s3_url('items/big.png')
+    assert not fake_s3.put and fake_s3.content_type == 'image/png'
+    assert [part['PartNumber'] for part in fake_s3.completed] == list(range(1, 11))
+    assert [part['ETag'] for part in fake_s3.completed] == [f'"etag-{n}"' for n in range(1, 11)]
+    assert b''.join(fake_s3.parts[n] for n in sorted(fake_s3.parts)) == data
+
+
+def test_failed_part_aborts_the_upload(fake_s3, monkeypatch):
+    monkeypatch.setattr(s3_upload, 'S3_MULTIPART_THRESHOLD', 50)
+    fake_s3.fail_part = 3
+    with pytest.raises(ClientError):
+        s3_upload.upload_file_to_s3_key(b'y' * 60, 'items/big.jpg', 'image/jpeg')
+    assert fake_s3.aborted and fake_s3.completed is None
@@ -0,0 +1,184 @@
+"""Tests for saved-search percolation and the batched notification writer"""
+import random
+import threading
+import time
+import uuid
+
+import pytest
+
+import item_events
+import saved_searches
+from saved_searches import Percolator, NOTIFICATION_INSERT, NOTIFICATION_TEMPLATE
+from database_config import DatabaseManager
+
+
+def search(search_id, query='', category='', status='', user_id='searcher'):
+    return {'id': search_id, 'user_id': user_id, 'query': query, 'category': category, 'status': status}
+
+
+def item(title, description='', category='wallets', status='found', user_id='poster'):
+    return {'id': 'item-1', 'title': title, 'description': description, 'category': category, 'status': status,
+            'user_id': user_id}
+
+
+def percolator_with(*searches):
+    percolator = Percolator()
+    for row in searches:
+        percolator.add(row)
+    percolator.loaded = True
+    return percolator
+
+
+def matched(percolator, new_item):
+    return sorted(found.id for found in percolator.percolate(new_item))
+
+
+def test_keyword_hits_and_misses():
+    percolator = percolator_with(
+        search('wallet', 'wallet'),
+        search('partial', 'wall'),
+        search('phrase', 'black wallet'),
+        search('across-words', 'ck wal'),
+        search('other-order', 'wallet black'),
+        search('umbrella', 'umbrella'),
+    )
+    assert matched(percolator, item('Black Wallet', 'found by the gym')) == [
+        'across-words', 'partial', 'phrase', 'wallet']
+    assert matched(percolator, item('Keys', 'on a blue wallet chain')) == ['partial', 'wallet']
+    assert matched(percolator, item('Laptop')) == []
+
+
+def test_short_keyword_searches_are_always_checked():
+    percolator = percolator_with(search('id', 'id'))
+    assert matched(percolator, item('Student ID card')) == ['id']
+    assert matched(percolator, item('Laptop')) == []
+
+
+def test_filter_only_searches_by_category_and_status():
+    percolator = percolator_with(
+        search('everything'),
+        search('wallets', category='wallets'),
+        search('found', status='found'),
+        search('found-wallets', category='wallets', status='found'),
+        search('lost-wallets', category='wallets', status='lost'),
+        search('keys', category='keys'),
+        search('wallet-keyword-in-keys', 'wallet', category='keys'),
+    )
+    assert matched(percolator, item('Brown wallet')) == ['everything', 'found', 'found-wallets', 'wallets']
+    assert matched(percolator, item('Brown wallet', category='keys', status='lost')) == [
+        'everything', 'keys', 'wallet-keyword-in-keys']
+
+
+def test_owners_are_not_alerted_about_their_own_items():
+    percolator = percolator_with(search('mine', 'wallet', user_id='poster'), search('theirs', 'wallet'))
+    assert matched(percolator, item('Wallet', user_id='poster')) == ['theirs']
+
+
+def test_removed_searches_no_longer_match():
+    percolator = percolator_with(search('a', 'wallet'), search('b', 'wallet'), search('c', 'wallpaper', user_id='u2'))
+    percolator.remove('a')
+    assert matched(percolator, item('Wallet')) == ['b']
+    percolator.remove('b')
+    assert 'wallet' not in percolator._by_key
+    assert percolator._key_grams == {'wal': {'wallpaper'}}
+    percolator.remove_user('u2')
+    assert percolator._key_grams == {} and matched(percolator, item('Wallpaper')) == []
+
+
+def test_candidates_agree_with_checking_every_search():
+    rng = random.Random(7)
+    alphabet = 'abcdeno'
+    words = [''.join(rng.choice(alphabet) for _ in range(rng.randint(2, 40))) for _ in range(300)]
+    percolator = percolator_with(*[search(f's{n}', ' '.join(rng.sample(words, rng.randint(1, 2)))[:12].strip())
+                                   for n in range(300)])
+    for _ in range(50):
+        new_item = item(' '.join(rng.sample(words, 3)), ' '.join(rng.sample(words, 5)))
+        title, description = new_item['title'].lower(), new_item['description'].lower()
+        expected = sorted(found.id for found in percolator._searches.values()
+                          if found.matches(new_item, title, description))
+        assert matched(percolator, new_item) == expected
+
+
+# ----- notification writer -----
+
+def wait_for(condition):
+    for _ in range(500):
+        if condition():
+            return
+        time.sleep(0.01)
+    assert condition()
+
+
+class FakeDatabase:
+    batches = []
+    written = threading.Event()
+
+    def connect(self):
+        return True
+
+    def disconnect(self):
+        pass
+
+    def execute_batch_insert(self, query, rows, template=None):
+        assert query == NOTIFICATION_INSERT and template == NOTIFICATION_TEMPLATE
+        FakeDatabase.batches.append(list(rows))
+        FakeDatabase.written.set()
+        return len(rows)
+
+
+def test_created_items_queue_one_alert_per_user(monkeypatch):
+    FakeDatabase.batches = []
+    FakeDatabase.written = threading.Event()
+    monkeypatch.setattr(saved_searches, 'DatabaseManager', FakeDatabase)
+    percolator = percolator_with(search('a', 'wallet', user_id='u1'), search('b', 'black', user_id='u1'),
+                                 search('c', 'wallet', user_id='u2'))
+
+    percolator.on_item_event(item_events.ITEM_UPDATED, 'item-1', item('Black wallet'))
+    percolator.on_item_event(item_events.ITEM_CREATED, 'item-1', item('Black wallet', status='returned'))
+    assert percolator._writer is None
+
+    percolator.on_item_event(item_events.ITEM_CREATED, 'item-1', item('Black wallet'))
+    assert FakeDatabase.written.wait(5)
+    [rows] = FakeDatabase.batches
+    assert sorted(row[0] for row in rows) == ['u1', 'u2']
+    assert all(row[1] == 'item-1' and row[2] == saved_searches.NOTIFICATION_TYPE for row in rows)
+    wait_for(lambda: percolator.stats()['notifications_written'] == 2)
+
+
+def test_alerts_queued_meanwhile_share_one_insert(monkeypatch):
+    FakeDatabase.batches = []
+    monkeypatch.setattr(saved_searches, 'DatabaseManager', FakeDatabase)
+    percolator = Percolator()
+    # Queued before the writer runs, as when alerts arrive while it is busy writing
+    for number in range(3):
+        percolator._queue.put([(f'u{number}', 'item', 'type', 'title', 'message')])
+    percolator._ensure_writer()
+    wait_for(lambda: percolator.stats()['batches_written'] == 1)
+    assert [len(batch) for batch in FakeDatabase.batches] == [3]
+
+
+def test_notification_insert_skips_deleted_users_and_items():
+    db = DatabaseManager()
+    if not db.connect():
+        pytest.skip('PostgreSQL is not reachable')
+    user_id, item_id, gone = (str(uuid.uuid4()) for _ in range(3))
+    try:
+        # Temporary tables shadow the real ones for this session only
+        for statement in ("CREATE TEMP TABLE users (id UUID PRIMARY KEY)",
+                          "CREATE TEMP TABLE items (id UUID PRIMARY KEY)",
+                          """CREATE TEMP TABLE notifications (user_id UUID, item_id UUID, type TEXT, title TEXT,
+                                                              message TEXT)"""):
+            db.execute_query(statement)
+        db.execute_query("INSERT INTO users VALUES (%s)", (user_id,))
+        db.execute_query("INSERT INTO items VALUES (%s)", (item_id,))
+        written = db.execute_batch_insert(NOTIFICATION_INSERT, [
+            (user_id, item_id, 'type', 'kept', 'message'),
+            (gone, item_id, 'type', 'user deleted', 'message'),
+            (user_id, gone, 'type', 'item deleted', 'message'),
+        ], template=NOTIFICATION_TEMPLATE)
+        titles = [row['title'] for row in db.execute_query("SELECT title FROM notifications")]
+        for table in ('notifications', 'items', 'users'):
+            db.execute_query(f"DROP TABLE pg_temp.{table}")
+    finally:
+        db.disconnect()
+    assert written == 1 and titles == ['kept']
@@ -0,0 +1,123 @@
+"""Tests for the in-memory listing index: the n-gram token lookup and event handling"""
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import search_index as search_index_module
+from search_index import SearchIndex, WORD_PATTERN
+import item_events
+
+BASE_TIME = datetime(2025, 3, 1, 12, 0)
+
+WORDS = ['black', 'wallet', 'leather', 'umbrella', 'blue', 'keys', 'keychain', 'laptop', 'charger', 'backpack',
+         'water', 'bottle', 'id', 'card', 'student', 'headphones', 'phone', 'glasses', 'jacket', 'scarf']
+
+
+def row(index, title, description='', status='lost', category='other', user_id='u1'):
+    return {'id': f'item-{index}', 'title': title, 'description': description, 'status': status,
+            'category': category, 'user_id': user_id, 'created_at': BASE_TIME + timedelta(minutes=index),
+            'user_name': 'Alice', 'user_email': 'alice@example.com'}
+
+
+def loaded_index(rows, users=None):
+    index = SearchIndex()
+    for item in rows:
+        index.add(item)
+    index._users = dict(users or {'u1': ('Alice', 'alice@example.com')})
+    index.loaded = True
+    return index
+
+
+def sample_rows():
+    rows = []
+    for number in range(120):
+        title = ' '.join(WORDS[(number * step) % len(WORDS)] for step in (1, 3, 7))
+        rows.append(row(number, title.title(), f'Found near building {number % 9}'))
+    return rows
+
+
+def scan(rows, text):
+    text = text.lower()
+    return {item['id'] for item in rows
+            if text in item['title'].lower() or text in item['description'].lower()}
+
+
+@pytest.mark.parametrize('text', ['wallet', 'LET', 'ack', 'hone', 'keychain', 'building 4', 'zzz', 'back pack',
+                                  'ear', 'a'])
+def test_candidates_match_a_substring_scan(text):
+    rows = sample_rows()
+    index = loaded_index(rows)
+    total, page = index.query(search=text, page=1, per_page=500)
+    assert total == len(scan(rows, text)) == len(page)
+
+
+def test_candidate_tokens_come_from_the_gram_postings():
+    index = loaded_index(sample_rows())
+    longest = max(WORD_PATTERN.findall('wallet'), key=len)
+    expected = set()
+    for token, ids in index._tokens.items():
+        if longest in token:
+            expected |= ids
+    assert index._search_candidates('wallet') == expected
+
+
+def test_removing_the_last_item_with_a_token_drops_its_grams():
+    index = loaded_index([row(1, 'Zebra print scarf'), row(2, 'Scarf')])
+    assert 'zeb' in index._token_grams
+    index.remove('item-1')
+    assert 'zeb' not in index._token_grams and 'zebra' not in index._tokens
+    assert index._token_grams['sca'] == {'scarf'}
+    assert index.query(search='scarf', page=1, per_page=10)[0] == 1
+
+
+def test_event_for_a_cached_user_applies_on_the_publishing_thread(monkeypatch):
+    index = loaded_index([])
+    monkeypatch.setattr(search_index_module, 'DatabaseManager', None)
+    index.on_item_event(item_events.ITEM_CREATED, 'item-1', row(1, 'Red scarf'))
+    assert index._event_worker is None
+    assert index.query(search='scarf', page=1, per_page=10)[0] == 1
+
+
+def test_event_for_an_unknown_user_is_applied_off_the_publishing_thread(monkeypatch):
+    index = loaded_index([])
+    release = threading.Event()
+    lookups = []
+
+    def slow_lookup(user_id, cached_only=False):
+        if cached_only or user_id in index._users:
+            return index._users.get(user_id)
+        lookups.append(threading.current_thread().name)
+        release.wait(5)
+        return ('Bob', 'bob@example.com')
+
+    monkeypatch.setattr(index, '_user_columns', slow_lookup)
+    index.on_item_event(item_events.ITEM_CREATED, 'item-1', row(1, 'Blue umbrella', user_id='u2'))
+    # A later event for a cached user queues behind it instead of overtaking it
+    index.on_item_event(item_events.ITEM_UPDATED, 'item-1', row(1, 'Green umbrella', user_id='u1'))
+    # Until the queue is drained listings go to the database
+    assert index.query(search='umbrella', page=1, per_page=10) is None
+
+    release.set()
+    for _ in range(500):
+        with index._lock:
+            if not index._deferred:
+                break
+        threading.Event().wait(0.01)
+    assert lookups == ['search-index-events']
+    total, [body] = index.query(search='umbrella', page=1, per_page=10)
+    assert total == 1 and b'Green umbrella' in body
+    assert index.stats()['deferred_events'] == 2
+
+
+def test_events_before_the_first_load_are_ignored():
+    index = SearchIndex()
+    index.on_item_event(item_events.ITEM_CREATED, 'item-1', row(1, 'Scarf'))
+    assert index._records == {} and index._deferred == 0
+
+
+def test_searches_left_to_the_database_are_counted():
+    index = loaded_index([])
+    assert index.query(search='100%', page=1, per_page=10) is None
+    assert index.query(page=0, per_page=10) is None
+    assert index.stats()['fallbacks'] == 2
@@ -0,0 +1,144 @@
+"""Conditional requests, byte ranges and the metadata cache in static_files"""
+import os
+import io
+import socket
+
+from static_files import (StaticFileCache, FileMeta, safe_join, is_not_modified, parse_range,
+                          send_file_range)
+
+
+def make_meta(tmp_path, content=b'0123456789'):
+    path = tmp_path / 'asset.js'
+    path.write_bytes(content)
+    return FileMeta(str(path), os.stat(path))
+
+
+# ----- metadata cache -----
+
+def test_lookup_returns_regular_files_only(tmp_path):
+    cache = StaticFileCache()
+    (tmp_path / 'file.txt').write_bytes(b'abc')
+    (tmp_path / 'folder').mkdir()
+
+    meta = cache.lookup(str(tmp_path / 'file.txt'))
+    assert meta.size == 3
+    assert meta.content_type == 'text/plain'
+    assert cache.lookup(str(tmp_path / 'folder')) is None
+    assert cache.lookup(str(tmp_path / 'missing')) is None
+
+
+def test_lookup_caches_until_invalidated(tmp_path):
+    cache = StaticFileCache(ttl=60)
+    path = tmp_path / 'file.txt'
+    path.write_bytes(b'abc')
+    first = cache.lookup(str(path))
+
+    path.write_bytes(b'abcdef')
+    assert cache.lookup(str(path)) is first
+
+    cache.invalidate(str(path))
+    assert cache.lookup(str(path)).size == 6
+
+
+def test_lookup_forgets_a_path_replaced_by_a_directory(tmp_path):
+    cache = StaticFileCache(ttl=0)
+    path = tmp_path / 'thing'
+    path.write_bytes(b'abc')
+    assert cache.lookup(str(path)) is not None
+
+    path.unlink()
+    path.mkdir()
+    assert cache.lookup(str(path)) is None
+    assert str(path) not in cache._entries
+
+
+def test_cache_size_is_bounded(tmp_path):
+    cache = StaticFileCache(ttl=60, max_entries=2)
+    for name in ('a', 'b', 'c'):
+        (tmp_path / name).write_bytes(b'x')
+        cache.lookup(str(tmp_path / name))
+    assert len(cache._entries) == 2
+
+
+def test_safe_join_rejects_escapes(tmp_path):
+    assert safe_join(str(tmp_path), 'js/main.js') == os.path.join(os.path.realpath(tmp_path), 'js', 'main.js')
+    assert safe_join(str(tmp_path), '../etc/passwd') is None
+    assert safe_join(str(tmp_path), '/etc/passwd') == os.path.join(os.path.realpath(tmp_path), 'etc', 'passwd')
+
+
+# ----- conditional requests -----
+
+def test_etag_match_is_not_modified(tmp_path):
+    meta = make_meta(tmp_path)
+    assert is_not_modified({'If-None-Match': meta.etag}, meta)
+    assert is_not_modified({'If-None-Match': f'"other", W/{meta.etag}'}, meta)
+    assert is_not_modified({'If-None-Match': '*'}, meta)
+    assert not is_not_modified({'If-None-Match': '"other"'}, meta)
+
+
+def test_if_none_match_takes_precedence_over_date(tmp_path):
+    meta = make_meta(tmp_path)
+    headers = {'If-None-Match': '"other"', 'If-Modified-Since': meta.last_modified}
+    assert not is_not_modified(headers, meta)
+
+
+def test_if_modified_since(tmp_path):
+    meta = make_meta(tmp_path)
+    assert is_not_modified({'If-Modified-Since': meta.last_modified}, meta)
+    assert not is_not_modified({'If-Modified-Since': 'Thu, 01 Jan 1970 00:00:00 GMT'}, meta)
+    assert not is_not_modified({'If-Modified-Since': 'not a date'}, meta)
+    assert not is_not_modified({}, meta)
+
+
+# ----- ranges -----
+
+def test_parse_range_forms(tmp_path):
+    meta = make_meta(tmp_path)
+    assert parse_range({}, meta) is None
+    assert parse_range({'Range': 'bytes=2-5'}, meta) == (2, 5)
+    assert parse_range({'Range': 'bytes=7-'}, meta) == (7, 9)
+    assert parse_range({'Range': 'bytes=-3'}, meta) == (7, 9)
+    assert parse_range({'Range': 'bytes=-30'}, meta) == (0, 9)
+    assert parse_range({'Range': 'bytes=5-100'}, meta) == (5, 9)
+
+
+def test_parse_range_unsatisfiable_and_ignored(tmp_path):
+    meta = make_meta(tmp_path)
+    assert parse_range({'Range': 'bytes=10-'}, meta) == 'unsatisfiable'
+    assert parse_range({'Range': 'bytes=-0'}, meta) == 'unsatisfiable'
+    # Malformed, reversed and multi-range requests get the whole file
+    assert parse_range({'Range': 'bytes=5-2'}, meta) is None
+    assert parse_range({'Range': 'bytes=a-b'}, meta) is None
+    assert parse_range({'Range': 'bytes=0-1,4-5'}, meta) is None
+    assert parse_range({'Range': 'items=0-1'}, meta) is None
+
+
+def test_if_range_must_match_the_validator(tmp_path):
+    meta = make_meta(tmp_path)
+    assert parse_range({'Range': 'bytes=0-1', 'If-Range': meta.etag}, meta) == (0, 1)
+    assert parse_range({'Range': 'bytes=0-1', 'If-Range': meta.last_modified}, meta) == (0, 1)
+    assert parse_range({'Range': 'bytes=0-1', 'If-Range': '"stale"'}, meta) is None
+
+
+def test_send_file_range_over_a_socket(tmp_path):
+    path = tmp_path / 'data.bin'
+    path.write_bytes(bytes(range(256)) * 4)
+    server, client = socket.socketpair()
+    try:
+        with open(path, 'rb') as f:
+            send_file_range(server, server.makefile('wb'), f, 100, 50)
+        server.close()
+        received = b''.join(iter(lambda: client.recv(4096), b''))
+    finally:
+        client.close()
+    assert received == (bytes(range(256)) * 4)[100:150]
+
+
+def test_send_file_range_falls_back_to_writes():
+    class NoSendfile:
+        def sendfile(self, *args):
+            raise NotImplementedError
+
+    out = io.BytesIO()
+    send_file_range(NoSendfile(), out, io.BytesIO(b'abcdefgh'), 2, 4)
+    assert out.getvalue() == b'cdef'
@@ -0,0 +1,158 @@
+"""Tests for the storage backends, URL routing and the sharded local layout"""
+import io
+import os
+
+import pytest
+
+import storage
+from storage import LocalStorage, MemoryStorage, storage_for_url, content_type_for
+
+
+@pytest.fixture
+def local(tmp_path):
+    return LocalStorage(root=str(tmp_path / 'uploads'))
+
+
+@pytest.fixture(params=['memory', 'local'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryStorage()
+    return LocalStorage(root=str(tmp_path / 'uploads'))
+
+
+def test_put_get_stat_delete(backend):
+    url = backend.put('abcd01.jpg', b'jpeg data')
+    assert url == backend.url('abcd01.jpg')
+    assert backend.name_from_url(url) == 'abcd01.jpg'
+    assert backend.get('abcd01.jpg') == b'jpeg data'
+    with backend.open('abcd01.jpg') as f:
+        assert f.read() == b'jpeg data'
+    stat = backend.stat('abcd01.jpg')
+    assert (stat.name, stat.size, stat.content_type) == ('abcd01.jpg', 9, 'image/jpeg')
+
+    backend.delete('abcd01.jpg')
+    backend.delete('abcd01.jpg')
+    assert backend.stat('abcd01.jpg') is None
+    with pytest.raises(FileNotFoundError):
+        backend.get('abcd01.jpg')
+
+
+def test_put_reads_file_objects_from_their_position(backend):
+    data = io.BytesIO(b'headerBODY')
+    data.read(6)
+    backend.put('ef01.png', data)
+    assert backend.get('ef01.png') == b'BODY'
+
+
+def test_content_types():
+    assert content_type_for('a.webp') == 'image/webp'
+    assert content_type_for('a.PNG') == 'image/png'
+    assert content_type_for('a.unknownext') == 'application/octet-stream'
+
+
+def test_memory_storage_respects_an_explicit_content_type():
+    memory = MemoryStorage()
+    memory.put('x.bin', b'1', 'image/heic')
+    assert memory.stat('x.bin').content_type == 'image/heic'
+
+
+def test_name_from_url_ignores_other_backends(local):
+    assert local.name_from_url('memory://ab.jpg') is None
+    assert local.name_from_url(None) is None
+    assert MemoryStorage().name_from_url('/uploads/ab.jpg') is None
+
+
+def test_storage_for_url_finds_the_owning_backend(monkeypatch):
+    monkeypatch.setattr(storage, 's3_storage', None)
+    assert storage_for_url('/uploads/ab.jpg') == (storage.local_storage, 'ab.jpg')
+    assert storage_for_url('memory://cd.jpg') == (storage.memory_storage, 'cd.jpg')
+    assert storage_for_url('https://example.com/x.jpg') == (None, None)
+
+
+@pytest.mark.parametrize('setting, expected', [('memory', 'memory'), ('local', 'local'), ('auto', 'local'),
+                                               ('s3', 'local')])
+def test_get_storage_without_s3(monkeypatch, setting, expected):
+    monkeypatch.setattr(storage, 'STORAGE_BACKEND', setting)
+    monkeypatch.setattr(storage, 's3_configured', lambda: False)
+    assert storage.get_storage().name == expected
+
+
+@pytest.mark.parametrize('name', ['', '../etc/passwd', 'a/b.jpg', '.hidden', 'a\\b.jpg'])
+def test_local_storage_refuses_names_outside_its_root(local, name):
+    with pytest.raises(ValueError):
+        local.put(name, b'x')
+
+
+# ----- sharded local layout -----
+
+def test_files_are_written_to_hex_shards(local):
+    local.put('abcdef0123.jpg', b'x')
+    assert os.path.isfile(os.path.join(local.root, 'ab', 'cd', 'abcdef0123.jpg'))
+    assert local.url('abcdef0123.jpg') == '/uploads/abcdef0123.jpg'
+
+
+def test_non_hex_names_are_sharded_by_digest(local):
+    path = local.shard_path('photo.jpg')
+    first, second = os.path.relpath(path, local.root).split(os.sep)[:2]
+    assert len(first) == len(second) == 2 and set(first + second) <= set('0123456789abcdef')
+
+
+def test_writes_leave_no_temp_files(local):
+    local.put('abcd01.jpg', b'x' * 10)
+    local.put('abcd01.jpg', io.BytesIO(b'y' * 10))
+    assert os.listdir(os.path.join(local.root, 'ab', 'cd')) == ['abcd01.jpg']
+    assert local.get('abcd01.jpg') == b'y' * 10
+
+
+def write_flat(local, name, data=b'old'):
+    os.makedirs(local.root, exist_ok=True)
+    with open(os.path.join(local.root, name), 'wb') as f:
+        f.write(data)
+
+
+def test_legacy_flat_files_still_resolve(local):
+    write_flat(local, 'abcd02.jpg', b'legacy')
+    assert local.get('abcd02.jpg') == b'legacy'
+    assert local.stat('abcd02.jpg').size == 6
+    local.delete('abcd02.jpg')
+    assert not os.path.exists(os.path.join(local.root, 'abcd02.jpg'))
+
+
+def test_candidate_paths_never_return_hidden_or_temp_files(local):
+    assert local.candidate_paths('.abc.tmp') == []
+    assert local.candidate_paths('ab/../../etc/passwd') == []
+    assert local.candidate_paths('ab//x.jpg') == []
+    assert local.candidate_paths('sub/x.jpg') == [os.path.join(os.path.realpath(local.root), 'sub', 'x.jpg')]
+
+
+def test_migrate_flat_files_moves_each_file_once(local):
+    write_flat(local, 'abcd03.jpg', b'one')
+    write_flat(local, 'photo.png', b'two')
+    local.put('ef0123.jpg', b'already sharded')
+
+    assert local.migrate_flat_files(dry_run=True) == (2, 0)
+    assert os.path.exists(os.path.join(local.root, 'abcd03.jpg'))
+
+    assert local.migrate_flat_files() == (2, 0)
+    assert not os.path.exists(os.path.join(local.root, 'abcd03.jpg'))
+    assert os.path.isfile(local.shard_path('abcd03.jpg'))
+    assert (local.get('abcd03.jpg'), local.get('photo.png'), local.get('ef0123.jpg')) == (
+        b'one', b'two', b'already sharded')
+    # A second run finds nothing left to move
+    assert local.migrate_flat_files() == (0, 0)
+
+
+def test_migrate_removes_only_stale_temp_files(local):
+    local.put('abcd04.jpg', b'x')
+    shard = os.path.dirname(local.shard_path('abcd04.jpg'))
+    stale, fresh = os.path.join(shard, '.stale.tmp'), os.path.join(shard, '.fresh.tmp')
+    for path in (stale, fresh):
+        with open(path, 'wb') as f:
+            f.write(b'partial')
+    os.utime(stale, (0, 0))
+    assert local.migrate_flat_files() == (0, 1)
+    assert not os.path.exists(stale) and os.path.exists(fresh)
+
+
+def test_migrate_without_an_upload_directory(local):
+    assert local.migrate_flat_files() == (0, 0)
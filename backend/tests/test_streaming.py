@@ -0,0 +1,100 @@
+"""Tests for streamed listings: chunk framing, compression and cursor cleanup"""
+import io
+import gzip
+import json
+from contextlib import closing
+
+from database_config import RowStream
+from streaming import ResponseStream, iter_json_listing
+
+
+def unchunk(data):
+    """Decode a chunked body, checking it ends with the terminating chunk"""
+    body = b''
+    while True:
+        size_line, _, data = data.partition(b'\r\n')
+        size = int(size_line, 16)
+        if size == 0:
+            assert data == b'\r\n'
+            return body
+        body += data[:size]
+        assert data[size:size + 2] == b'\r\n'
+        data = data[size + 2:]
+
+
+class FakeCursor:
+    def __init__(self, batches):
+        self.batches = list(batches)
+        self.closed = False
+
+    def fetchmany(self, size):
+        assert not self.closed
+        return self.batches.pop(0) if self.batches else []
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self):
+        self.commits = 0
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_chunked_stream_round_trip():
+    out = io.BytesIO()
+    stream = ResponseStream(out, chunked=True, buffer_size=10)
+    for part in (b'{"items":[', b'1,2,3', b'],"total":3}'):
+        stream.write(part)
+    stream.close()
+    assert unchunk(out.getvalue()) == b'{"items":[1,2,3],"total":3}'
+
+
+def test_unchunked_stream_writes_raw_bytes():
+    out = io.BytesIO()
+    stream = ResponseStream(out, chunked=False)
+    stream.write(b'abc')
+    stream.close()
+    assert out.getvalue() == b'abc'
+
+
+def test_compressed_stream():
+    import zlib
+    out = io.BytesIO()
+    stream = ResponseStream(out, chunked=True, compressor=zlib.compressobj(6, zlib.DEFLATED, 31), buffer_size=4)
+    payload = b'x' * 1000
+    stream.write(payload)
+    stream.close()
+    assert gzip.decompress(unchunk(out.getvalue())) == payload
+
+
+def test_row_stream_iterates_all_batches_then_closes():
+    cursor, connection = FakeCursor([[(3,), (4,)], [(5,)]]), FakeConnection()
+    rows = RowStream(connection, cursor, [(1,), (2,)], batch_size=2)
+    with closing(rows):
+        assert [row[0] for row in rows] == [1, 2, 3, 4, 5]
+    assert cursor.closed and connection.commits == 1
+
+
+def test_row_stream_closes_cursor_when_never_iterated():
+    cursor, connection = FakeCursor([[(2,)]]), FakeConnection()
+    with closing(RowStream(connection, cursor, [(1,)], batch_size=1)):
+        pass
+    assert cursor.closed and connection.commits == 1
+
+
+def test_row_stream_close_is_idempotent_and_stops_iteration():
+    cursor, connection = FakeCursor([[(2,)]]), FakeConnection()
+    rows = RowStream(connection, cursor, [(1,)], batch_size=1)
+    assert next(rows) == (1,)
+    rows.close()
+    rows.close()
+    assert list(rows) == [] and connection.commits == 1
+
+
+def test_listing_from_row_stream():
+    rows = RowStream(FakeConnection(), FakeCursor([[('b',)]]), [('a',)], batch_size=1)
+    body = b''.join(iter_json_listing(['name'], rows, 'users', lambda count: {'total': count}))
+    assert json.loads(body) == {'users': [{'name': 'a'}, {'name': 'b'}], 'total': 2}
@@ -0,0 +1,100 @@
+"""Tests for typeahead suggestions: prefix ranking, the short-prefix cache and incremental updates"""
+import item_events
+import suggest
+from suggest import PrefixIndex, SuggestIndex, normalize
+
+
+def item(item_id, title, location=None, status='found'):
+    return {'id': item_id, 'title': title, 'location_found': location, 'location': None, 'status': status}
+
+
+def loaded_index(*items):
+    index = SuggestIndex()
+    for row in items:
+        index.add(row)
+    index.loaded = True
+    return index
+
+
+def values(results):
+    return [(result['value'], result['count']) for result in results]
+
+
+def test_normalize_folds_whitespace_and_rejects_long_values():
+    assert normalize('  Black \t wallet  ') == 'Black wallet'
+    assert normalize('   ') is None and normalize(None) is None
+    assert normalize('x' * (suggest.SUGGEST_MAX_VALUE_LENGTH + 1)) is None
+
+
+def test_prefix_lookup_ranks_by_count_then_value():
+    prefixes = PrefixIndex()
+    for value in ['Black wallet', 'black Wallet', 'Blue bottle', 'Black umbrella', 'Black umbrella',
+                  'Black umbrella', 'Keys']:
+        prefixes.add(value)
+    assert values(prefixes.lookup('bl')) == [('Black umbrella', 3), ('Black wallet', 2), ('Blue bottle', 1)]
+    assert values(prefixes.lookup('BLACK  w')) == [('Black wallet', 2)]
+    assert values(prefixes.lookup('bl', limit=1)) == [('Black umbrella', 3)]
+    assert prefixes.lookup('zz') == []
+
+
+def test_long_prefixes_are_not_cached():
+    prefixes = PrefixIndex()
+    prefixes.add('Student card')
+    prefixes.lookup('st')
+    prefixes.lookup('student')
+    assert set(prefixes._cache) == {'st'}
+
+
+def test_short_prefix_cache_is_invalidated_by_changes_under_it():
+    prefixes = PrefixIndex()
+    prefixes.add('Charger')
+    assert values(prefixes.lookup('c')) == [('Charger', 1)]
+    prefixes.add('Calculator')
+    prefixes.add('Calculator')
+    assert values(prefixes.lookup('c')) == [('Calculator', 2), ('Charger', 1)]
+    prefixes.add('Calculator', -2)
+    assert values(prefixes.lookup('c')) == [('Charger', 1)]
+    assert len(prefixes) == 1
+
+
+def test_events_update_counts():
+    index = loaded_index(item('1', 'Red scarf', 'Library'), item('2', 'Red scarf', 'Gym'))
+    assert values(index.suggest('title', 're')) == [('Red scarf', 2)]
+
+    index.on_item_event(item_events.ITEM_UPDATED, '2', item('2', 'Red hat', 'Gym'))
+    assert values(index.suggest('title', 're')) == [('Red hat', 1), ('Red scarf', 1)]
+
+    index.on_item_event(item_events.ITEM_DELETED, '1', None)
+    assert values(index.suggest('title', 're')) == [('Red hat', 1)]
+    assert values(index.suggest('location', 'li')) == []
+
+
+def test_returned_items_are_not_suggested():
+    index = loaded_index(item('1', 'Gold ring', 'Chapel'), item('2', 'Gold necklace', 'Chapel', status='returned'))
+    assert values(index.suggest('title', 'gold')) == [('Gold ring', 1)]
+
+    index.on_item_event(item_events.ITEM_UPDATED, '1', item('1', 'Gold ring', 'Chapel', status='returned'))
+    assert index.suggest('title', 'gold') == [] and index.suggest('location', 'ch') == []
+    assert index.stats()['values'] == {'title': 0, 'location': 0}
+
+
+def test_load_reads_only_listed_items():
+    class FakeDatabase:
+        queries = []
+
+        def execute_query(self, query, params=None):
+            self.queries.append((query, params))
+            return [item('1', 'Laptop', 'Lab')]
+
+    db = FakeDatabase()
+    index = SuggestIndex()
+    assert index.load(db)
+    [(query, params)] = db.queries
+    assert 'WHERE status != %s' in query and params == ('returned',)
+    assert values(index.suggest('location', 'la')) == [('Lab', 1)]
+
+
+def test_events_before_the_first_load_are_ignored():
+    index = SuggestIndex()
+    index.on_item_event(item_events.ITEM_CREATED, '1', item('1', 'Laptop'))
+    assert index.suggest('title', 'la') == []
@@ -0,0 +1,34 @@
+"""Tests for the tokens binding presigned upload keys to the user they were issued to"""
+from datetime import datetime, timedelta
+
+import jwt
+
+from postgresql_server import PostgreSQLRequestHandler, JWT_SECRET
+
+issue = PostgreSQLRequestHandler.issue_upload_token
+key_of = PostgreSQLRequestHandler.upload_token_key
+
+
+def test_token_round_trip():
+    token = issue(None, 'user-1', 'items/abc.jpg', 300)
+    assert key_of(None, token, 'user-1') == 'items/abc.jpg'
+
+
+def test_token_of_another_user_is_refused():
+    token = issue(None, 'user-1', 'items/abc.jpg', 300)
+    assert key_of(None, token, 'user-2') is None
+
+
+def test_expired_forged_and_missing_tokens_are_refused():
+    expired = jwt.encode({'purpose': 'upload', 'user_id': 'user-1', 'key': 'items/abc.jpg',
+                          'exp': datetime.utcnow() - timedelta(seconds=1)}, JWT_SECRET, algorithm='HS256')
+    forged = jwt.encode({'purpose': 'upload', 'user_id': 'user-1', 'key': 'items/abc.jpg'},
+                        'a different secret of at least thirty-two bytes', algorithm='HS256')
+    for token in (expired, forged, None, 42, 'garbage'):
+        assert key_of(None, token, 'user-1') is None
+
+
+def test_login_token_is_not_an_upload_token():
+    login = jwt.encode({'user_id': 'user-1', 'exp': datetime.utcnow() + timedelta(days=1)},
+                       JWT_SECRET, algorithm='HS256')
+    assert key_of(None, login, 'user-1') is None
@@ -0,0 +1,152 @@
+"""Tests for the upload worker: failure handling (items never stay 'pending') and presigned uploads"""
+import io
+import hashlib
+
+import pytest
+
+import upload_worker
+
+
+class FakeUpload:
+    sha256 = 'ab' * 32
+    filename = 'photo.jpg'
+    size = 4
+
+    def __init__(self):
+        self.file = io.BytesIO(b'data')
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeDatabase:
+    """Records queries; connect() answers from a shared script of results"""
+    connects = []
+    queries = []
+
+    def connect(self):
+        return FakeDatabase.connects.pop(0) if FakeDatabase.connects else True
+
+    def disconnect(self):
+        pass
+
+    def execute_query(self, query, params=None):
+        FakeDatabase.queries.append((' '.join(query.split()), params))
+        if query.lstrip().startswith('UPDATE items'):
+            return [{'id': params[-1], 'image_status': 'failed'}]
+        return []
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    FakeDatabase.connects = []
+    FakeDatabase.queries = []
+    monkeypatch.setattr(upload_worker, 'DatabaseManager', FakeDatabase)
+    monkeypatch.setattr(upload_worker, 'image_ingest', None)
+    monkeypatch.setattr(upload_worker, 'VARIANTS_AVAILABLE', False)
+    monkeypatch.setattr(upload_worker, 'compute_hash', lambda file_obj: 7)
+    monkeypatch.setattr(upload_worker, 'acquire_blob', lambda db, content_hash: None)
+    monkeypatch.setattr(upload_worker.item_events, 'publish', lambda *args: None)
+    monkeypatch.setattr(upload_worker.time, 'sleep', lambda seconds: None)
+    worker_pool = upload_worker.UploadWorkerPool(workers=1)
+    yield worker_pool
+    worker_pool.shutdown()
+
+
+def item_updates():
+    return [(query, params) for query, params in FakeDatabase.queries if query.startswith('UPDATE items')]
+
+
+def test_database_unreachable_marks_item_failed_on_a_new_connection(pool):
+    # The job's own connection fails, the first retry too, the second one works
+    FakeDatabase.connects = [False, False, True]
+    upload = FakeUpload()
+    pool.process_inline('item-1', upload)
+
+    [(query, params)] = item_updates()
+    assert "SET image_status = 'failed'" in query and params == ('item-1',)
+    assert upload.closed
+    assert pool.metrics()['failed'] == 1
+
+
+def test_database_never_reachable_gives_up(pool):
+    FakeDatabase.connects = [False] * 10
+    pool.process_inline('item-1', FakeUpload())
+    assert item_updates() == []
+    assert pool.metrics()['failed'] == 1
+
+
+def test_registration_failure_deletes_stored_files_and_marks_failed(pool, monkeypatch):
+    deleted = []
+    monkeypatch.setattr(upload_worker, 'store_upload', lambda *args: ('/uploads/ab/ab/abab.jpg', False))
+    monkeypatch.setattr(upload_worker, 'register_blob', lambda *args: (_ for _ in ()).throw(RuntimeError('boom')))
+    monkeypatch.setattr(upload_worker, 'delete_stored_files', lambda url, variants: deleted.append(url))
+    pool.process_inline('item-2', FakeUpload())
+
+    assert deleted == ['/uploads/ab/ab/abab.jpg']
+    [(query, params)] = item_updates()
+    # No image: the row's status is set to 'failed'
+    assert params[0] is None and params[4] == 'failed'
+
+
+def test_registration_failure_keeps_files_a_concurrent_upload_registered(pool, monkeypatch):
+    deleted = []
+    monkeypatch.setattr(upload_worker, 'store_upload', lambda *args: ('/uploads/same.jpg', False))
+    monkeypatch.setattr(upload_worker, 'register_blob', lambda *args: (_ for _ in ()).throw(RuntimeError('boom')))
+    monkeypatch.setattr(upload_worker, 'delete_stored_files', lambda url, variants: deleted.append(url))
+    monkeypatch.setattr(FakeDatabase, 'execute_query', lambda self, query, params=None: (
+        [{'image_url': '/uploads/same.jpg'}] if 'FROM image_blobs' in query else [{'id': params[-1]}]))
+    pool.process_inline('item-3', FakeUpload())
+    assert deleted == []
+
+
+def test_failed_item_update_releases_blob_and_marks_failed(pool, monkeypatch):
+    released = []
+    monkeypatch.setattr(upload_worker, 'acquire_blob', lambda db, content_hash: {
+        'image_url': '/uploads/x.jpg', 'image_variants': None, 'perceptual_hash': 1})
+    monkeypatch.setattr(upload_worker, 'release_blob', lambda db, content_hash: released.append(content_hash))
+    monkeypatch.setattr(upload_worker.UploadWorkerPool, '_update_item', lambda self, *args: False)
+    marked = []
+    monkeypatch.setattr(upload_worker.UploadWorkerPool, '_mark_failed', lambda self, item_id: marked.append(item_id))
+    pool.process_inline('item-4', FakeUpload())
+    assert released == [FakeUpload.sha256] and marked == ['item-4']
+
+
+class FakeStagingStorage:
+    prefix = 'items/'
+
+    def __init__(self, data=b'staged', fail=False):
+        self.data = data
+        self.fail = fail
+        self.deleted = []
+
+    def get(self, name):
+        if self.fail:
+            raise FileNotFoundError(name)
+        return self.data
+
+    def delete(self, name):
+        self.deleted.append(name)
+
+
+def test_staged_upload_goes_through_the_pipeline_and_is_deleted(pool, monkeypatch):
+    staging = FakeStagingStorage(b'jpeg bytes')
+    monkeypatch.setattr(upload_worker, 's3_storage', staging)
+    jobs = []
+    monkeypatch.setattr(upload_worker.UploadWorkerPool, '_run',
+                        lambda self, job: jobs.append((job.item_id, job.upload.filename, job.upload.file.read(),
+                                                       job.upload.sha256)))
+    pool.process_staged_inline('item-5', 'items/0f0e.jpg')
+
+    assert jobs == [('item-5', '0f0e.jpg', b'jpeg bytes', hashlib.sha256(b'jpeg bytes').hexdigest())]
+    assert staging.deleted == ['0f0e.jpg']
+
+
+def test_staged_upload_that_cannot_be_fetched_marks_item_failed(pool, monkeypatch):
+    monkeypatch.setattr(upload_worker, 's3_storage', FakeStagingStorage(fail=True))
+    pool.process_staged_inline('item-6', 'items/gone.jpg')
+    [(query, params)] = item_updates()
+    assert "SET image_status = 'failed'" in query and params == ('item-6',)
+    metrics = pool.metrics()
+    assert metrics['failed'] == 1 and metrics['queue_depth'] == 0
@@ -0,0 +1,388 @@
+"""
+Background image upload pipeline
+
+Items are inserted with image_status='pending' and the spooled image is
+handed to a bounded pool of worker threads, which upload it to S3 (with
+retries and exponential backoff), fall back to local storage, render the
+responsive variants, and finally update the item row with the resulting URLs.
+Before storage, originals are normalized (downscaled, EXIF stripped, re-encoded)
+in image_ingest's process pool.
+Originals are content-addressed: an image whose sha256 is already in
+image_blobs reuses the stored blob and skips the upload entirely.
+Images uploaded straight to S3 with a presigned form are fetched from their
+staging key and put through the same pipeline (submit_staged).
+Every failure ends with image_status='failed': files that were stored but
+could not be registered are deleted, and items whose job was lost entirely
+are swept by fail_abandoned_uploads() at startup.
+"""
+import os
+import time
+import uuid
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from psycopg2.extras import Json
+from database_config import DatabaseManager
+from image_blobs import acquire_blob, register_blob, release_blob, delete_stored_files
+from storage import get_storage, local_storage, s3_configured, s3_storage
+from multipart_parser import UploadedFile
+from image_similarity import compute_hash
+import item_events
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Pillow is optional - without it only the original image is stored, as uploaded
+try:
+    from image_variants import create_image_variants
+    import image_ingest
+    VARIANTS_AVAILABLE = True
+except ImportError:
+    image_ingest = None
+    VARIANTS_AVAILABLE = False
+
+# ======= UPLOAD PIPELINE CONFIGURATION =======
+UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', 4))
+# Jobs waiting or running before new uploads are processed inline instead
+UPLOAD_QUEUE_SIZE = int(os.getenv('UPLOAD_QUEUE_SIZE', 100))
+UPLOAD_MAX_RETRIES = int(os.getenv('UPLOAD_MAX_RETRIES', 3))
+UPLOAD_RETRY_BACKOFF = float(os.getenv('UPLOAD_RETRY_BACKOFF', 0.5))
+# Items still 'pending' this many seconds after their last update are marked failed at startup
+UPLOAD_STALE_SECONDS = int(os.getenv('UPLOAD_STALE_SECONDS', 900))
+
+# Number of recent upload latencies kept for percentile metrics
+LATENCY_WINDOW = 500
+
+
+def s3_enabled():
+    return s3_configured()
+
+
+def store_upload(file_obj, filename, stem=None, storage=None,
+                 max_retries=UPLOAD_MAX_RETRIES, backoff=UPLOAD_RETRY_BACKOFF):
+    """
+    Store an uploaded file in the primary storage backend with retries; when
+    that is remote and keeps failing, local storage is used as backup.
+    stem names the stored file (the content hash); a new UUID is used otherwise.
+    Returns (image_url, used_fallback).
+    """
+    storage = storage or get_storage()
+    name = (stem or str(uuid.uuid4())) + os.path.splitext(filename)[1].lower()
+
+    if storage is not local_storage:
+        for attempt in range(1, max_retries + 1):
+            try:
+                file_obj.seek(0)
+                return storage.put(name, file_obj), False
+            except Exception as e:
+                print(f"WARNING - {storage.name} upload attempt {attempt}/{max_retries} failed: {e}")
+            if attempt < max_retries:
+                time.sleep(backoff * (2 ** (attempt - 1)))
+        print(f"WARNING - {storage.name} upload failed, falling back to local storage...")
+        print("💾 Using local storage as backup...")
+        file_obj.seek(0)
+        return local_storage.put(name, file_obj), True
+
+    file_obj.seek(0)
+    return local_storage.put(name, file_obj), False
+
+
+class UploadJob:
+    __slots__ = ('item_id', 'upload', 'submitted_at')
+
+    def __init__(self, item_id, upload):
+        self.item_id = item_id
+        self.upload = upload
+        self.submitted_at = time.monotonic()
+
+
+class UploadWorkerPool:
+    """Bounded thread pool that stores item images off the request thread"""
+
+    def __init__(self, workers=UPLOAD_WORKERS, max_queue=UPLOAD_QUEUE_SIZE):
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='upload')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._fallbacks = 0
+        self._rejected = 0
+        self._deduplicated = 0
+        self._ingest_bytes_in = 0
+        self._ingest_bytes_out = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def submit(self, item_id, upload):
+        """
+        Queue an UploadedFile for item_id. The pool takes ownership of the file.
+        Returns False when the queue is full so the caller can process it inline.
+        """
+        with self._lock:
+            if self._pending >= self.max_queue:
+                self._rejected += 1
+                return False
+            self._pending += 1
+        self._executor.submit(self._run, UploadJob(item_id, upload))
+        return True
+
+    def process_inline(self, item_id, upload):
+        """Run a job on the calling thread (used when the queue is full)"""
+        with self._lock:
+            self._pending += 1
+        self._run(UploadJob(item_id, upload))
+
+    def submit_staged(self, item_id, key):
+        """
+        Queue the ingest of an image a browser uploaded straight to S3 (presigned
+        upload under key). It goes through the same pipeline as a multipart
+        upload. Returns False when the queue is full.
+        """
+        with self._lock:
+            if self._pending >= self.max_queue:
+                self._rejected += 1
+                return False
+            self._pending += 1
+        self._executor.submit(self._run_staged, item_id, key)
+        return True
+
+    def process_staged_inline(self, item_id, key):
+        """Ingest a presigned upload on the calling thread (used when the queue is full)"""
+        with self._lock:
+            self._pending += 1
+        self._run_staged(item_id, key)
+
+    def _run_staged(self, item_id, key):
+        """Fetch the staged object, run the normal job on it, then delete the staged copy"""
+        name = key[len(s3_storage.prefix):]
+        try:
+            upload = UploadedFile('image', name, None)
+            upload.write(s3_storage.get(name))
+            upload.file.seek(0)
+        except Exception as e:
+            print(f"ERROR - Could not fetch direct upload {key} for item {item_id}: {e}")
+            self._mark_failed(item_id)
+            with self._lock:
+                self._pending -= 1
+                self._failed += 1
+            return
+
+        self._run(UploadJob(item_id, upload))
+        # The image is stored under its content hash now (or failed); the staging key is not referenced
+        try:
+            s3_storage.delete(name)
+        except Exception as e:
+            print(f"WARNING - Could not delete staged upload {key}: {e}")
+
+    def _run(self, job):
+        with self._lock:
+            self._in_flight += 1
+        started = time.monotonic()
+        image_url = None
+        variant_urls = None
+        perceptual_hash = None
+        content_hash = job.upload.sha256
+        db = DatabaseManager()
+        connected = db.connect()
+        try:
+            if not connected:
+                raise RuntimeError('database connection failed')
+            image_url, variant_urls, perceptual_hash = self._store_image(db, job, content_hash)
+        except Exception as e:
+            print(f"ERROR - Image upload failed for item {job.item_id}: {e}")
+        finally:
+            job.upload.close()
+
+        updated = connected and self._update_item(db, job.item_id, image_url, variant_urls,
+                                                  content_hash if image_url else None, perceptual_hash)
+        if not updated and image_url:
+            # The item does not point at the blob, so the reference taken for it is dropped
+            try:
+                release_blob(db, content_hash)
+            except Exception as e:
+                print(f"WARNING - Could not release image blob {content_hash[:12]}: {e}")
+        db.disconnect()
+        if not updated:
+            # Never leave the item 'pending' - the clients would wait for an image forever
+            self._mark_failed(job.item_id)
+        with self._lock:
+            self._in_flight -= 1
+            self._pending -= 1
+            if image_url and updated:
+                self._completed += 1
+                self._latencies.append(time.monotonic() - started)
+            else:
+                self._failed += 1
+
+    def _store_image(self, db, job, content_hash):
+        """
+        Reuse the stored blob for this content or upload it;
+        returns (image_url, variant_urls, perceptual_hash)
+        """
+        blob = acquire_blob(db, content_hash)
+        if blob:
+            with self._lock:
+                self._deduplicated += 1
+            print(f"INFO - Image for item {job.item_id} is already stored, skipping upload: {blob['image_url']}")
+            # Blobs stored before perceptual hashing existed are hashed from the upload
+            perceptual_hash = blob['perceptual_hash']
+            if perceptual_hash is None:
+                perceptual_hash = compute_hash(job.upload.file)
+            return blob['image_url'], blob['image_variants'], perceptual_hash
+
+        # The blob stays keyed by the hash of the uploaded bytes, so re-uploads of
+        # the same photo are still recognised before any normalization work
+        if image_ingest is not None:
+            sizes = image_ingest.normalize_upload(job.upload)
+            if sizes:
+                with self._lock:
+                    self._ingest_bytes_in += sizes[0]
+                    self._ingest_bytes_out += sizes[1]
+                print(f"INFO - Normalized image for item {job.item_id}: {sizes[0]}B -> {sizes[1]}B")
+
+        # Hash what is stored, after EXIF rotation and downscaling
+        perceptual_hash = compute_hash(job.upload.file)
+
+        image_url, used_fallback = store_upload(job.upload.file, job.upload.filename, content_hash)
+        if used_fallback:
+            with self._lock:
+                self._fallbacks += 1
+        print(f"SUCCESS - Stored image for item {job.item_id}: {image_url}")
+
+        variant_urls = None
+        if VARIANTS_AVAILABLE:
+            try:
+                variant_urls = create_image_variants(job.upload.file, image_url)
+            except Exception as e:
+                # The original is still usable - list views fall back to image_url
+                print(f"WARNING - Could not create image variants for item {job.item_id}: {e}")
+
+        try:
+            blob = register_blob(db, content_hash, image_url, variant_urls, job.upload.size, perceptual_hash)
+        except Exception:
+            self._discard_unregistered(db, content_hash, image_url, variant_urls)
+            raise
+        return blob['image_url'], blob['image_variants'], blob['perceptual_hash']
+
+    def _discard_unregistered(self, db, content_hash, image_url, variant_urls):
+        """Delete files stored for a blob that could not be recorded, unless a concurrent upload recorded them"""
+        try:
+            rows = db.execute_query("SELECT image_url FROM image_blobs WHERE content_hash = %s", (content_hash,))
+        except Exception:
+            rows = []
+        if rows and rows[0]['image_url'] == image_url:
+            # Same content-addressed name: the files belong to that blob now
+            return
+        print(f"INFO - Deleting unregistered image files for blob {content_hash[:12]}")
+        delete_stored_files(image_url, variant_urls)
+
+    def _update_item(self, db, item_id, image_url, variant_urls=None, content_hash=None, perceptual_hash=None):
+        """Record the final image URL, variants and hashes (or the failure) on the item row"""
+        try:
+            rows = db.execute_query(
+                """
+                UPDATE items
+                SET image_url = %s, image_variants = %s, image_hash = %s, image_phash = %s, image_status = %s,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+                RETURNING *
+                """,
+                (image_url, Json(variant_urls) if variant_urls else None, content_hash, perceptual_hash,
+                 'ready' if image_url else 'failed', item_id)
+            )
+            if rows:
+                item_events.publish(item_events.ITEM_UPDATED, item_id, dict(rows[0]))
+            elif content_hash:
+                # The item was deleted while its image was uploading
+                release_blob(db, content_hash)
+            return True
+        except Exception as e:
+            print(f"ERROR - Could not record image for item {item_id}: {e}")
+            return False
+
+    def _mark_failed(self, item_id, max_retries=UPLOAD_MAX_RETRIES, backoff=UPLOAD_RETRY_BACKOFF):
+        """Set image_status='failed' on a fresh connection, retrying while the database is unreachable"""
+        for attempt in range(1, max_retries + 1):
+            db = DatabaseManager()
+            if db.connect():
+                try:
+                    rows = db.execute_query(
+                        """
+                        UPDATE items SET image_status = 'failed', updated_at = CURRENT_TIMESTAMP
+                        WHERE id = %s AND image_status = 'pending'
+                        RETURNING *
+                        """,
+                        (item_id,)
+                    )
+                    if rows:
+                        item_events.publish(item_events.ITEM_UPDATED, item_id, dict(rows[0]))
+                    return True
+                except Exception as e:
+                    print(f"WARNING - Could not mark image of item {item_id} failed: {e}")
+                finally:
+                    db.disconnect()
+            if attempt < max_retries:
+                time.sleep(backoff * (2 ** (attempt - 1)))
+        print(f"ERROR - Item {item_id} is left with image_status='pending' until the next startup sweep")
+        return False
+
+    def metrics(self):
+        """Queue depth, counters and upload latency percentiles (milliseconds)"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            metrics = {
+                'queue_depth': self._pending - self._in_flight,
+                'in_flight': self._in_flight,
+                'max_queue': self.max_queue,
+                'completed': self._completed,
+                'failed': self._failed,
+                'local_fallbacks': self._fallbacks,
+                'rejected_to_inline': self._rejected,
+                'deduplicated': self._deduplicated,
+                'ingest_bytes_in': self._ingest_bytes_in,
+                'ingest_bytes_out': self._ingest_bytes_out,
+            }
+        if latencies:
+            metrics['latency_ms'] = {
+                'p50': round(latencies[len(latencies) // 2] * 1000, 1),
+                'p95': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1),
+                'max': round(latencies[-1] * 1000, 1),
+            }
+        return metrics
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+        if image_ingest is not None:
+            image_ingest.shutdown(wait=wait)
+
+
+def fail_abandoned_uploads(stale_seconds=UPLOAD_STALE_SECONDS):
+    """
+    Mark items whose upload job was lost (server restart, database outage while
+    the job ran) as failed. Run once at startup; returns the number of items.
+    """
+    db = DatabaseManager()
+    if not db.connect():
+        return 0
+    try:
+        rows = db.execute_query(
+            """
+            UPDATE items SET image_status = 'failed', updated_at = CURRENT_TIMESTAMP
+            WHERE image_status = 'pending' AND updated_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 second'
+            RETURNING id
+            """,
+            (stale_seconds,)
+        )
+        if rows:
+            print(f"WARNING - Marked {len(rows)} abandoned image uploads as failed")
+        return len(rows)
+    except Exception as e:
+        print(f"ERROR - Could not check for abandoned image uploads: {e}")
+        return 0
+    finally:
+        db.disconnect()
+
+
+upload_pool = UploadWorkerPool()
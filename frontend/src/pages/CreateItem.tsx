@@ -14,11 +14,13 @@ import {
   MenuItem,
   Grid,
   CircularProgress,
+  Autocomplete,
 } from '@mui/material';
 import { ArrowBack, Add, CloudUpload } from '@mui/icons-material';
 import { ItemStatus, ItemCategory, ItemCustodyStatus } from '../types/item';
 import { useAuth } from '../context/AuthContext';
-import api from '../util/api';
+import api, { uploadImageDirect } from '../util/api';
+import { useSuggestions } from '../util/useSuggestions';
 
 const CreateItem = () => {
   const navigate = useNavigate();
@@ -50,6 +52,7 @@ const CreateItem = () => {
   const [selectedFile, setSelectedFile] = useState<File | null>(null);
   const [imagePreview, setImagePreview] = useState<string | null>(null);
   const [formErrors, setFormErrors] = useState<Record<string, string>>({});
+  const locationSuggestions = useSuggestions('location', formData.location_found);
 
   const handleInputChange = (field: string, value: string) => {
     setFormData(prev => ({
@@ -137,10 +140,13 @@ const CreateItem = () => {
       // Use the title as provided, or let backend auto-generate if empty
       const finalTitle = formData.title.trim();
 
+      // Prefer uploading the image straight to S3; the item then only references its key
+      const directUpload = selectedFile ? await uploadImageDirect(selectedFile) : null;
+
       // Use different submission strategies based on whether an image is selected
       let response;
       
-      if (selectedFile) {
+      if (selectedFile && !directUpload) {
         // Use multipart form data when image is selected
         const submitFormData = new FormData();
         submitFormData.append('title', finalTitle);
@@ -159,7 +165,7 @@ const CreateItem = () => {
           timeout: 60000, // 60 second timeout for item creation (includes file upload)
         });
       } else {
-        // Use JSON when no image is selected (faster and more reliable)
+        // Use JSON when no image is selected or it was already uploaded directly
         const jsonData = {
           title: finalTitle,
           description: formData.description,
@@ -168,6 +174,7 @@ const CreateItem = () => {
           location: formData.location_found,
           date_found: formData.date_found,
           custody_status: formData.custody_status,
+          ...(directUpload ? { image_key: directUpload.key, upload_token: directUpload.upload_token } : {}),
         };
 
         response = await api.post('/api/items', jsonData, {
@@ -317,14 +324,22 @@ const CreateItem = () => {
               </Grid>
 
               <Grid item xs={12} sm={6}>
-                <TextField
-                  fullWidth
-                  label={formData.status === ItemStatus.LOST ? "Location Lost" : "Location Found"}
-                  value={formData.location_found}
-                  onChange={(e) => handleInputChange('location_found', e.target.value)}
-                  error={!!formErrors.location_found}
-                  helperText={formErrors.location_found}
-                  placeholder={formData.status === ItemStatus.LOST ? "e.g., Last seen at Library 2nd Floor" : "e.g., Found at Library 2nd Floor"}
+                <Autocomplete
+                  freeSolo
+                  options={locationSuggestions}
+                  filterOptions={(options) => options} // already filtered by the server
+                  inputValue={formData.location_found}
+                  onInputChange={(_, value) => handleInputChange('location_found', value)}
+                  renderInput={(params) => (
+                    <TextField
+                      {...params}
+                      fullWidth
+                      label={formData.status === ItemStatus.LOST ? "Location Lost" : "Location Found"}
+                      error={!!formErrors.location_found}
+                      helperText={formErrors.location_found}
+                      placeholder={formData.status === ItemStatus.LOST ? "e.g., Last seen at Library 2nd Floor" : "e.g., Found at Library 2nd Floor"}
+                    />
+                  )}
                 />
               </Grid>
 
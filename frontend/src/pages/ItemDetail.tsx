@@ -17,7 +17,7 @@ import {
 import { ArrowBack, LocationOn, DateRange, Category, Flag, Person } from '@mui/icons-material';
 import { Item, ItemCustodyStatus } from '../types/item';
 import { API_BASE_URL } from '../config';
-import { getImageUrl } from '../util/image';
+import { getVariantUrl } from '../util/image';
 import { useAuth } from '../context/AuthContext';
 
 const ItemDetail: React.FC = () => {
@@ -117,7 +117,7 @@ const ItemDetail: React.FC = () => {
             <Card sx={{ height: '100%' }}>
               <CardMedia
                 component="img"
-                image={getImageUrl(item.image_url)}
+                image={getVariantUrl(item, 'large')}
                 alt={item.title}
                 sx={{ 
                   backgroundColor: '#f5f5f5',
@@ -22,18 +22,21 @@ import {
   Card,
   CardContent,
   CardMedia,
+  Autocomplete,
 } from '@mui/material';
 import { 
   Add, 
   Search, 
   ViewList,
   ViewModule,
-  ImageNotSupported
+  ImageNotSupported,
+  NotificationsActive
 } from '@mui/icons-material';
 import { useAuth } from '../context/AuthContext';
 import { ItemStatus, ItemCategory, Item } from '../types/item';
-import { getImageUrl } from '../util/image';
+import { getImageUrl, getVariantUrl } from '../util/image';
 import api from '../util/api';
+import { useSuggestions } from '../util/useSuggestions';
 
 const ItemList = () => {
   const navigate = useNavigate();
@@ -47,9 +50,12 @@ const ItemList = () => {
   
   const [searchInput, setSearchInput] = useState('');
   const [searchTerm, setSearchTerm] = useState('');
+  const titleSuggestions = useSuggestions('title', searchInput);
   
   const [category, setCategory] = useState<ItemCategory | ''>('');
   const [status, setStatus] = useState<ItemStatus | ''>('');
+  const [facetCounts, setFacetCounts] = useState<Record<string, Record<string, number>>>({});
+  const [savedSearchMessage, setSavedSearchMessage] = useState<string | null>(null);
 
   const truncateText = (text: string, maxLength: number): string => {
     if (text.length <= maxLength) return text;
@@ -95,6 +101,47 @@ const ItemList = () => {
     fetchItems();
   }, [fetchItems]);
 
+  // Per-option counts for the filter menus, for the current search term
+  useEffect(() => {
+    const params = new URLSearchParams(searchTerm ? { search: searchTerm } : {});
+    api.get(`/api/items/facets?${params.toString()}`)
+      .then((response) => {
+        const counts: Record<string, Record<string, number>> = {};
+        Object.entries(response.data.facets || {}).forEach(([facet, values]) => {
+          counts[facet] = {};
+          (values as { value: string; count: number }[]).forEach(({ value, count }) => {
+            counts[facet][value] = count;
+          });
+        });
+        setFacetCounts(counts);
+      })
+      .catch(() => setFacetCounts({}));
+  }, [searchTerm]);
+
+  // Save the current search so new matching items show up as notifications
+  const handleSaveSearch = async () => {
+    try {
+      await api.post('/api/saved-searches', {
+        query: searchTerm,
+        category,
+        status,
+      });
+      setSavedSearchMessage("Search saved - you'll be notified when a matching item is posted");
+    } catch (err: any) {
+      setSavedSearchMessage(err.response?.data?.error || 'Could not save this search');
+    }
+  };
+
+  useEffect(() => {
+    setSavedSearchMessage(null);
+  }, [searchTerm, category, status]);
+
+  const facetLabel = (facet: string, value: string) => {
+    const label = value.charAt(0).toUpperCase() + value.slice(1);
+    const counts = facetCounts[facet];
+    return counts ? `${label} (${counts[value] || 0})` : label;
+  };
+
   const renderGridView = () => {
     if (items.length === 0) {
       return (
@@ -145,7 +192,7 @@ const ItemList = () => {
                 <CardMedia
                   component="img"
                   height="280"
-                  image={getImageUrl(item.image_url)}
+                  image={getVariantUrl(item, 'medium')}
                   alt={item.title}
                   sx={{ 
                     objectFit: 'cover',
@@ -250,7 +297,7 @@ const ItemList = () => {
                   </Box>
                 ) : (
                   <img
-                    src={getImageUrl(item.image_url)}
+                    src={getVariantUrl(item, 'small')}
                     alt={item.title}
                     style={{
                       width: '140px',
@@ -355,20 +402,36 @@ const ItemList = () => {
       <Paper sx={{ p: 3, mb: 3, backgroundColor: 'white', border: '1px solid var(--gray-200)' }}>
         <Grid container spacing={2} alignItems="center">
           <Grid item xs={12} md={5}>
-            <TextField
-              fullWidth
-              placeholder="Search your items"
-              value={searchInput}
-              onChange={(e) => setSearchInput(e.target.value)}
-              onKeyPress={handleSearchKeyPress}
-              size="small"
-              InputProps={{
-                startAdornment: (
-                  <InputAdornment position="start">
-                    <Search sx={{ color: 'var(--gray-400)', fontSize: 20 }} />
-                  </InputAdornment>
-                ),
+            <Autocomplete
+              freeSolo
+              options={titleSuggestions}
+              filterOptions={(options) => options} // already filtered by the server
+              inputValue={searchInput}
+              onInputChange={(_, value) => setSearchInput(value)}
+              onChange={(_, value) => {
+                // Picking a suggestion searches for it right away
+                if (typeof value === 'string') {
+                  setSearchTerm(value);
+                  setPage(1);
+                }
               }}
+              renderInput={(params) => (
+                <TextField
+                  {...params}
+                  fullWidth
+                  placeholder="Search your items"
+                  onKeyPress={handleSearchKeyPress}
+                  size="small"
+                  InputProps={{
+                    ...params.InputProps,
+                    startAdornment: (
+                      <InputAdornment position="start">
+                        <Search sx={{ color: 'var(--gray-400)', fontSize: 20 }} />
+                      </InputAdornment>
+                    ),
+                  }}
+                />
+              )}
             />
           </Grid>
           <Grid item xs={4} md={2}>
@@ -382,7 +445,7 @@ const ItemList = () => {
                 <MenuItem value="">All Status</MenuItem>
                 {Object.values(ItemStatus).map((stat) => (
                   <MenuItem key={stat} value={stat}>
-                    {stat.charAt(0).toUpperCase() + stat.slice(1)}
+                    {facetLabel('status', stat)}
                   </MenuItem>
                 ))}
               </Select>
@@ -399,7 +462,7 @@ const ItemList = () => {
                 <MenuItem value="">All Categories</MenuItem>
                 {Object.entries(ItemCategory).map(([key, value]) => (
                   <MenuItem key={key} value={value}>
-                    {value.charAt(0).toUpperCase() + value.slice(1)}
+                    {facetLabel('category', value)}
                   </MenuItem>
                 ))}
               </Select>
@@ -466,6 +529,23 @@ const ItemList = () => {
             </Box>
           </Grid>
         </Grid>
+        {isAuthenticated && (searchTerm || category || status) && (
+          <Box sx={{ display: 'flex', alignItems: 'center', gap: 2, mt: 2 }}>
+            <Button
+              size="small"
+              variant="outlined"
+              startIcon={<NotificationsActive />}
+              onClick={handleSaveSearch}
+            >
+              Alert me about new matches
+            </Button>
+            {savedSearchMessage && (
+              <Typography variant="body2" color="text.secondary">
+                {savedSearchMessage}
+              </Typography>
+            )}
+          </Box>
+        )}
       </Paper>
 
       {error && (
@@ -517,7 +597,7 @@ const ItemList = () => {
                       </Box>
                     ) : (
                       <img
-                        src={getImageUrl(item.image_url)}
+                        src={getVariantUrl(item, 'small')}
                         alt={item.title}
                         style={{
                           width: '120px',
@@ -20,6 +20,12 @@ export enum ItemCategory {
     LEFT_WHERE_FOUND = 'left_where_found'
   }
   
+  export interface ImageVariants {
+    small?: string;   // 320px longest edge
+    medium?: string;  // 800px
+    large?: string;   // 1600px
+  }
+  
   export interface User {
     id: string;
     name: string;
@@ -37,6 +43,8 @@ export enum ItemCategory {
     location?: string;        // Added for new items
     date_found: string;
     image_url: string | null;
+    image_status?: 'pending' | 'ready' | 'failed';  // Image is stored in the background after creation
+    image_variants?: ImageVariants | null;          // Resized renditions for list views
     finder_id?: string;
     user_id: string;
     user_name?: string;
@@ -44,4 +44,60 @@ api.interceptors.request.use(
   }
 );
 
+export interface PresignedUpload {
+  url: string;
+  fields: Record<string, string>;
+  key: string;
+  content_type: string;
+  expires_in: number;
+  max_size: number;
+  upload_token: string;
+}
+
+// What the item is created with after a direct upload: the key and the token it was issued with
+export interface DirectUpload {
+  key: string;
+  upload_token: string;
+}
+
+// Upload an image straight to S3 with a presigned form so the bytes skip the API server.
+// Resolves to the uploaded key and its token, or null when direct uploads are not available.
+export const uploadImageDirect = async (file: File): Promise<DirectUpload | null> => {
+  let presigned: PresignedUpload;
+  try {
+    const response = await api.post('/api/uploads/presign', { filename: file.name, size: file.size });
+    presigned = response.data;
+  } catch (error: any) {
+    if (error.response?.status === 503) {
+      return null;
+    }
+    throw error;
+  }
+
+  const uploadData = new FormData();
+  Object.entries(presigned.fields).forEach(([name, value]) => uploadData.append(name, value));
+  uploadData.append('file', file); // S3 requires the file to be the last field
+
+  // fetch rather than axios so the API Authorization header is not sent to S3
+  const response = await fetch(presigned.url, { method: 'POST', body: uploadData });
+  if (!response.ok) {
+    throw new Error(`Direct upload failed with status ${response.status}`);
+  }
+  return { key: presigned.key, upload_token: presigned.upload_token };
+};
+
+export type SuggestField = 'title' | 'location';
+
+// Typeahead values for a field, most frequent first. Suggestions are optional,
+// so failures resolve to an empty list.
+export const fetchSuggestions = async (field: SuggestField, prefix: string, limit = 8): Promise<string[]> => {
+  try {
+    const params = new URLSearchParams({ field, prefix, limit: limit.toString() });
+    const response = await api.get(`/api/suggest?${params.toString()}`);
+    return (response.data.suggestions || []).map((suggestion: { value: string }) => suggestion.value);
+  } catch (error) {
+    return [];
+  }
+};
+
 export default api;
@@ -1,4 +1,5 @@
 import { API_BASE_URL } from '../config';
+import { ImageVariants } from '../types/item';
 
 export const getImageUrl = (imageUrl: string | null | undefined): string => {
   if (!imageUrl) {
@@ -39,4 +40,12 @@ export const getImageUrlWithCacheBust = (imageUrl: string | null | undefined, it
   }
   
   return baseUrl;
-};
\ No newline at end of file
+};
+
+// Pick a resized variant (generated by the backend) when available, falling back to the original
+export const getVariantUrl = (
+  item: { image_url: string | null; image_variants?: ImageVariants | null },
+  size: keyof ImageVariants
+): string => {
+  return getImageUrl(item.image_variants?.[size] || item.image_url);
+};
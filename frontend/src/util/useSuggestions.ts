@@ -0,0 +1,34 @@
+import { useEffect, useState } from 'react';
+import { fetchSuggestions, SuggestField } from './api';
+
+const SUGGEST_DEBOUNCE_MS = 150;
+
+// Suggestions for the text typed into a field, fetched once typing pauses.
+// Responses for text that has since changed are dropped.
+export const useSuggestions = (field: SuggestField, text: string): string[] => {
+  const [suggestions, setSuggestions] = useState<string[]>([]);
+
+  useEffect(() => {
+    const prefix = text.trim();
+    if (!prefix) {
+      setSuggestions([]);
+      return;
+    }
+
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      const values = await fetchSuggestions(field, prefix);
+      if (!cancelled) {
+        // Offering exactly what was typed adds nothing
+        setSuggestions(values.filter(value => value.toLowerCase() !== prefix.toLowerCase()));
+      }
+    }, SUGGEST_DEBOUNCE_MS);
+
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [field, text]);
+
+  return suggestions;
+};
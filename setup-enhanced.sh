@@ -306,6 +306,10 @@ if [ $? -ne 0 ]; then
     exit 1
 fi
 
+# Precompressed .gz/.br copies of the admin build assets are generated, not committed
+echo "CONFIG - Precompressing admin interface assets..."
+python3 compression.py || echo "WARNING - Could not precompress admin assets; they will be served uncompressed"
+
 # Create uploads directory if it doesn't exist
 if [ ! -d "uploads" ]; then
     mkdir uploads